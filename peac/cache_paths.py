@@ -0,0 +1,17 @@
+"""Locations of PEaC's on-disk caches
+
+Caches live under ~/.peac/cache (next to the GUI configuration in ~/.peac).
+Set PEAC_CACHE_DIR to move them, e.g. on build agents or in tests.
+"""
+
+import os
+from pathlib import Path
+
+
+def get_cache_dir(*parts: str) -> Path:
+    """Return (and create) a directory inside the PEaC cache root"""
+    root = os.environ.get('PEAC_CACHE_DIR')
+    base = Path(root) if root else Path.home() / ".peac" / "cache"
+    path = base.joinpath(*parts)
+    path.mkdir(parents=True, exist_ok=True)
+    return path
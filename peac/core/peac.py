@@ -1,5 +1,7 @@
 import os
 import re
+import json
+import hashlib
 from pathlib import Path
 from typing import List
 from xml.etree import ElementTree
@@ -13,7 +15,7 @@ import yaml
 import validators
 from peac import local_parser
 
-from typing import TypedDict, Optional, List
+from typing import TypedDict, Optional, List, Dict
 import importlib.resources
 
 ## UTILS
@@ -28,36 +30,59 @@ class PromptSection(TypedDict):
     lines: List[str]
 
 
+_BLANK_LINES = re.compile(r'\n+')
+
+
 class PromptSections:
+    """
+    Sections of one prompt element, merged by preamble
+
+    Sections sharing a preamble (None for sections without one) are merged
+    into the first of them, keeping the first occurrence of every line.
+    Sections are found through a preamble index and every merged section
+    keeps the set of lines it holds, so adding N sections costs O(total
+    lines) rather than a scan of all sections and of all merged lines per
+    add. Added sections are copied, and get_lines() does not modify the
+    stored sections, so it can be called any number of times.
+    """
 
     def __init__(self):
         self.prompt_sections = []
+        self._by_preamble = {}
+        # Lines held by each section merged into at least once
+        self._seen = {}
 
-
+    @staticmethod
+    def _preamble_of(ps):
+        return ps['preamble'] if 'preamble' in ps else None
 
     def already_present(self, preamble):
         return self.get_by_preamble(preamble) != None
 
     def get_by_preamble(self, preamble):
-        for p in self.prompt_sections:
-            if preamble is None:
-                if 'preamble' not in p:
-                    return p
-                elif p['preamble'] == None:
-                    return p
-            else:
-                if 'preamble' in p and p['preamble'] == preamble:
-                    return p
-        return None
+        return self._by_preamble.get(preamble)
 
     def add_section(self, ps: PromptSection):
-        if self.already_present(ps['preamble'] if 'preamble' in ps else None):
-            preamble = self.get_by_preamble(ps['preamble'] if 'preamble' in ps else None)
-            preamble['lines'].extend(ps['lines'])
+        preamble = self._preamble_of(ps)
+        section = self._by_preamble.get(preamble)
+        if section is None:
+            section = dict(ps)
+            section['lines'] = list(ps['lines'])
+            self.prompt_sections.append(section)
+            self._by_preamble[preamble] = section
+            return
+
+        seen = self._seen.get(preamble)
+        if seen is None:
+            # First merge: drop the duplicates the section was added with
             seen = set()
-            preamble['lines'] = [line for line in preamble['lines'] if not (line in seen or seen.add(line))]
-        else:
-            self.prompt_sections.append(ps)
+            section['lines'] = [line for line in section['lines'] if not (line in seen or seen.add(line))]
+            self._seen[preamble] = seen
+        lines = section['lines']
+        for line in ps['lines']:
+            if line not in seen:
+                seen.add(line)
+                lines.append(line)
 
     def add_sections(self, pss: List[PromptSection]):
         for ps in pss:
@@ -66,13 +91,16 @@ class PromptSections:
     def get_lines(self):
         lines = []
         for p in self.prompt_sections:
-            if 'preamble' in p and p['preamble'] != None and p['preamble'].strip() != '':
-                # Append the preamble to the first string in p['lines']
-                if p['lines'] and p['lines'][0] is not None:
-                    p['lines'][0] = f"{p['preamble']} - {p['lines'][0]}"
-            lines.extend(p['lines'])
-        # Filter out None values and apply regex cleanup
-        lines = [re.sub(r'\n+', '\n', l) for l in lines if l is not None]
+            section_lines = p['lines']
+            preamble = self._preamble_of(p)
+            if preamble != None and preamble.strip() != '' and section_lines and section_lines[0] is not None:
+                # Prefix the first line with the preamble
+                lines.append(f"{preamble} - {section_lines[0]}")
+                lines.extend(section_lines[1:])
+            else:
+                lines.extend(section_lines)
+        # Filter out None values and collapse blank lines
+        lines = [_BLANK_LINES.sub('\n', l) if '\n\n' in l else l for l in lines if l is not None]
         return lines
 
 
@@ -228,31 +256,157 @@ def find_path(p, parent_path = ''):
     resolved_path = (parent_obj / path_obj).resolve()
     return str(resolved_path), parent_path
 
+
+PROMPT_ELEMENTS = ('instruction', 'context', 'output')
+
+# Rule evaluation pool (see PromptYaml._evaluate_rules): sequential by
+# default; threads, or processes for CPU-bound document extraction in 'local'
+# rules, when more than one worker is asked for
+RULE_POOL_THREAD = 'thread'
+RULE_POOL_PROCESS = 'process'
+RULE_POOLS = (RULE_POOL_THREAD, RULE_POOL_PROCESS)
+DEFAULT_RULE_WORKERS = 1
+
+
+def resolve_rule_pool(workers=None, pool=None):
+    """Validated (workers, pool); defaults from PEAC_RULE_WORKERS and PEAC_RULE_POOL
+    
+    One worker evaluates the rules sequentially.
+    """
+    if workers is None:
+        workers = os.environ.get('PEAC_RULE_WORKERS', DEFAULT_RULE_WORKERS)
+    if pool is None:
+        pool = os.environ.get('PEAC_RULE_POOL', RULE_POOL_THREAD)
+    pool = str(pool).lower().strip()
+    if pool not in RULE_POOLS:
+        raise ValueError(f"Unknown rule pool: '{pool}'. Use one of: {', '.join(RULE_POOLS)}")
+    return max(1, int(workers)), pool
+
+
+def evaluate_local_rule(parent_path, prompt_element, name, rule) -> PromptSection:
+    """Section of one 'local' rule (a module-level function, so it can run in a process pool)"""
+    # Validate that rule has 'source' field
+    if not isinstance(rule, dict):
+        error_msg = f"Error in '{prompt_element}.local.{name}': expected dict, got {type(rule).__name__}"
+        print(f"[ERROR] {error_msg}")
+        print(f"[ERROR] Rule content: {rule}")
+        print(f"[ERROR] File: {parent_path}")
+        return {
+            'preamble': None,
+            'lines': [error_msg]
+        }
+
+    if 'source' not in rule:
+        error_msg = f"Error in '{prompt_element}.local.{name}': missing required 'source' field"
+        print(f"[ERROR] {error_msg}")
+        print(f"[ERROR] Rule keys: {list(rule.keys())}")
+        print(f"[ERROR] File: {parent_path}")
+        return {
+            'preamble': None,
+            'lines': [error_msg]
+        }
+
+    lines = []
+    preamble = rule.get('preamble', None)
+    # Apply filters
+    recursive = rule['recursive'] if 'recursive' in rule else False
+    extension = rule['extension'] if 'extension' in rule else '*'
+    filter = rule['filter'] if 'filter' in rule else None
+
+    # Get provider options (e.g., pages for PDF/DOCX)
+    options = rule.get('options', {}) if 'options' in rule else None
+
+    source = rule['source']
+    source, parent_path = find_path(source, parent_path)
+    file_content = local_parser.parse(source, recursive, extension, filter, options)
+
+    # Ensure file_content is not None
+    if file_content is not None:
+        lines.append(file_content)
+    else:
+        lines.append(f"Error: Could not read file {source}")
+
+    return {
+        'preamble': preamble,
+        'lines': lines
+    }
+
+
+def resolve_yaml_path(yaml_path, parent_path=''):
+    """Absolute, normalized path of a prompt file (relative paths are taken from parent_path)"""
+    # Normalize separators first (Path accepts / on all platforms)
+    yaml_path_obj = Path(yaml_path.replace('\\', '/'))
+    if not yaml_path_obj.is_absolute() and parent_path:
+        yaml_path_obj = Path(parent_path) / yaml_path_obj
+    return str(yaml_path_obj.resolve())
+
+
+class ExtendsCycleError(ValueError):
+    """A prompt file extends itself, directly or through other prompt files"""
+
+    def __init__(self, chain: List[str]):
+        self.chain = chain
+        super().__init__("Circular extends: " + " -> ".join(chain))
+
+
+class PromptRegistry:
+    """
+    The prompt files of one render, keyed by resolved path
+
+    Every file of the extends graph is read and parsed once: a file extended
+    by several others (e.g. a shared base.yaml reached through intermediate
+    layers) is a single PromptYaml shared by all of them. The files still
+    being loaded are tracked, so an extends cycle raises ExtendsCycleError
+    with the chain of files instead of recursing until the stack overflows.
+    """
+
+    def __init__(self):
+        self.prompts: Dict[str, 'PromptYaml'] = {}
+        self.loading: List[str] = []
+        # URL -> SHA-256 of the response of every web rule evaluated (see peac.prompt_cache)
+        self.web_responses: Dict[str, str] = {}
+
+    def get(self, yaml_path, parent_path='', add_section_headers=True) -> 'PromptYaml':
+        """The PromptYaml of a file, loading it (and what it extends) on first use"""
+        resolved = resolve_yaml_path(yaml_path, parent_path)
+        prompt = self.prompts.get(resolved)
+        if prompt is None:
+            prompt = PromptYaml(resolved, add_section_headers=add_section_headers, registry=self)
+        return prompt
+
+    def enter(self, yaml_path):
+        """Mark a file as being loaded; raises ExtendsCycleError if it already is"""
+        if yaml_path in self.loading:
+            raise ExtendsCycleError(self.loading[self.loading.index(yaml_path):] + [yaml_path])
+        self.loading.append(yaml_path)
+
+
 class PromptYaml:
-    def __init__(self, yaml_path, parent_path = '', add_section_headers=True):
+    def __init__(self, yaml_path, parent_path = '', add_section_headers=True, registry: Optional[PromptRegistry] = None,
+                 rule_workers: Optional[int] = None, rule_pool: Optional[str] = None):
         # Resolve the YAML file path and set parent_path to its directory
-        # First, normalize separators for cross-platform compatibility
-        # Replace backslashes with forward slashes (Path handles this on all platforms)
-        yaml_path = yaml_path.replace('\\', '/')
-        
-        # Use Path for cross-platform compatibility
-        yaml_path_obj = Path(yaml_path)
-        if not yaml_path_obj.is_absolute() and parent_path:
-            yaml_path_obj = (Path(parent_path) / yaml_path_obj).resolve()
-        else:
-            yaml_path_obj = yaml_path_obj.resolve()
-        
-        yaml_path = str(yaml_path_obj)
+        # (cross-platform: backslashes are accepted, see resolve_yaml_path)
+        yaml_path = resolve_yaml_path(yaml_path, parent_path)
+        self.yaml_path = yaml_path
         self.add_section_headers = add_section_headers
+        # Pool evaluating the local, web and RAG rules of get_prompt_sentence
+        self.rule_workers, self.rule_pool = resolve_rule_pool(rule_workers, rule_pool)
         # Set parent_path to the directory containing the YAML file
-        self.parent_path = str(yaml_path_obj.parent)
+        self.parent_path = str(Path(yaml_path).parent)
+        # Shared by every prompt file loaded for this render
+        self.registry = registry if registry is not None else PromptRegistry()
 
-        # Read YAML data from file
-        with open(yaml_path, "r") as file:
-            yaml_data = file.read()
-            self.parsed_data = yaml.safe_load(yaml_data)
-        # context lines
-        self.parents : List[PromptYaml] = PromptYaml.find_dependencies(self.parsed_data, self.parent_path, self.add_section_headers)
+        self.registry.enter(yaml_path)
+        try:
+            # Read YAML data from file
+            with open(yaml_path, "r") as file:
+                yaml_data = file.read()
+                self.parsed_data = yaml.safe_load(yaml_data)
+            # context lines
+            self.parents : List[PromptYaml] = PromptYaml.find_dependencies(self.parsed_data, self.parent_path, self.add_section_headers, self.registry)
+        finally:
+            self.registry.loading.pop()
+        self.registry.prompts[yaml_path] = self
 
 
     def find_index(self, keyword):
@@ -291,119 +445,131 @@ class PromptYaml:
                     print(url_content)
 
 
-    def get_local_rules(self, prompt_element) -> List[PromptSection]:
-        prompt_sections : List[PromptSection] = []
+    def get_rules(self, prompt_element, kind):
+        """Rules of one kind ('local', 'web' or 'rag') of a prompt element, by name"""
         if 'prompt' in self.parsed_data and prompt_element in self.parsed_data['prompt']:
             prompt_data = self.parsed_data['prompt'][prompt_element]
-            rules = prompt_data.get('local', {})
-            for name, rule in rules.items():
-                # Validate that rule has 'source' field
-                if not isinstance(rule, dict):
-                    error_msg = f"Error in '{prompt_element}.local.{name}': expected dict, got {type(rule).__name__}"
-                    print(f"[ERROR] {error_msg}")
-                    print(f"[ERROR] Rule content: {rule}")
-                    print(f"[ERROR] File: {self.parent_path}")
-                    prompt_sections.append({
-                        'preamble': None,
-                        'lines': [error_msg]
-                    })
-                    continue
-                    
-                if 'source' not in rule:
-                    error_msg = f"Error in '{prompt_element}.local.{name}': missing required 'source' field"
-                    print(f"[ERROR] {error_msg}")
-                    print(f"[ERROR] Rule keys: {list(rule.keys())}")
-                    print(f"[ERROR] File: {self.parent_path}")
-                    prompt_sections.append({
-                        'preamble': None,
-                        'lines': [error_msg]
-                    })
-                    continue
-                
-                lines = []
-                preamble = rule.get('preamble', None)
-                # Apply filters
-                recursive = rule['recursive'] if 'recursive' in rule else False
-                extension = rule['extension'] if 'extension' in rule else '*'
-                filter = rule['filter'] if 'filter' in rule else None
-                
-                # Get provider options (e.g., pages for PDF/DOCX)
-                options = rule.get('options', {}) if 'options' in rule else None
+            return prompt_data.get(kind, {})
+        return {}
 
-                source = rule['source']
-                source, parent_path = find_path(source, self.parent_path)
-                file_content = local_parser.parse(source, recursive, extension, filter, options)
-                
-                # Ensure file_content is not None
-                if file_content is not None:
-                    lines.append(file_content)
-                else:
-                    lines.append(f"Error: Could not read file {source}")
-                    
-                prompt_sections.append({
-                    'preamble': preamble,
-                    'lines': lines
-                })
+    def get_local_rules(self, prompt_element) -> List[PromptSection]:
+        prompt_sections : List[PromptSection] = []
+        for name, rule in self.get_rules(prompt_element, 'local').items():
+            prompt_sections.append(evaluate_local_rule(self.parent_path, prompt_element, name, rule))
         return prompt_sections
 
+    def _rag_index_options(self, rule):
+        """Resolved index path and index settings of a RAG rule (no query)
+        
+        Returns (index_path, options); index_path is '' if the rule has none.
+        Paths are resolved relative to the YAML file.
+        """
+        # Support both old 'faiss_file' (backward compat) and new 'index_path'
+        index_path = rule.get('index_path', rule.get('faiss_file', ''))
+        source_folder = rule.get('source_folder', '')
+        options = {
+            'chunk_size': rule.get('chunk_size', 512),
+            'overlap': rule.get('overlap', 50),
+            'provider': rule.get('provider', 'fastembed'),  # Default to fastembed
+            'embedding_model': rule.get('embedding_model', 'BAAI/bge-small-en-v1.5'),
+            'provider_config': rule.get('provider_config', {})
+        }
+        if source_folder:
+            source_folder, _ = find_path(source_folder, self.parent_path)
+            options['source_folder'] = source_folder
+        if index_path:
+            index_path, _ = find_path(index_path, self.parent_path)
+        return index_path, options
+
+    def get_rag_indexes(self):
+        """Every index used by the RAG rules of this prompt and its ancestors
+        
+        Returns:
+            List of (index_path, options) with the index settings of the first
+            rule using each index, in prompt order (used by 'peac index')
+        """
+        indexes = {}
+        for prompt in [self] + self._get_all_ancestors():
+            prompt_data = prompt.parsed_data.get('prompt') or {}
+            for prompt_element in ('instruction', 'context', 'output'):
+                rules = (prompt_data.get(prompt_element) or {}).get('rag', {})
+                for rule in rules.values():
+                    index_path, options = prompt._rag_index_options(rule)
+                    if index_path and index_path not in indexes:
+                        indexes[index_path] = options
+        return list(indexes.items())
+
+    def get_source_paths(self):
+        """Files and folders read by the local and RAG rules of this prompt and its ancestors
+        
+        Returns:
+            (sources, indexes): resolved local sources and RAG source folders,
+            and resolved RAG index paths, each once in prompt order (used by
+            peac.prompt_cache)
+        """
+        sources, indexes = {}, {}
+        for prompt in [self] + self._get_all_ancestors():
+            for prompt_element in PROMPT_ELEMENTS:
+                for rule in prompt.get_rules(prompt_element, 'local').values():
+                    if isinstance(rule, dict) and 'source' in rule:
+                        sources[find_path(rule['source'], prompt.parent_path)[0]] = True
+                for rule in prompt.get_rules(prompt_element, 'rag').values():
+                    index_path, options = prompt._rag_index_options(rule)
+                    if options.get('source_folder'):
+                        sources[options['source_folder']] = True
+                    if index_path:
+                        indexes[index_path] = True
+        return list(sources), list(indexes)
+
     def get_rag_rules(self, prompt_element) -> List[PromptSection]:
-        """Get RAG (Retrieval-Augmented Generation) rules"""
+        """Get RAG (Retrieval-Augmented Generation) rules
+        
+        Rules that search the same index with the same provider, embedding
+        model and index settings are answered together through
+        local_parser.parse_rag_batch (one embedding call and one scoring pass
+        per index); sections are still returned in rule order.
+        """
         prompt_sections: List[PromptSection] = []
         if 'prompt' in self.parsed_data and prompt_element in self.parsed_data['prompt']:
             prompt_data = self.parsed_data['prompt'][prompt_element]
             rules = prompt_data.get('rag', {})
+            batches = {}
             for name, rule in rules.items():
                 lines = []
                 preamble = rule.get('preamble', None)
                 
-                # RAG specific options
-                # Support both old 'faiss_file' (backward compat) and new 'index_path'
-                index_path = rule.get('index_path', rule.get('faiss_file', ''))
                 query = rule.get('query', '')
-                source_folder = rule.get('source_folder', '')
                 top_k = rule.get('top_k', 5)
-                chunk_size = rule.get('chunk_size', 512)
-                overlap = rule.get('overlap', 50)
                 filter_regex = rule.get('filter', None)
-                embedding_model = rule.get('embedding_model', 'BAAI/bge-small-en-v1.5')
-                provider = rule.get('provider', 'fastembed')  # Default to fastembed
-                provider_config = rule.get('provider_config', {})
+                index_path, rag_options = self._rag_index_options(rule)
                 
                 if not index_path:
                     lines.append(f"Error: No index path specified for RAG rule '{name}'")
                 elif not query:
                     lines.append(f"Error: No query specified for RAG rule '{name}'")
                 else:
-                    # Build options dictionary
-                    rag_options = {
-                        'query': query,
-                        'top_k': top_k,
-                        'chunk_size': chunk_size,
-                        'overlap': overlap,
-                        'provider': provider,
-                        'embedding_model': embedding_model,
-                        'provider_config': provider_config
-                    }
-                    
-                    # Resolve source_folder path if provided
-                    if source_folder:
-                        source_folder, _ = find_path(source_folder, self.parent_path)
-                        rag_options['source_folder'] = source_folder
-                    
+                    rag_options['query'] = query
+                    rag_options['top_k'] = top_k
                     if filter_regex:
                         rag_options['filter'] = filter_regex
                     
-                    # Resolve index_path relative to YAML file
-                    index_path, _ = find_path(index_path, self.parent_path)
-                    
-                    # Process RAG request
-                    rag_content = local_parser.parse_rag(index_path, rag_options)
-                    lines.append(rag_content)
+                    # Queue the request; its content is filled in once the batch has run
+                    batch_key = (index_path, rag_options['provider'], rag_options['embedding_model'],
+                                 str(rag_options.get('source_folder', '')),
+                                 rag_options['chunk_size'], rag_options['overlap'],
+                                 json.dumps(rag_options['provider_config'], sort_keys=True, default=str))
+                    batches.setdefault(batch_key, []).append((lines, rag_options))
                 
                 prompt_sections.append({
                     'preamble': preamble,
                     'lines': lines
                 })
+            
+            # Process RAG requests, one batch per index
+            for (index_path, *_), requests in batches.items():
+                contents = local_parser.parse_rag_batch(index_path, [options for _, options in requests])
+                for (lines, _), rag_content in zip(requests, contents):
+                    lines.append(rag_content)
         return prompt_sections
 
     def _find_elements_by_xpath(self, soup, xpath):
@@ -512,39 +678,41 @@ class PromptYaml:
 
     def get_web_rules(self, prompt_element) -> List[PromptSection]:
         prompt_sections : List[PromptSection] = []
-        if 'prompt' in self.parsed_data and prompt_element in self.parsed_data['prompt']:
-            prompt_data = self.parsed_data['prompt'][prompt_element]
-            rules = prompt_data.get('web', {})
-            for name, rule in rules.items():
-                preamble = rule['preamble'] if 'preamble' in rule else ''
-                lines = []
-                xpath = rule['xpath'] if 'xpath' in rule else ''
-                source = rule['source']
-                html_content = get_text_from_url(source)
-                soup = BeautifulSoup(html_content, 'html.parser')
-                # if preamble != '':
-                #     lines.insert(0, preamble)
-
-                if xpath != '':
-                    # Convert basic XPath expressions to BeautifulSoup navigation
-                    # Note: This is a simplified XPath to CSS conversion for common cases
-                    elements = self._find_elements_by_xpath(soup, xpath)
-                    for element in elements:
-                        if hasattr(element, 'get_text'):
-                            # If it's a BeautifulSoup element, get its HTML string
-                            lines.append(str(element))
-                        else:
-                            # If it's just text content
-                            lines.append(str(element))
-                else:
-                    lines.append(html_content)
-                # Generate prompt section
-                prompt_sections.append({
-                    'preamble': preamble,
-                    'lines': lines
-                })
+        for name, rule in self.get_rules(prompt_element, 'web').items():
+            prompt_sections.append(self.get_web_rule(rule))
         return prompt_sections
 
+    def get_web_rule(self, rule) -> PromptSection:
+        """Section of one 'web' rule: the page, or the elements matching its xpath"""
+        preamble = rule['preamble'] if 'preamble' in rule else ''
+        lines = []
+        xpath = rule['xpath'] if 'xpath' in rule else ''
+        source = rule['source']
+        html_content = get_text_from_url(source)
+        self.registry.web_responses[source] = hashlib.sha256(html_content.encode('utf-8')).hexdigest()
+        soup = BeautifulSoup(html_content, 'html.parser')
+        # if preamble != '':
+        #     lines.insert(0, preamble)
+
+        if xpath != '':
+            # Convert basic XPath expressions to BeautifulSoup navigation
+            # Note: This is a simplified XPath to CSS conversion for common cases
+            elements = self._find_elements_by_xpath(soup, xpath)
+            for element in elements:
+                if hasattr(element, 'get_text'):
+                    # If it's a BeautifulSoup element, get its HTML string
+                    lines.append(str(element))
+                else:
+                    # If it's just text content
+                    lines.append(str(element))
+        else:
+            lines.append(html_content)
+        # Generate prompt section
+        return {
+            'preamble': preamble,
+            'lines': lines
+        }
+
     def get_context_base_rules(self):
         return self.get_base_rules('context')
 
@@ -582,13 +750,15 @@ class PromptYaml:
         return self.get_rag_rules('instruction')
 
 
-    def find_dependencies(yaml_data, parent_path, add_section_headers=True):
+    def find_dependencies(yaml_data, parent_path, add_section_headers=True, registry: Optional[PromptRegistry] = None):
         other_prompts = []
         prompt = yaml_data['prompt']
+        if registry is None:
+            registry = PromptRegistry()
         if 'extends' in prompt:
             others_yaml = prompt['extends']
             for o in others_yaml:
-                other_prompts.append(PromptYaml(o, parent_path, add_section_headers))
+                other_prompts.append(registry.get(o, parent_path, add_section_headers))
 
         return other_prompts
 
@@ -597,60 +767,134 @@ class PromptYaml:
 
 
     def _get_all_ancestors(self):
-        """Recursively collect all ancestors (parents, grandparents, etc.)"""
+        """Collect all ancestors (parents, grandparents, etc.), each once
+
+        Depth-first in 'extends' order, every file at its first visit: the
+        order of a plain recursive walk without the repeats of files reached
+        through several parents, so a shared grandparent's rules are
+        evaluated once per render and the merged prompt is unchanged.
+        """
         ancestors = []
-        for parent in self.parents:
-            ancestors.append(parent)
-            ancestors.extend(parent._get_all_ancestors())
+        seen = {self.yaml_path}
+        stack = list(reversed(self.parents))
+        while stack:
+            prompt = stack.pop()
+            if prompt.yaml_path in seen:
+                continue
+            seen.add(prompt.yaml_path)
+            ancestors.append(prompt)
+            stack.extend(reversed(prompt.parents))
         return ancestors
 
+    def _evaluate_rules(self, prompts):
+        """Evaluate the local, web and RAG rules of prompts on the rule pool
+        
+        Every local and web rule is one task; the RAG rules of a prompt
+        element are one task, since they are batched per index (see
+        get_rag_rules). With rule_pool 'process', local rules run in worker
+        processes; web and RAG rules always run on threads, the latter using
+        the models and indexes loaded in this process. Sections are collected
+        in prompt, element and rule order whatever order tasks finish in, so
+        the result is that of a sequential evaluation.
+        
+        Diagnostics rules print (warnings, RAG progress) are not ordered:
+        with several workers they interleave on stdout, and those printed in
+        worker processes bypass contextlib.redirect_stdout in this process.
+        
+        Returns:
+            Dict (prompt position, element, kind) -> list of sections, kind
+            being 'local', 'web' or 'rag'
+        """
+        tasks = []
+        for position, prompt in enumerate(prompts):
+            for prompt_element in PROMPT_ELEMENTS:
+                for name, rule in prompt.get_rules(prompt_element, 'local').items():
+                    tasks.append(((position, prompt_element, 'local'), self.rule_pool,
+                                  evaluate_local_rule, (prompt.parent_path, prompt_element, name, rule)))
+                for rule in prompt.get_rules(prompt_element, 'web').values():
+                    tasks.append(((position, prompt_element, 'web'), RULE_POOL_THREAD,
+                                  prompt.get_web_rule, (rule,)))
+                if prompt.get_rules(prompt_element, 'rag'):
+                    tasks.append(((position, prompt_element, 'rag'), RULE_POOL_THREAD,
+                                  prompt.get_rag_rules, (prompt_element,)))
+
+        if self.rule_workers <= 1 or len(tasks) <= 1:
+            results = [function(*args) for _, _, function, args in tasks]
+        else:
+            from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+            workers = min(self.rule_workers, len(tasks))
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='peac-rule') as threads:
+                processes = None
+                if any(pool == RULE_POOL_PROCESS for _, pool, _, _ in tasks):
+                    processes = ProcessPoolExecutor(max_workers=workers)
+                try:
+                    futures = [(processes if pool == RULE_POOL_PROCESS else threads).submit(function, *args)
+                               for _, pool, function, args in tasks]
+                    results = [future.result() for future in futures]
+                finally:
+                    if processes is not None:
+                        processes.shutdown(cancel_futures=True)
+
+        sections = {}
+        for (key, _, _, _), result in zip(tasks, results):
+            if isinstance(result, list):
+                sections.setdefault(key, []).extend(result)
+            else:
+                sections.setdefault(key, []).append(result)
+        return sections
+
     def get_prompt_sentence(self):
+        # Evaluate the local, web and RAG rules of the prompt and all its ancestors
+        # (parents, grandparents, etc.) up front, concurrently
+        all_ancestors = self._get_all_ancestors()
+        rules = self._evaluate_rules([self] + all_ancestors)
+
         # Get instruction rules
         base_instruction = self.get_instruction_base_rules()
         local_instruction = PromptSections()
-        local_instruction.add_sections(self.get_instruction_local_rules())
+        local_instruction.add_sections(rules.get((0, 'instruction', 'local'), []))
         web_instruction = PromptSections()
-        web_instruction.add_sections(self.get_instruction_web_rules())
+        web_instruction.add_sections(rules.get((0, 'instruction', 'web'), []))
         rag_instruction = PromptSections()
-        rag_instruction.add_sections(self.get_instruction_rag_rules())
+        rag_instruction.add_sections(rules.get((0, 'instruction', 'rag'), []))
 
         # Get context rules
         base_context = self.get_context_base_rules()
         local_context = PromptSections()
-        local_context.add_sections(self.get_context_local_rules())
+        local_context.add_sections(rules.get((0, 'context', 'local'), []))
         web_context = PromptSections()
-        web_context.add_sections(self.get_context_web_rules())
+        web_context.add_sections(rules.get((0, 'context', 'web'), []))
         rag_context = PromptSections()
-        rag_context.add_sections(self.get_context_rag_rules())
+        rag_context.add_sections(rules.get((0, 'context', 'rag'), []))
 
         # Get output rules
         base_output = self.get_output_base_rules()
         local_output = PromptSections()
-        local_output.add_sections(self.get_output_local_rules())
+        local_output.add_sections(rules.get((0, 'output', 'local'), []))
         web_output = PromptSections()
-        web_output.add_sections(self.get_output_web_rules())
+        web_output.add_sections(rules.get((0, 'output', 'web'), []))
         rag_output = PromptSections()
-        rag_output.add_sections(self.get_output_rag_rules())
+        rag_output.add_sections(rules.get((0, 'output', 'rag'), []))
         
         query = self.get_query()
 
-        # Process all ancestors recursively (including grandparents, great-grandparents, etc.)
-        all_ancestors = self._get_all_ancestors()
-        for p in all_ancestors:
+        # Merge the ancestors' rules, in ancestor order
+        for position, p in enumerate(all_ancestors, 1):
             base_instruction += p.get_instruction_base_rules()
-            local_instruction.add_sections(p.get_instruction_local_rules())
-            web_instruction.add_sections(p.get_instruction_web_rules())
-            rag_instruction.add_sections(p.get_instruction_rag_rules())
+            local_instruction.add_sections(rules.get((position, 'instruction', 'local'), []))
+            web_instruction.add_sections(rules.get((position, 'instruction', 'web'), []))
+            rag_instruction.add_sections(rules.get((position, 'instruction', 'rag'), []))
 
             base_context += p.get_context_base_rules()
-            local_context.add_sections(p.get_context_local_rules())
-            web_context.add_sections(p.get_context_web_rules())
-            rag_context.add_sections(p.get_context_rag_rules())
+            local_context.add_sections(rules.get((position, 'context', 'local'), []))
+            web_context.add_sections(rules.get((position, 'context', 'web'), []))
+            rag_context.add_sections(rules.get((position, 'context', 'rag'), []))
 
             base_output += p.get_output_base_rules()
-            local_output.add_sections(p.get_output_local_rules())
-            web_output.add_sections(p.get_output_web_rules())
-            rag_output.add_sections(p.get_output_rag_rules())
+            local_output.add_sections(rules.get((position, 'output', 'local'), []))
+            web_output.add_sections(rules.get((position, 'output', 'web'), []))
+            rag_output.add_sections(rules.get((position, 'output', 'rag'), []))
 
         # Process instruction data
         def dedup_preserve_order(seq):
@@ -663,13 +907,13 @@ class PromptYaml:
         rag_instruction = rag_instruction.get_lines()
 
         # Process context data
-        base_context = list(set(base_context)) if isinstance(base_context, list) else [base_context] if base_context else []
+        base_context = dedup_preserve_order(base_context) if isinstance(base_context, list) else [base_context] if base_context else []
         local_context = local_context.get_lines()
         web_context = web_context.get_lines()
         rag_context = rag_context.get_lines()
         
         # Process output data
-        base_output = list(set(base_output)) if isinstance(base_output, list) else [base_output] if base_output else []
+        base_output = dedup_preserve_order(base_output) if isinstance(base_output, list) else [base_output] if base_output else []
         local_output = local_output.get_lines()
         web_output = web_output.get_lines()
         rag_output = rag_output.get_lines()
@@ -0,0 +1,139 @@
+"""Content-addressed cache of text extracted from documents
+
+PDF, DOCX and XLSX extraction is by far the slowest part of rendering a prompt
+that reads documents, and the same files are extracted over and over: by
+every ``peac prompt`` run, and by both a ``local`` rule and a RAG build that
+point at the same folder. cached_extract() stores the text a file provider
+returns in a SQLite database under the PEaC cache directory (see
+peac.cache_paths), keyed by
+
+- the SHA-256 of the file content (renaming, copying or touching a file keeps
+  its entry; editing it does not),
+- the provider class (e.g. PdfProvider) and
+- the provider options (e.g. ``pages``).
+
+Entries are zlib-compressed. The total stored size is capped
+(PEAC_EXTRACTION_CACHE_MB, default 256; 0 disables the cache) and the least
+recently used entries are evicted first. Any error while reading or writing
+the database is treated as a cache miss.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import zlib
+from typing import Any, Dict, Optional
+
+from .cache_paths import get_cache_dir
+from .sqlite_cache import EVICT_SIZE, SQLiteLRUCache
+
+
+DEFAULT_MAX_MB = 256
+DB_FILE = 'extracted_text.sqlite3'
+
+# Bumped whenever a provider's output changes, so stale entries stop matching
+EXTRACTION_VERSION = 1
+
+_READ_BLOCK = 1 << 20
+
+def file_digest(file_path: str) -> str:
+    """SHA-256 of a file's content, read in blocks (also manifest.hash_file of RAG indexes)"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(_READ_BLOCK), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def cache_key(digest: str, provider_name: str, options: Optional[Dict[str, Any]] = None) -> str:
+    """Key of one extraction: content hash, provider and options"""
+    options_json = json.dumps(options or {}, sort_keys=True, default=str)
+    return f"{EXTRACTION_VERSION}:{provider_name}:{digest}:{options_json}"
+
+
+class ExtractionCache(SQLiteLRUCache):
+    """SQLite-backed LRU store of extracted text, capped by total compressed size"""
+
+    TABLE = 'extracted_text'
+    COLUMNS = ('text BLOB NOT NULL',)
+    EVICTION = EVICT_SIZE
+    LIMIT_ENV = 'PEAC_EXTRACTION_CACHE_MB'
+    DEFAULT_LIMIT = DEFAULT_MAX_MB
+    NAME = 'extraction cache'
+
+    def __init__(self, db_path: str, max_bytes: Optional[int] = None):
+        super().__init__(db_path, max_bytes)
+
+    @property
+    def max_bytes(self) -> int:
+        return self.limit
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached text, or None on a miss"""
+        row = self._get((key,), ('text',))
+        if row is None:
+            return None
+        try:
+            return zlib.decompress(row[0]).decode('utf-8')
+        except (zlib.error, UnicodeDecodeError):
+            return None
+
+    def put(self, key: str, text: str) -> None:
+        """Store extracted text, evicting the least recently used entries over the size cap"""
+        if self.limit <= 0:
+            return
+        blob = zlib.compress(text.encode('utf-8'))
+        self._put((key,), {'text': blob}, size=len(blob))
+
+    def size_bytes(self) -> int:
+        """Total compressed size of the stored entries"""
+        try:
+            with self._connection() as conn:
+                return conn.execute(f"SELECT COALESCE(SUM(size), 0) FROM {self.TABLE}").fetchone()[0]
+        except sqlite3.Error:
+            return 0
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_extraction_cache() -> ExtractionCache:
+    """The extraction cache of the current cache directory (see peac.cache_paths)"""
+    db_path = os.path.join(get_cache_dir(), DB_FILE)
+    with _caches_lock:
+        cache = _caches.get(db_path)
+        if cache is None:
+            cache = ExtractionCache(db_path)
+            _caches[db_path] = cache
+        return cache
+
+
+def cached_extract(file_path: str, provider, options: Optional[Dict[str, Any]] = None,
+                   digest: Optional[str] = None) -> str:
+    """
+    Text of a file as returned by ``provider.parse(file_path, options)``, cached
+
+    Args:
+        file_path: Document to extract
+        provider: A FileProvider (PdfProvider, DocxProvider, XlsxProvider)
+        options: Provider options, part of the cache key
+        digest: SHA-256 of the file when already known (e.g. from an index
+                manifest), so the file is not hashed a second time
+
+    Returns:
+        The extracted text; errors raised by the provider propagate and
+        nothing is cached for them
+    """
+    cache = get_extraction_cache()
+    if cache.max_bytes <= 0:
+        return provider.parse(file_path, options)
+
+    key = cache_key(digest or file_digest(file_path), type(provider).__name__, options)
+    text = cache.get(key)
+    if text is None:
+        text = provider.parse(file_path, options)
+        cache.put(key, text)
+    return text
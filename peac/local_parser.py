@@ -2,6 +2,9 @@ from enum import Enum
 from pathlib import Path
 import os
 import re
+import threading
+
+from peac.extraction_cache import cached_extract
 
 
 class PathType(Enum):
@@ -67,6 +70,21 @@ def get_rag_provider(provider_name=None):
         return None
 
 
+_index_locks = {}
+_index_locks_lock = threading.Lock()
+
+
+def _index_lock(index_path):
+    """Lock serializing RAG requests on one index
+    
+    Prompt rules may be evaluated concurrently (see PromptYaml rule_workers);
+    a missing or stale index must be built by one of them only.
+    """
+    key = os.path.realpath(index_path)
+    with _index_locks_lock:
+        return _index_locks.setdefault(key, threading.Lock())
+
+
 def parse_rag(index_path, options=None):
     """Parse RAG request using configured vector search provider
     
@@ -91,7 +109,8 @@ def parse_rag(index_path, options=None):
         return f"Error: RAG provider{provider_display} not available. Install dependencies: pip install fastembed"
     
     try:
-        content = provider.parse(index_path, options)
+        with _index_lock(index_path):
+            content = provider.parse(index_path, options)
         
         # Apply filter if specified
         filter_regex = options.get('filter') if options else None
@@ -104,6 +123,48 @@ def parse_rag(index_path, options=None):
         return f"Error in RAG processing: {str(e)}"
 
 
+def parse_rag_batch(index_path, options_list):
+    """Parse several RAG requests that share one index in a single pass
+    
+    The requests must use the same provider, embedding model and index
+    settings (source_folder, chunk_size, overlap, provider_config); query,
+    top_k and filter may differ. All queries are embedded together and
+    scored against the index once.
+    
+    Args:
+        index_path (str): Path to vector index shared by all requests
+        options_list (list): One options dict per request (see parse_rag)
+    
+    Returns:
+        list: One formatted result per request, in the order given
+    """
+    if not options_list:
+        return []
+    
+    provider_name = options_list[0].get('provider', None)
+    
+    provider = get_rag_provider(provider_name)
+    if not provider:
+        provider_display = f" ({provider_name})" if provider_name else ""
+        return [f"Error: RAG provider{provider_display} not available. Install dependencies: pip install fastembed"] * len(options_list)
+    
+    try:
+        with _index_lock(index_path):
+            contents = provider.parse_batch(index_path, options_list)
+    except Exception as e:
+        return [f"Error in RAG processing: {str(e)}"] * len(options_list)
+    
+    provider_name = provider_name or 'fastembed'
+    results = []
+    for options, content in zip(options_list, contents):
+        # Apply filter if specified
+        filter_regex = options.get('filter')
+        if filter_regex:
+            content = provider.apply_filter(content, filter_regex)
+        results.append(f"[RAG ({provider_name}): {index_path}]\n```\n{content}\n```")
+    return results
+
+
 def read_file(source, filter_regex=None, options=None):
     """Read the filename and parse with appropriate provider if needed
 
@@ -119,7 +180,8 @@ def read_file(source, filter_regex=None, options=None):
     provider = get_file_provider(source)
     if provider:
         try:
-            file_content = provider.parse(source, options)
+            # Extracted text is cached by file content (see peac.extraction_cache)
+            file_content = cached_extract(source, provider, options)
             
             # Apply filter if provider supports it and filter is specified
             if filter_regex and hasattr(provider, 'apply_filter'):
@@ -1,5 +1,6 @@
 import typer
 import importlib.resources
+from typing import Annotated, List, Optional
 
 ## UTILS
 def get_template_file():
@@ -10,7 +11,7 @@ def get_template_file():
 
 ####
 
-from peac.core.peac import PromptYaml
+from peac.core.peac import PromptYaml, ExtendsCycleError
 
 
 app = typer.Typer()
@@ -24,11 +25,98 @@ def prompt(
         "--section-headers/--no-section-headers",
         help="Enable section headers in the output."
     ),
+    server: bool = typer.Option(
+        False,
+        "--server",
+        help="Render on a running 'peac serve' (falls back to a local render when none is running)."
+    ),
+    server_address: str = typer.Option(
+        "127.0.0.1:8765",
+        "--server-address",
+        envvar="PEAC_SERVER",
+        help="Address of the server: HOST:PORT or unix:/path/to.sock."
+    ),
+    rule_workers: Optional[int] = typer.Option(
+        None,
+        "--rule-workers",
+        help="Local, web and RAG rules evaluated at the same time (default: PEAC_RULE_WORKERS or 1, sequential)."
+    ),
+    rule_pool: Optional[str] = typer.Option(
+        None,
+        "--rule-pool",
+        help="Run local rules on a 'thread' (default) or 'process' pool."
+    ),
+    cache: bool = typer.Option(
+        False,
+        "--cache",
+        envvar="PEAC_PROMPT_CACHE",
+        help="Reuse the last output while the prompt files, flags, sources, indexes and web pages are unchanged."
+    ),
     ):
-    py = PromptYaml(yaml_path, add_section_headers=section_headers)
+    if server:
+        from peac.server import render_remote, ServerError
+
+        try:
+            output = render_remote(server_address, yaml_path, section_headers, cache=cache,
+                                   rule_workers=rule_workers, rule_pool=rule_pool)
+        except (ServerError, ValueError) as e:
+            typer.echo(f"peac server: {str(e)}", err=True)
+            raise typer.Exit(code=1)
+        if output is not None:
+            typer.echo(output, nl=False)
+            return
+    try:
+        py = PromptYaml(yaml_path, add_section_headers=section_headers,
+                        rule_workers=rule_workers, rule_pool=rule_pool)
+    except (ExtendsCycleError, ValueError) as e:
+        typer.echo(str(e), err=True)
+        raise typer.Exit(code=1)
+    if cache:
+        from peac.prompt_cache import render_cached
+
+        output, _ = render_cached(py)
+        typer.echo(output)
+        return
     py.print()
 
 
+@app.command()
+def serve(
+    address: str = typer.Option(
+        "127.0.0.1:8765",
+        envvar="PEAC_SERVER",
+        help="Where to listen: HOST:PORT or unix:/path/to.sock."
+    ),
+    warm: Optional[List[str]] = typer.Option(
+        None,
+        help="Prompt file rendered at startup to load its models and indexes (repeatable)."
+    ),
+    verbose: bool = typer.Option(False, help="Log every request."),
+    ):
+    """Keep models and indexes loaded and render prompts for 'peac prompt --server'."""
+    from peac.server import PromptServer
+
+    try:
+        prompt_server = PromptServer(address, verbose=verbose)
+    except (OSError, ValueError) as e:
+        typer.echo(f"Cannot listen on {address}: {str(e)}", err=True)
+        raise typer.Exit(code=1)
+    if warm:
+        typer.echo(f"Warming up {len(warm)} prompt file(s)...", err=True)
+        try:
+            failures = prompt_server.warm(warm)
+        except KeyboardInterrupt:
+            prompt_server.close()
+            raise typer.Exit(code=130)
+        for yaml_path, error in failures:
+            typer.echo(f"Could not warm up {yaml_path}, skipping it: {error}", err=True)
+    typer.echo(f"peac server listening on {prompt_server.address} (Ctrl+C to stop)", err=True)
+    try:
+        prompt_server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
 @app.command()
 def init(name: str):
     template_content = get_template_file()
@@ -44,6 +132,179 @@ def gui():
     from peac.gui.main_app import start_flet_gui
     start_flet_gui()
 
+index_app = typer.Typer(help="Build, update, inspect and verify RAG indexes.")
+app.add_typer(index_app, name="index")
+
+
+def _is_prompt_file(target: str) -> bool:
+    return target.lower().endswith(('.yaml', '.yml'))
+
+
+def _index_targets(target: str):
+    """(index_path, options) of every index of a prompt file, or of a single index path"""
+    if _is_prompt_file(target):
+        return PromptYaml(target).get_rag_indexes()
+    return [(target, {})]
+
+
+def _build_indexes(target, index_path, rebuild, provider, model, chunk_size, overlap,
+                   workers, batch_size, shards, shard_workers, index_format):
+    from peac.providers.rag import get_rag_provider
+    from peac.providers.rag.maintenance import BuildProgress
+
+    # Settings that only change how fast an index is built, never its content
+    tuning = {key: value for key, value in (('workers', workers), ('batch_size', batch_size),
+                                             ('shard_workers', shard_workers)) if value is not None}
+    if _is_prompt_file(target):
+        if index_path:
+            raise typer.BadParameter("Give either a prompt file or SOURCE INDEX_PATH, not both")
+        targets = PromptYaml(target).get_rag_indexes()
+        if not targets:
+            typer.echo(f"No RAG rules found in {target}")
+            return
+    else:
+        if not index_path:
+            raise typer.BadParameter("Missing INDEX_PATH to build from SOURCE")
+        provider_config = {}
+        if shards is not None:
+            provider_config['shards'] = shards
+        if index_format is not None:
+            provider_config['index_format'] = index_format
+        targets = [(index_path, {
+            'source_folder': target,
+            'provider': provider,
+            'embedding_model': model,
+            'chunk_size': chunk_size,
+            'overlap': overlap,
+            'provider_config': provider_config,
+        })]
+
+    failed = 0
+    for path, options in targets:
+        if not options.get('source_folder'):
+            typer.echo(f"Skipping {path}: no source_folder to build it from")
+            continue
+        provider_config = dict(options.get('provider_config', {}), **tuning)
+        if rebuild:
+            provider_config['incremental'] = False
+        rag_provider = get_rag_provider(options.get('provider'))
+        source_files = rag_provider.list_source_files(options['source_folder'])
+        progress = BuildProgress(len(source_files), write=lambda line: typer.echo(f"  {line}", err=True))
+        rag_provider.progress = progress
+
+        typer.echo(f"{'Building' if rebuild else 'Updating'} {path} from {options['source_folder']}")
+        error = rag_provider.build_index(path, dict(options, provider_config=provider_config))
+        if error:
+            failed += 1
+            typer.echo(error, err=True)
+        else:
+            typer.echo(f"Done: {path}: {progress.summary()}")
+    if failed:
+        raise typer.Exit(code=1)
+
+
+# Options shared by `index build` and `index update`
+ProviderOption = Annotated[str, typer.Option(help="RAG provider: fastembed or faiss.")]
+ModelOption = Annotated[str, typer.Option(help="Embedding model.")]
+ChunkSizeOption = Annotated[int, typer.Option(help="Chunk size in characters.")]
+OverlapOption = Annotated[int, typer.Option(help="Overlap between chunks in characters.")]
+WorkersOption = Annotated[Optional[int], typer.Option(help="Processes extracting documents (default: one per CPU).")]
+BatchSizeOption = Annotated[Optional[int], typer.Option(help="Chunks embedded per batch (default: 256).")]
+ShardsOption = Annotated[Optional[str], typer.Option(help="Split into shards: 'subfolder' or a number of shards.")]
+ShardWorkersOption = Annotated[Optional[int], typer.Option(help="Shards built at the same time.")]
+FormatOption = Annotated[Optional[str], typer.Option("--format", help="FastEmbed index format: binary or json.")]
+
+
+@index_app.command("build")
+def index_build(
+    target: str = typer.Argument(..., help="Prompt YAML file (builds all its RAG indexes) or source folder/file."),
+    index_path: Optional[str] = typer.Argument(None, help="Index to write when TARGET is a source folder."),
+    provider: ProviderOption = "fastembed",
+    model: ModelOption = "BAAI/bge-small-en-v1.5",
+    chunk_size: ChunkSizeOption = 512,
+    overlap: OverlapOption = 50,
+    workers: WorkersOption = None,
+    batch_size: BatchSizeOption = None,
+    shards: ShardsOption = None,
+    shard_workers: ShardWorkersOption = None,
+    index_format: FormatOption = None,
+):
+    """Build indexes from scratch, re-embedding every file.
+
+    With a prompt file, the provider, model and chunking of each RAG rule are
+    used and only --workers, --batch-size and --shard-workers apply.
+    """
+    _build_indexes(target, index_path, True, provider, model, chunk_size, overlap,
+                   workers, batch_size, shards, shard_workers, index_format)
+
+
+@index_app.command("update")
+def index_update(
+    target: str = typer.Argument(..., help="Prompt YAML file (updates all its RAG indexes) or source folder/file."),
+    index_path: Optional[str] = typer.Argument(None, help="Index to update when TARGET is a source folder."),
+    provider: ProviderOption = "fastembed",
+    model: ModelOption = "BAAI/bge-small-en-v1.5",
+    chunk_size: ChunkSizeOption = 512,
+    overlap: OverlapOption = 50,
+    workers: WorkersOption = None,
+    batch_size: BatchSizeOption = None,
+    shards: ShardsOption = None,
+    shard_workers: ShardWorkersOption = None,
+    index_format: FormatOption = None,
+):
+    """Update indexes incrementally: only added or changed files are embedded."""
+    _build_indexes(target, index_path, False, provider, model, chunk_size, overlap,
+                   workers, batch_size, shards, shard_workers, index_format)
+
+
+@index_app.command("stats")
+def index_stats(
+    target: str = typer.Argument(..., help="Index path, or prompt YAML file (all its RAG indexes)."),
+):
+    """Show provider, model, dimension, chunk counts and disk size of indexes."""
+    from peac.providers.rag.maintenance import index_stats as read_stats, format_stats
+
+    failed = 0
+    for path, _ in _index_targets(target):
+        try:
+            lines = format_stats(read_stats(path))
+        except (OSError, ValueError) as e:
+            failed += 1
+            typer.echo(f"{path}: {str(e)}", err=True)
+            continue
+        typer.echo("\n".join(lines))
+    if failed:
+        raise typer.Exit(code=1)
+
+
+@index_app.command("verify")
+def index_verify(
+    target: str = typer.Argument(..., help="Index path, or prompt YAML file (all its RAG indexes)."),
+    check_sources: bool = typer.Option(
+        True,
+        "--check-sources/--no-check-sources",
+        help="Warn about source files changed since the index was built."
+    ),
+):
+    """Check index integrity without loading a model or running a query."""
+    from peac.providers.rag.maintenance import verify_index
+
+    failed = 0
+    for path, _ in _index_targets(target):
+        result = verify_index(path, check_sources)
+        for message in result.errors:
+            typer.echo(f"  error: {message}")
+        for message in result.warnings:
+            typer.echo(f"  warning: {message}")
+        if result.ok:
+            typer.echo(f"OK: {path}")
+        else:
+            failed += 1
+            typer.echo(f"FAILED: {path} ({len(result.errors)} errors)")
+    if failed:
+        raise typer.Exit(code=1)
+
+
 def _default_entrypoint():
     """If no args are provided, launch the GUI; otherwise, use the CLI."""
     import sys
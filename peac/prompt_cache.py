@@ -0,0 +1,203 @@
+"""Whole-prompt build cache (``peac prompt --cache``)
+
+Rendering a prompt re-reads every local source, runs every RAG query and
+fetches every web page even when nothing changed since the last run.
+render_cached() stores the prompt text (get_prompt_sentence()) in a SQLite
+database under the PEaC cache directory (see peac.cache_paths). Diagnostics
+printed while rendering (index builds, model loading, warnings) go to stdout
+as usual and are not stored, so a hit prints nothing but the prompt. An entry
+is keyed by
+
+- the resolved extends graph: the path and SHA-256 of every prompt file,
+- the flags that change the output (``--section-headers``),
+
+and records the inputs it was built from:
+
+- a fingerprint (path, size, mtime, inode of every file) of each local source
+  and RAG source folder, taken before the render,
+- the same fingerprint of each RAG index, taken after the render (a render
+  can build or update an index),
+- the SHA-256 of each web response.
+
+An entry is returned only while all of its inputs are unchanged. Web pages are
+fetched again to compare them, unless the entry was validated less than
+PEAC_PROMPT_CACHE_WEB_TTL seconds ago (default 0: always revalidate). The
+total stored size is capped (PEAC_PROMPT_CACHE_MB, default 64; 0 disables the
+cache) and the least recently used entries are evicted first. Any error while
+reading or writing the database is treated as a cache miss.
+"""
+
+import contextlib
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+from .cache_paths import get_cache_dir
+from .extraction_cache import file_digest
+from .sqlite_cache import EVICT_SIZE, SQLiteLRUCache
+
+
+DEFAULT_MAX_MB = 64
+DEFAULT_WEB_TTL = 0.0
+DB_FILE = 'prompts.sqlite3'
+
+# Bumped whenever rendering changes, so stale entries stop matching
+PROMPT_CACHE_VERSION = 2
+
+def _web_ttl_from_env() -> float:
+    try:
+        return float(os.environ.get('PEAC_PROMPT_CACHE_WEB_TTL', DEFAULT_WEB_TTL))
+    except ValueError:
+        return DEFAULT_WEB_TTL
+
+
+def path_fingerprint(path: str) -> str:
+    """Identify the on-disk state of a file, or of every file below a folder"""
+    digest = hashlib.sha256()
+    if os.path.isdir(path):
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                file_path = os.path.join(root, name)
+                try:
+                    stat = os.stat(file_path)
+                except OSError:
+                    continue
+                digest.update(f"{os.path.relpath(file_path, path)}\0{stat.st_size}\0"
+                              f"{stat.st_mtime_ns}\0{stat.st_ino}\n".encode('utf-8', 'surrogateescape'))
+    else:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return 'missing'
+        digest.update(f"{stat.st_size}\0{stat.st_mtime_ns}\0{stat.st_ino}".encode('utf-8'))
+    return digest.hexdigest()
+
+
+def prompt_key(prompt) -> str:
+    """Key of a render: the prompt files of its extends graph and the output flags"""
+    digest = hashlib.sha256()
+    digest.update(json.dumps({'version': PROMPT_CACHE_VERSION, 'root': prompt.yaml_path,
+                              'section_headers': bool(prompt.add_section_headers)}).encode('utf-8'))
+    for yaml_path in sorted(prompt.registry.prompts):
+        digest.update(f"\n{yaml_path}\0{file_digest(yaml_path)}".encode('utf-8', 'surrogateescape'))
+    return digest.hexdigest()
+
+
+def _web_digest(url: str) -> str:
+    from peac.core.peac import get_text_from_url
+
+    # A failing fetch prints a warning; the render would have printed it too
+    with contextlib.redirect_stdout(io.StringIO()):
+        content = get_text_from_url(url)
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+def dependencies_changed(dependencies: List[List[str]], check_web: bool = True) -> bool:
+    """Whether any recorded input of an entry differs from its current state
+
+    With check_web False, web responses are assumed unchanged.
+    """
+    for kind, target, recorded in dependencies:
+        if kind == 'path':
+            if path_fingerprint(target) != recorded:
+                return True
+        elif kind == 'web':
+            if check_web and _web_digest(target) != recorded:
+                return True
+        else:
+            return True
+    return False
+
+
+class PromptCache(SQLiteLRUCache):
+    """SQLite-backed LRU store of rendered prompts, capped by total compressed size"""
+
+    TABLE = 'prompts'
+    COLUMNS = ('output BLOB NOT NULL', 'dependencies TEXT NOT NULL', 'validated REAL NOT NULL')
+    EVICTION = EVICT_SIZE
+    LIMIT_ENV = 'PEAC_PROMPT_CACHE_MB'
+    DEFAULT_LIMIT = DEFAULT_MAX_MB
+    NAME = 'prompt cache'
+
+    def __init__(self, db_path: str, max_bytes: Optional[int] = None):
+        super().__init__(db_path, max_bytes)
+
+    @property
+    def max_bytes(self) -> int:
+        return self.limit
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return {'output', 'dependencies', 'validated'}, or None on a miss"""
+        row = self._get((key,), ('output', 'dependencies', 'validated'))
+        if row is None:
+            return None
+        try:
+            return {'output': zlib.decompress(row[0]).decode('utf-8'),
+                    'dependencies': json.loads(row[1]), 'validated': row[2]}
+        except (zlib.error, UnicodeDecodeError, ValueError):
+            return None
+
+    def put(self, key: str, output: str, dependencies: List[Tuple[str, str, str]]) -> None:
+        """Store a rendered prompt, evicting the least recently used entries over the size cap"""
+        if self.limit <= 0:
+            return
+        blob = zlib.compress(output.encode('utf-8'))
+        self._put((key,), {'output': blob, 'dependencies': json.dumps(dependencies), 'validated': time.time()},
+                  size=len(blob))
+
+    def touch(self, key: str) -> None:
+        """Mark an entry as validated now (restarts its web TTL)"""
+        self._update((key,), {'validated': time.time()})
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_prompt_cache() -> PromptCache:
+    """The prompt cache of the current cache directory (see peac.cache_paths)"""
+    db_path = os.path.join(get_cache_dir(), DB_FILE)
+    with _caches_lock:
+        cache = _caches.get(db_path)
+        if cache is None:
+            cache = PromptCache(db_path)
+            _caches[db_path] = cache
+        return cache
+
+
+def render_cached(prompt, cache: Optional[PromptCache] = None) -> Tuple[str, bool]:
+    """
+    The prompt text of a loaded PromptYaml, from the cache when its inputs are unchanged
+
+    Args:
+        prompt: The PromptYaml to render (its extends graph is already loaded)
+        cache: Defaults to get_prompt_cache()
+
+    Returns:
+        (output, hit): output is get_prompt_sentence(); hit is True when it
+        comes from the cache (and nothing was printed)
+    """
+    if cache is None:
+        cache = get_prompt_cache()
+    key = prompt_key(prompt)
+    entry = cache.get(key)
+    if entry is not None:
+        check_web = time.time() - entry['validated'] >= _web_ttl_from_env()
+        if not dependencies_changed(entry['dependencies'], check_web):
+            if check_web and any(kind == 'web' for kind, _, _ in entry['dependencies']):
+                cache.touch(key)
+            return entry['output'], True
+
+    sources, indexes = prompt.get_source_paths()
+    dependencies = [('path', source, path_fingerprint(source)) for source in sources]
+    output = prompt.get_prompt_sentence()
+    dependencies += [('path', index_path, path_fingerprint(index_path)) for index_path in indexes]
+    dependencies += [('web', url, digest) for url, digest in sorted(prompt.registry.web_responses.items())]
+    cache.put(key, output, dependencies)
+    return output, False
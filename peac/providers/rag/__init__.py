@@ -4,6 +4,8 @@ from .factory import RAGProviderFactory, get_rag_provider
 from .base import BaseRAGProvider
 from .fastembed_provider import FastembedProvider
 from .faiss_provider import FaissProvider
+from .vector_store import convert_json_index
+from .model_registry import get_embedding_model, warm_up as warm_up_models
 
 # Backward compatibility: Import from legacy module
 
@@ -13,5 +15,8 @@ __all__ = [
     'BaseRAGProvider',
     'FastembedProvider',
     'FaissProvider',
+    'convert_json_index',
+    'get_embedding_model',
+    'warm_up_models',
     'RagProvider',  # Legacy support
 ]
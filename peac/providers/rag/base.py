@@ -1,7 +1,19 @@
 """Base abstract class for RAG providers"""
 
+import copy
+import os
+import shutil
 from abc import ABC, abstractmethod
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Callable, Iterable
+
+from . import sharding
+from .extraction import resolve_workers
+from .lexical import RETRIEVAL_DENSE, RETRIEVAL_HYBRID, RETRIEVAL_LEXICAL
+
+
+# float16 and int8 matrices are scored in blocks converted to float32; a block
+# this size stays in the CPU cache while it is multiplied
+SCORE_BLOCK_BYTES = 1 << 20
 
 
 class BaseRAGProvider(ABC):
@@ -9,7 +21,13 @@ class BaseRAGProvider(ABC):
     
     def __init__(self):
         """Initialize the RAG provider"""
-        pass
+        self.query_cache = True
+        self.retrieval = RETRIEVAL_DENSE
+        self.shards = None
+        self.shard_workers = None
+        self.progress = None
+        # lexical.CorpusStats of all shards while searching one shard of a sharded index
+        self.lexical_corpus = None
     
     @abstractmethod
     def parse(self, index_path: str, options: Optional[Dict[str, Any]] = None) -> str:
@@ -47,6 +65,258 @@ class BaseRAGProvider(ABC):
         """
         pass
     
+    @abstractmethod
+    def list_source_files(self, source_path: str) -> List[str]:
+        """
+        List the files the provider indexes under a source folder (or the file itself)
+        
+        Returns:
+            Paths in a stable order; empty if source_path does not exist
+        """
+        pass
+    
+    def parse_batch(self, index_path: str, options_list: List[Dict[str, Any]]) -> List[str]:
+        """
+        Run several RAG requests against the same index
+        
+        All requests must share the index settings (source_folder, chunk_size,
+        overlap, embedding_model, provider_config); only query and top_k may
+        differ. Providers override this to embed and score all queries at once;
+        the default simply calls parse() for each request.
+        
+        Returns:
+            One result string per request, in the order given
+        """
+        return [self.parse(index_path, options) for options in options_list]
+    
+    def build_index(self, index_path: str, options: Dict[str, Any]) -> Optional[str]:
+        """
+        Build or update an index ahead of time, without searching it
+        
+        Takes the options of parse() (the query is not needed). The index is
+        always rebuilt from source_folder: incrementally, unless
+        provider_config.incremental is False. self.progress, if set, is
+        called with the build pipeline after every written batch.
+        
+        Returns:
+            An error message, or None on success
+        """
+        if not options.get('source_folder'):
+            return f"Error: No source folder to build {index_path} from"
+        return self._prepare_index(index_path, dict(options, force_override=True))
+    
+    def _create_sharded_index(self, index_path: str, source_folder: str, options: Dict[str, Any]) -> bool:
+        """
+        Build one sub-index per shard of the source files (see sharding), in parallel
+        
+        Every shard is an incremental build of its own, so shards whose files
+        did not change are left as they are. Shards that no longer have files
+        are deleted, and shards.json is written once all shards are built.
+        """
+        from concurrent.futures import ThreadPoolExecutor
+        
+        source_files = self.list_source_files(source_folder)
+        if not source_files:
+            print(f"No documents found in {source_folder}")
+            return False
+        plan = sharding.plan_shards(source_folder, source_files, self.shards)
+        
+        if os.path.isfile(index_path):
+            os.remove(index_path)
+        elif os.path.isdir(index_path) and not sharding.is_sharded(index_path):
+            # A single-index build at this path is replaced by the shards
+            shutil.rmtree(index_path)
+        
+        provider_config = {key: value for key, value in options.get('provider_config', {}).items()
+                           if key not in ('shards', 'shard_workers')}
+        shard_workers = self._shard_workers(len(plan))
+        # Shards are built at the same time: split the extraction processes between them
+        provider_config['workers'] = max(1, resolve_workers(provider_config.get('workers')) // shard_workers)
+        shard_options = dict(options, force_override=True, provider_config=provider_config)
+        
+        def build(name):
+            # A shallow copy keeps the model and settings but gets its own build state
+            shard = copy.copy(self)
+            return shard._prepare_index(sharding.shard_path(index_path, name), shard_options,
+                                        source_files=plan[name])
+        
+        print(f"Building sharded index: {index_path} ({len(plan)} shards, {len(source_files)} files)")
+        with ThreadPoolExecutor(max_workers=shard_workers, thread_name_prefix='peac-shard') as pool:
+            errors = list(pool.map(build, plan))
+        failed = [name for name, error in zip(plan, errors) if error]
+        if failed:
+            print(f"Error: failed to build shards: {', '.join(failed)}")
+            return False
+        
+        removed = sharding.remove_stale_shards(index_path, list(plan))
+        if removed:
+            print(f"Removed empty shards: {', '.join(removed)}")
+        sharding.write_shards(index_path, self.PROVIDER_NAME, self.shards,
+                              [{'name': name, 'files': len(files)} for name, files in plan.items()])
+        return True
+    
+    def _search_sharded_batch(self, index_path: str, queries: List[str], top_ks: List[int],
+                              embedding_model: str) -> List[List[Dict[str, Any]]]:
+        """
+        Search every shard concurrently and merge the per-shard top_k results
+        
+        Queries are embedded once for all shards (not at all for lexical
+        retrieval); each shard is searched by the provider's
+        _search_index_batch. Scores are made comparable before merging:
+        cosine scores already are, BM25 scores use the statistics of all
+        shards (lexical.CorpusStats), and for hybrid retrieval the dense and
+        lexical rankings are merged across shards first and fused once, so
+        ranks are those of the whole index.
+        """
+        from concurrent.futures import ThreadPoolExecutor
+        from .lexical import CorpusStats, HYBRID_DEPTH
+        
+        paths = [sharding.shard_path(index_path, shard['name'])
+                 for shard in sharding.load_shards(index_path)['shards']]
+        if not paths:
+            return [[] for _ in queries]
+        query_embeddings = None
+        if self.retrieval != RETRIEVAL_LEXICAL:
+            query_embeddings = self._embed_queries(queries, embedding_model)
+        
+        with ThreadPoolExecutor(max_workers=self._shard_workers(len(paths)), thread_name_prefix='peac-shard') as pool:
+            corpus = None
+            if self.retrieval != RETRIEVAL_DENSE:
+                corpus = CorpusStats(list(pool.map(self._open_lexical_index, paths)))
+            
+            def search(retrieval, depths):
+                # A shallow copy per mode: shards are searched concurrently with these settings
+                searcher = copy.copy(self)
+                searcher.retrieval = retrieval
+                searcher.lexical_corpus = corpus
+                per_shard = list(pool.map(
+                    lambda path: searcher._search_index_batch(path, queries, depths, embedding_model,
+                                                              query_embeddings), paths))
+                return [sharding.merge_top_k([results[i] for results in per_shard], depth)
+                        for i, depth in enumerate(depths)]
+            
+            if self.retrieval != RETRIEVAL_HYBRID:
+                return search(self.retrieval, top_ks)
+            depths = [max(top_k, HYBRID_DEPTH) if top_k > 0 else 0 for top_k in top_ks]
+            dense_results = search(RETRIEVAL_DENSE, depths)
+            lexical_results = search(RETRIEVAL_LEXICAL, depths)
+        return [sharding.fuse_results([dense, lexical], top_k)
+                for dense, lexical, top_k in zip(dense_results, lexical_results, top_ks)]
+    
+    def _open_lexical_index(self, index_path: str):
+        """The LexicalIndex of a (non-sharded) index, see _load_lexical_index"""
+        raise NotImplementedError(f"{type(self).__name__} does not support lexical retrieval")
+    
+    def _shard_workers(self, num_shards: int) -> int:
+        """Threads used to build or search shards: shard_workers, or one per CPU"""
+        workers = self.shard_workers or os.cpu_count() or 1
+        return max(1, min(int(workers), num_shards))
+    
+    def _embed_query(self, query: str, embedding_model: str):
+        """Embed a single search query (see _embed_queries)"""
+        return self._embed_queries([query], embedding_model)[0]
+    
+    def _embed_queries(self, queries: List[str], embedding_model: str):
+        """
+        Embed search queries, going through the persistent query cache
+        
+        Cache misses are embedded with a single model.embed call, and the
+        embedding model (subclass _initialize_model) is only loaded if there is
+        at least one miss, so a run whose queries are all cached never loads it.
+        
+        Returns:
+            (len(queries), dimension) float32 matrix
+        """
+        import numpy as np
+        from .query_cache import get_query_cache
+        
+        cache = get_query_cache() if self.query_cache else None
+        vectors = [None] * len(queries)
+        if cache is not None:
+            for i, query in enumerate(queries):
+                vectors[i] = cache.get(embedding_model, query)
+        
+        missing = sorted({query for query, vector in zip(queries, vectors) if vector is None})
+        if missing:
+            model = self._initialize_model(embedding_model)
+            embedded = {
+                query: np.asarray(vector, dtype=np.float32)
+                for query, vector in zip(missing, model.embed(missing))
+            }
+            for i, query in enumerate(queries):
+                if vectors[i] is None:
+                    vectors[i] = embedded[query]
+            if cache is not None:
+                for query, vector in embedded.items():
+                    cache.put(embedding_model, query, vector)
+        
+        return np.vstack(vectors) if vectors else np.empty((0, 0), dtype=np.float32)
+    
+    def _rank_batch(self, queries: List[str], top_ks: List[int],
+                    dense: Callable[[List[int]], List[List[tuple]]],
+                    load_lexical: Callable[[], Any]) -> List[List[tuple]]:
+        """
+        Rank index rows for several queries with the configured retrieval mode
+        
+        Args:
+            queries: Search queries
+            top_ks: Number of rows to return, one per query
+            dense: Returns one (score, row) list per query for the given
+                   top_ks by embedding similarity (embeds the queries)
+            load_lexical: Returns the LexicalIndex of the index
+        
+        Returns:
+            One list of (score, row) per query, best first. 'lexical' never
+            calls dense, so the embedding model is not loaded; 'hybrid' fuses
+            the HYBRID_DEPTH best rows of both rankings (see fuse_rankings).
+        """
+        from .lexical import RETRIEVAL_LEXICAL, RETRIEVAL_HYBRID, HYBRID_DEPTH, fuse_rankings
+        
+        if self.retrieval == RETRIEVAL_LEXICAL:
+            return load_lexical().search_batch(queries, top_ks, self.lexical_corpus)
+        if self.retrieval != RETRIEVAL_HYBRID:
+            return dense(top_ks)
+        
+        depths = [max(top_k, HYBRID_DEPTH) if top_k > 0 else 0 for top_k in top_ks]
+        dense_rankings = dense(depths)
+        lexical_rankings = load_lexical().search_batch(queries, depths, self.lexical_corpus)
+        return [fuse_rankings([dense_ranking, lexical_ranking], top_k)
+                for dense_ranking, lexical_ranking, top_k in zip(dense_rankings, lexical_rankings, top_ks)]
+    
+    @staticmethod
+    def _load_lexical_index(lexical_dir: str, count: int, records: Callable[[], Iterable[Dict[str, Any]]]):
+        """
+        Load a lexical index through the process-wide index cache
+        
+        Indexes built before lexical search existed (or whose lexical index no
+        longer matches their row count) get one built from their stored chunk
+        records; this needs no embedding model.
+        """
+        from .index_cache import get_index_cache
+        from .lexical import LexicalIndex, build_lexical_index, lexical_exists, lexical_files
+        
+        def loader():
+            index = LexicalIndex.load(lexical_dir)
+            return index, index.memory_bytes
+        
+        cache = get_index_cache()
+        index = None
+        if lexical_exists(lexical_dir):
+            index = cache.get('lexical', lexical_dir, lexical_files(lexical_dir), loader)
+        if index is None or len(index) != count:
+            print(f"Building lexical index: {lexical_dir}")
+            build_lexical_index(lexical_dir, records())
+            index = cache.get('lexical', lexical_dir, lexical_files(lexical_dir), loader)
+        return index
+    
+    @staticmethod
+    def _format_duplicates(duplicates: List[Dict[str, Any]], limit: int = 5) -> str:
+        """Other places a chunk was found, e.g. 'b.md (chunk 0), c.md (chunk 2) and 3 more'"""
+        shown = ', '.join(f"{d['source']} (chunk {d['chunk_id']})" for d in duplicates[:limit])
+        if len(duplicates) > limit:
+            shown += f" and {len(duplicates) - limit} more"
+        return shown
+    
     @staticmethod
     def _cosine_similarity(vec1: List[float], vec2: List[float]) -> float:
         """Compute cosine similarity between two vectors"""
@@ -58,3 +328,126 @@ class BaseRAGProvider(ABC):
             return 0.0
         
         return dot_product / (norm1 * norm2)
+    
+    @staticmethod
+    def _top_k_cosine(embeddings, query_vector, top_k: int, normalized: bool = False) -> List[tuple]:
+        """
+        Score all embeddings against a query with one matrix-vector product
+        
+        Args:
+            embeddings: (n, d) matrix (numpy array or memmap)
+            query_vector: (d,) query embedding
+            top_k: Number of best matches to keep
+            normalized: True if the rows of embeddings already have unit norm
+        
+        Returns:
+            List of (score, row_index) sorted by descending score, ties by row index
+        """
+        return BaseRAGProvider._top_k_cosine_batch(embeddings, [query_vector], [top_k], normalized)[0]
+    
+    @staticmethod
+    def _top_k_cosine_batch(embeddings, query_vectors, top_ks: List[int],
+                            normalized: bool = False, scales=None) -> List[List[tuple]]:
+        """
+        Score all embeddings against several queries with one matrix-matrix product
+        
+        Args:
+            embeddings: (n, d) matrix (numpy array or memmap); float16 and
+                        int8 matrices are scored in blocks of SCORE_BLOCK_BYTES
+                        converted to float32
+            query_vectors: (q, d) query embeddings
+            top_ks: Number of best matches to keep, one per query
+            normalized: True if the rows of embeddings already have unit norm
+            scales: Per-dimension scales of an int8 matrix (row * scales)
+        
+        Returns:
+            One list of (score, row_index) per query, sorted by descending
+            score, ties by row index
+        """
+        import numpy as np
+        
+        reduced = getattr(embeddings, 'dtype', None) in (np.float16, np.int8)
+        matrix = embeddings if reduced else np.asarray(embeddings, dtype=np.float32)
+        n = matrix.shape[0] if matrix.ndim == 2 else 0
+        if n == 0 or not len(top_ks) or max(top_ks) <= 0:
+            return [[] for _ in top_ks]
+        
+        queries = np.asarray(query_vectors, dtype=np.float32).reshape(len(top_ks), -1)
+        query_norms = np.linalg.norm(queries, axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            queries = np.where(query_norms[:, None] > 0, queries / query_norms[:, None], 0.0)
+        queries = queries.T.astype(np.float32)
+        
+        # (n, q) similarities in a single product (one per block for reduced precision)
+        if reduced:
+            if scales is not None and normalized:
+                # (q * s) . u == q . (s * u): scale the queries instead of every block
+                queries, scales = queries * scales[:, None], None
+            rows = max(1, SCORE_BLOCK_BYTES // (4 * matrix.shape[1]))
+            buffer = np.empty((rows, matrix.shape[1]), dtype=np.float32)
+            scores = np.empty((n, len(top_ks)), dtype=np.float32)
+            for start in range(0, n, rows):
+                stored = matrix[start:start + rows]
+                block = buffer[:len(stored)]
+                np.copyto(block, stored, casting='unsafe')
+                if scales is not None:
+                    block *= scales
+                scores[start:start + len(block)] = BaseRAGProvider._cosine_block(block, queries, normalized)
+        else:
+            scores = BaseRAGProvider._cosine_block(matrix, queries, normalized)
+        
+        results = []
+        for column, top_k in enumerate(top_ks):
+            if top_k <= 0:
+                results.append([])
+                continue
+            column_scores = scores[:, column]
+            if top_k < n:
+                candidates = np.argpartition(-column_scores, top_k - 1)[:top_k]
+            else:
+                candidates = np.arange(n)
+            order = np.lexsort((candidates, -column_scores[candidates]))
+            results.append([(float(column_scores[i]), int(i)) for i in candidates[order]])
+        return results
+    
+    @staticmethod
+    def _cosine_block(matrix, queries, normalized: bool):
+        """(rows, q) cosine similarities of float32 rows against unit query columns (d, q)"""
+        import numpy as np
+        
+        scores = matrix @ queries
+        if not normalized:
+            norms = np.linalg.norm(matrix, axis=1)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                scores = np.where(norms[:, None] > 0, scores / norms[:, None], 0.0)
+        return scores
+    
+    @staticmethod
+    def _rerank_exact(exact, query_vectors, rankings: List[List[tuple]], top_ks: List[int]) -> List[List[tuple]]:
+        """
+        Re-score candidate rows against full-precision unit vectors
+        
+        Args:
+            exact: (n, d) float32 matrix with unit rows (memmap: only the
+                   candidate rows are read)
+            query_vectors: (q, d) query embeddings
+            rankings: Candidate (score, row) lists, one per query
+            top_ks: Number of rows to keep, one per query
+        
+        Returns:
+            One list of (exact score, row) per query, sorted by descending
+            score, ties by row index
+        """
+        import numpy as np
+        
+        results = []
+        for query, ranking, top_k in zip(np.asarray(query_vectors, dtype=np.float32), rankings, top_ks):
+            if not ranking or top_k <= 0:
+                results.append([])
+                continue
+            rows = np.array(sorted(row for _, row in ranking), dtype=np.int64)
+            norm = np.linalg.norm(query)
+            scores = np.asarray(exact[rows], dtype=np.float32) @ (query / norm if norm > 0 else query)
+            order = np.lexsort((rows, -scores))[:top_k]
+            results.append([(float(scores[i]), int(rows[i])) for i in order])
+        return results
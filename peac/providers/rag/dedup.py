@@ -0,0 +1,133 @@
+"""Chunk de-duplication for RAG index builds
+
+Source folders repeat boilerplate (license headers, shared README sections)
+across many files, and every copy used to be embedded and stored. During a
+build, ChunkDeduplicator finds the earlier chunk, if any, that a new chunk
+duplicates:
+
+- 'exact' (default): same normalized text, found by a 128-bit BLAKE2b hash.
+- 'near': exact matches, plus chunks whose MinHash signature (word 3-shingles)
+  estimates a Jaccard similarity of at least ``threshold`` with an earlier
+  chunk. Candidates are found with LSH banding, so each chunk is compared
+  with a handful of others rather than with every chunk seen so far.
+- 'off': every chunk gets its own row.
+
+A duplicate is not embedded and gets no row of its own: the index records it
+as an extra (source, chunk_id) occurrence of the row it duplicates (see
+vector_store.DuplicateMap), so search results still list every source. In
+'near' mode the text of a dropped chunk is not kept; its representative's
+text is returned instead.
+"""
+
+import hashlib
+import re
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+
+DEDUP_OFF = 'off'
+DEDUP_EXACT = 'exact'
+DEDUP_NEAR = 'near'
+DEDUP_MODES = (DEDUP_OFF, DEDUP_EXACT, DEDUP_NEAR)
+
+DEFAULT_NEAR_THRESHOLD = 0.9
+
+_MERSENNE_PRIME = (1 << 31) - 1
+_WORD = re.compile(r'\w+')
+
+
+def resolve_dedup_mode(mode: Optional[str]) -> str:
+    """Validate a provider_config 'dedup' value (None, True and False are accepted)"""
+    if mode is None or mode is True:
+        return DEDUP_EXACT
+    if mode is False:
+        return DEDUP_OFF
+    mode = str(mode).lower().strip()
+    if mode not in DEDUP_MODES:
+        raise ValueError(f"Unknown dedup mode: '{mode}'. Available modes: {', '.join(DEDUP_MODES)}")
+    return mode
+
+
+class ChunkDeduplicator:
+    """Maps chunk texts to the first row that holds the same (or nearly the same) text"""
+
+    def __init__(self, mode: str = DEDUP_EXACT, threshold: float = DEFAULT_NEAR_THRESHOLD,
+                 num_perm: int = 64, bands: int = 16, shingle_size: int = 3):
+        self.mode = resolve_dedup_mode(mode)
+        if num_perm % bands:
+            raise ValueError(f"bands ({bands}) must divide num_perm ({num_perm})")
+        self.threshold = float(threshold)
+        self.num_perm = num_perm
+        self.bands = bands
+        self.shingle_size = shingle_size
+        self._exact: Dict[bytes, int] = {}
+        self._buckets: Dict[Tuple[int, bytes], List[int]] = {}
+        self._signatures: Dict[int, object] = {}
+        self._permutations = None
+
+    def canonical_row(self, text: str, row: int) -> int:
+        """
+        Row that holds this chunk
+
+        Returns an earlier row when the text duplicates it; otherwise the text
+        is registered under ``row`` and ``row`` is returned.
+        """
+        if self.mode == DEDUP_OFF:
+            return row
+
+        key = hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest()
+        earlier = self._exact.get(key)
+        if earlier is not None:
+            return earlier
+
+        if self.mode == DEDUP_NEAR:
+            signature = self._signature(text)
+            if signature is not None:
+                earlier = self._near_match(signature)
+                if earlier is not None:
+                    # ``row`` is not created: exact repeats map to the match too
+                    self._exact[key] = earlier
+                    return earlier
+                self._register(signature, row)
+        self._exact[key] = row
+        return row
+
+    def _signature(self, text: str):
+        import numpy as np
+
+        words = _WORD.findall(text.lower())
+        if not words:
+            return None
+        size = min(self.shingle_size, len(words))
+        shingles = {' '.join(words[i:i + size]) for i in range(len(words) - size + 1)}
+        hashes = np.fromiter((zlib.crc32(shingle.encode('utf-8')) for shingle in shingles),
+                             dtype=np.int64, count=len(shingles))
+        if self._permutations is None:
+            rng = np.random.default_rng(1)
+            self._permutations = (rng.integers(1, _MERSENNE_PRIME, self.num_perm, dtype=np.int64),
+                                  rng.integers(0, _MERSENNE_PRIME, self.num_perm, dtype=np.int64))
+        a, b = self._permutations
+        # Universal hashing (a*x + b) mod p; x < 2^32 and a < 2^31 keep it within int64
+        return ((np.outer(hashes, a) + b) % _MERSENNE_PRIME).min(axis=0)
+
+    def _band_keys(self, signature):
+        rows = self.num_perm // self.bands
+        return [(band, signature[band * rows:(band + 1) * rows].tobytes()) for band in range(self.bands)]
+
+    def _near_match(self, signature) -> Optional[int]:
+        import numpy as np
+
+        seen = set()
+        for key in self._band_keys(signature):
+            for candidate in self._buckets.get(key, ()):
+                if candidate in seen:
+                    continue
+                seen.add(candidate)
+                if np.mean(self._signatures[candidate] == signature) >= self.threshold:
+                    return candidate
+        return None
+
+    def _register(self, signature, row: int):
+        self._signatures[row] = signature
+        for key in self._band_keys(signature):
+            self._buckets.setdefault(key, []).append(row)
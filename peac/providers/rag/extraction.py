@@ -0,0 +1,128 @@
+"""Parallel text extraction for RAG index builds
+
+PDF and DOCX extraction is CPU-bound and, on large folders, costs more than
+embedding. iter_documents() runs a provider's reader in a process pool and
+yields the documents in the order of the input paths, whatever order the
+workers finish in. Only a bounded window of files is in flight at a time, so
+an index build holds a few documents in memory rather than the whole corpus.
+A file whose extraction raises, or crashes its worker process, is reported
+and skipped; the remaining files are still extracted.
+"""
+
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+
+# Below this many files the pool start-up costs more than it saves
+PARALLEL_MIN_FILES = 16
+
+# Files submitted ahead of the one being consumed, per worker
+PREFETCH_PER_WORKER = 2
+
+
+def resolve_workers(workers: Optional[int] = None) -> int:
+    """Worker count to use: the given value, or one per CPU"""
+    if workers is None:
+        workers = os.cpu_count() or 1
+    return max(1, int(workers))
+
+
+def _read_one(reader: Callable[..., str], file_path: str, digest: Optional[str] = None) -> str:
+    return reader(file_path) if digest is None else reader(file_path, digest)
+
+
+def _read_in_process(reader: Callable[..., str], file_path: str, digest: Optional[str] = None) -> str:
+    try:
+        return _read_one(reader, file_path, digest)
+    except Exception as e:
+        print(f"Error reading {file_path}: {str(e)}")
+        return ''
+
+
+def _read_isolated(reader: Callable[..., str], file_path: str, digest: Optional[str] = None) -> str:
+    """Read one file in its own worker process, so a crash only loses this file"""
+    try:
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            return pool.submit(_read_one, reader, file_path, digest).result()
+    except Exception as e:
+        print(f"Error reading {file_path}: {str(e)}")
+        return ''
+
+
+def iter_documents(file_paths: List[str], reader: Callable[..., str],
+                   workers: Optional[int] = None,
+                   digests: Optional[Dict[str, str]] = None) -> Iterator[Tuple[str, str]]:
+    """
+    Extract files lazily, skipping empty, unreadable or failing ones
+
+    Args:
+        file_paths: Files to read, in the order documents should be yielded
+        reader: Picklable callable returning the text of one file (a module
+                function or a classmethod, not a bound instance method)
+        workers: Worker processes (default: one per CPU; 1 reads in-process)
+        digests: Known SHA-256 of some files (e.g. from the index manifest),
+                 passed as ``reader(file_path, digest)``; other files are
+                 read with ``reader(file_path)``
+
+    Yields:
+        (file_path, content) in the order of file_paths
+    """
+    workers = resolve_workers(workers)
+    digests = digests or {}
+    if workers == 1 or len(file_paths) < PARALLEL_MIN_FILES:
+        for file_path in file_paths:
+            content = _read_in_process(reader, file_path, digests.get(file_path))
+            if content:
+                yield file_path, content
+        return
+
+    workers = min(workers, len(file_paths))
+    window = workers * PREFETCH_PER_WORKER
+    remaining = iter(file_paths)
+    pending = deque()
+    pool = ProcessPoolExecutor(max_workers=workers)
+    try:
+        while True:
+            while len(pending) < window:
+                file_path = next(remaining, None)
+                if file_path is None:
+                    break
+                try:
+                    pending.append((file_path, pool, pool.submit(_read_one, reader, file_path,
+                                                                         digests.get(file_path))))
+                except BrokenProcessPool:
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    pool = ProcessPoolExecutor(max_workers=workers)
+                    pending.append((file_path, pool, pool.submit(_read_one, reader, file_path,
+                                                                         digests.get(file_path))))
+            if not pending:
+                break
+
+            file_path, owner, future = pending.popleft()
+            try:
+                content = future.result()
+            except BrokenProcessPool:
+                # A worker died (e.g. a crashing PDF parser) and took its pool
+                # down: files it still owned are retried one per process, so
+                # only the culprit is lost, and a fresh pool takes the rest
+                if owner is pool:
+                    print("Extraction worker crashed; retrying unfinished files in isolation")
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    pool = ProcessPoolExecutor(max_workers=workers)
+                content = _read_isolated(reader, file_path, digests.get(file_path))
+            except Exception as e:
+                print(f"Error reading {file_path}: {str(e)}")
+                content = ''
+            if content:
+                yield file_path, content
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def read_documents(file_paths: List[str], reader: Callable[[str], str],
+                   workers: Optional[int] = None) -> List[Tuple[str, str]]:
+    """Extract all files at once (see iter_documents), returning a list"""
+    return list(iter_documents(file_paths, reader, workers))
@@ -8,33 +8,69 @@ import re
 import pickle
 
 from .base import BaseRAGProvider
+from .model_registry import get_embedding_model
+from .extraction import iter_documents
+from .text_normalizer import normalize_text, NORMALIZER_VERSION
+from .vector_store import ChunkStore, ChunkStoreWriter, DuplicateMap, CHUNKS_FILE, OFFSETS_FILE, DUPLICATES_FILE
+from .index_cache import get_index_cache
+from .manifest import IndexManifest, manifest_path_for
+from .pipeline import ChunkPipeline, PreviousRows, embed_texts, DEFAULT_QUEUE_SIZE
+from .dedup import ChunkDeduplicator, resolve_dedup_mode, DEDUP_EXACT, DEDUP_NEAR, DEFAULT_NEAR_THRESHOLD
+from .lexical import LexicalIndexBuilder, resolve_retrieval_mode
+from . import sharding
 
 
 class FaissProvider(BaseRAGProvider):
     """RAG provider using FAISS for scalable vector search"""
     
+    PROVIDER_NAME = 'faiss'
     DEFAULT_MODEL = 'BAAI/bge-small-en-v1.5'
     
+    INDEX_FILE = 'index.faiss'
+    METADATA_FILE = 'metadata.json'
+    LEGACY_METADATA_FILE = 'metadata.pkl'
+    VECTORS_FILE = 'vectors.f32'
+    METADATA_VERSION = 2
+    
+    # Quantized index types do not keep the original vectors; a raw copy is
+    # written next to them so incremental rebuilds stay exact
+    LOSSY_INDEX_TYPES = ('ivfpq', 'sq8', 'ivfsq8')
+    
+    # Quantizers are trained on at most this many rows (or 256 per IVF list,
+    # the most faiss k-means uses); vectors are added in slices of ADD_BATCH_SIZE
+    MAX_TRAINING_POINTS = 65536
+    ADD_BATCH_SIZE = 65536
+    
     def __init__(self):
         super().__init__()
         self.model = None
         self.index = None
         self.metadata = None
         self._current_model_name = None
+        self.model_options = {}
+        self.incremental = True
+        self.workers = None
+        self.queue_size = DEFAULT_QUEUE_SIZE
+        self.dedup = DEDUP_EXACT
+        self.dedup_threshold = DEFAULT_NEAR_THRESHOLD
+        self.batch_size = 256
+        self.mmap = True
+        self.index_type = 'flat'
+        self.metric_type = 'L2'
+        self.n_clusters = 100
+        self.pq_m = None
+        self.pq_nbits = 8
+        self.hnsw_m = 32
+        self.nprobe = None
+        self.ef_search = None
+        self.search_params = {}
     
     def _initialize_model(self, model_name: str = DEFAULT_MODEL):
-        """Initialize FastEmbed model for embedding generation"""
-        try:
-            from fastembed import TextEmbedding
-            
-            if self.model is None or self._current_model_name != model_name:
-                print(f"Loading FastEmbed model: {model_name}")
-                self.model = TextEmbedding(model_name=model_name)
-                self._current_model_name = model_name
-                print(f"Model loaded successfully")
-            return self.model
-        except ImportError:
-            raise ImportError("fastembed library not installed. Install with: pip install fastembed")
+        """Get the FastEmbed model from the process-wide model registry"""
+        if self.model is None or self._current_model_name != model_name:
+            self.model = get_embedding_model(model_name, **self.model_options)
+            self._current_model_name = model_name
+        return self.model
     
     def parse(self, index_path: str, options: Optional[Dict[str, Any]] = None) -> str:
         """
@@ -51,9 +87,43 @@ class FaissProvider(BaseRAGProvider):
                 - force_override: Force recreation of index (default: False)
                 - embedding_model: Model name for embedding (default: BAAI/bge-small-en-v1.5)
                 - provider_config: Provider-specific options:
-                    - index_type: 'flat', 'ivf', 'hnsw' (default: 'flat')
+                    - index_type: 'flat', 'ivf', 'hnsw', 'ivfpq', 'sq8',
+                      'ivfsq8' (default: 'flat')
                     - metric_type: 'L2', 'IP' (default: 'L2')
-                    - n_clusters: Number of clusters for IVF (default: 100)
+                    - n_clusters: Number of clusters for IVF types (default: 100)
+                    - pq_m: Sub-quantizers for 'ivfpq', must divide the
+                      embedding dimension (default: largest divisor <= dim/8)
+                    - pq_nbits: Bits per sub-quantizer code (default: 8)
+                    - hnsw_m: Neighbors per node for 'hnsw' (default: 32)
+                    - nprobe: IVF lists visited per query (default: stored
+                      with the index, sqrt(nlist))
+                    - ef_search: HNSW search depth (default: stored with the
+                      index, 64)
+                    - incremental: Reuse vectors of unchanged files when an
+                      index is rebuilt (default: True)
+                    - batch_size: Chunks embedded per batch while building
+                      (default: 256)
+                    - model_options: Extra TextEmbedding arguments, e.g. threads
+                    - workers: Processes used to extract documents (default:
+                      one per CPU; 1 extracts in-process)
+                    - queue_size: Extracted documents buffered ahead of the
+                      embedder while building (default: 16)
+                    - dedup: 'exact' to store repeated chunks once, 'near' to
+                      also drop near-duplicates, 'off' (default: 'exact')
+                    - dedup_threshold: MinHash similarity for 'near' (default: 0.9)
+                    - query_cache: Reuse query embeddings stored on disk
+                      (default: True)
+                    - retrieval: 'dense' (FAISS search), 'lexical' (BM25, no
+                      model loaded) or 'hybrid' (both, fused by reciprocal
+                      rank) (default: 'dense')
+                    - shards: Split the index into shards, one per top-level
+                      'subfolder' of source_folder or a number of shards
+                      (files assigned by path hash); shards are built and
+                      searched in parallel (default: no sharding)
+                    - shard_workers: Shards built or searched at the same
+                      time (default: one per CPU)
+                    - mmap: Memory-map index.faiss instead of reading it into
+                      memory, where the index type allows it (default: True)
         
         Returns:
             Retrieved and ranked text content
@@ -65,8 +135,64 @@ class FaissProvider(BaseRAGProvider):
         if not query:
             return "Error: No query provided for RAG search"
         
-        source_folder = options.get('source_folder', '')
         top_k = options.get('top_k', 5)
+        embedding_model = options.get('embedding_model', self.DEFAULT_MODEL)
+        
+        error = self._prepare_index(index_path, options)
+        if error:
+            return error
+        
+        # Load index and perform search
+        try:
+            results = self._search_index(index_path, query, top_k, embedding_model)
+            return self._format_results(results, query)
+        except Exception as e:
+            return f"Error during RAG search: {str(e)}"
+    
+    def parse_batch(self, index_path: str, options_list: List[Dict[str, Any]]) -> List[str]:
+        """
+        Run several RAG requests against the same FAISS index in one pass
+        
+        The index is prepared once (from the first request's settings), all
+        queries are embedded with one model.embed call and searched with a
+        single index.search call.
+        
+        Returns:
+            One result string per request, in the order given
+        """
+        if not options_list:
+            return []
+        
+        options = options_list[0]
+        embedding_model = options.get('embedding_model', self.DEFAULT_MODEL)
+        error = self._prepare_index(index_path, options)
+        if error:
+            return [error] * len(options_list)
+        
+        outputs = ["Error: No query provided for RAG search"] * len(options_list)
+        pending = [i for i, item in enumerate(options_list) if item.get('query', '')]
+        if not pending:
+            return outputs
+        
+        queries = [options_list[i]['query'] for i in pending]
+        top_ks = [options_list[i].get('top_k', 5) for i in pending]
+        try:
+            batch_results = self._search_index_batch(index_path, queries, top_ks, embedding_model)
+            for i, query, results in zip(pending, queries, batch_results):
+                outputs[i] = self._format_results(results, query)
+        except Exception as e:
+            for i in pending:
+                outputs[i] = f"Error during RAG search: {str(e)}"
+        return outputs
+    
+    def _prepare_index(self, index_path: str, options: Dict[str, Any],
+                       source_files: Optional[List[str]] = None) -> Optional[str]:
+        """Apply provider_config and create the index if needed; returns an error message or None
+        
+        source_files restricts a build to these files of source_folder (used
+        for the shards of a sharded index).
+        """
+        source_folder = options.get('source_folder', '')
         chunk_size = options.get('chunk_size', 512)
         overlap = options.get('overlap', 50)
         force_override = options.get('force_override', False)
@@ -76,9 +202,26 @@ class FaissProvider(BaseRAGProvider):
         self.index_type = provider_config.get('index_type', 'flat')
         self.metric_type = provider_config.get('metric_type', 'L2')
         self.n_clusters = provider_config.get('n_clusters', 100)
+        self.pq_m = provider_config.get('pq_m')
+        self.pq_nbits = provider_config.get('pq_nbits', 8)
+        self.hnsw_m = provider_config.get('hnsw_m', 32)
+        self.nprobe = provider_config.get('nprobe')
+        self.ef_search = provider_config.get('ef_search')
+        self.incremental = provider_config.get('incremental', True)
+        self.workers = provider_config.get('workers')
+        self.queue_size = provider_config.get('queue_size', DEFAULT_QUEUE_SIZE)
+        self.dedup = resolve_dedup_mode(provider_config.get('dedup'))
+        self.dedup_threshold = provider_config.get('dedup_threshold', DEFAULT_NEAR_THRESHOLD)
+        self.batch_size = provider_config.get('batch_size', 256)
+        self.model_options = provider_config.get('model_options', {})
+        self.query_cache = provider_config.get('query_cache', True)
+        self.retrieval = resolve_retrieval_mode(provider_config.get('retrieval'))
+        self.shards = sharding.resolve_shards(provider_config.get('shards'))
+        self.shard_workers = provider_config.get('shard_workers')
+        self.mmap = provider_config.get('mmap', True)
         
         # Check if index exists and if we should override it
-        should_create_index = force_override or not self._index_exists(index_path)
+        should_create_index = force_override or not (self._index_exists(index_path) or sharding.is_sharded(index_path))
         
         if should_create_index:
             if source_folder:
@@ -89,7 +232,13 @@ class FaissProvider(BaseRAGProvider):
                 else:
                     print(f"Index not found. Creating from source: {source_folder}")
                 
-                success = self._create_index(index_path, source_folder, chunk_size, overlap, embedding_model)
+                if self.shards:
+                    success = self._create_sharded_index(index_path, source_folder, options)
+                else:
+                    if sharding.is_sharded(index_path):
+                        sharding.remove_shards(index_path)
+                    success = self._create_index(index_path, source_folder, chunk_size, overlap, embedding_model,
+                                                 source_files)
                 if not success:
                     return f"Error: Failed to create index from {source_folder}"
             else:
@@ -98,19 +247,170 @@ class FaissProvider(BaseRAGProvider):
                 if not success:
                     return f"Error: Failed to create default index at {index_path}"
         
-        # Load index and perform search
-        try:
-            results = self._search_index(index_path, query, top_k, embedding_model)
-            return self._format_results(results, query)
-        except Exception as e:
-            return f"Error during RAG search: {str(e)}"
+        return None
     
     def _index_exists(self, index_path: str) -> bool:
-        """Check if FAISS index exists at the given path"""
+        """Check if FAISS index exists at the given path (current or legacy pickle metadata)"""
         index_dir = Path(index_path)
         return (index_dir.is_dir() and 
-                (index_dir / 'index.faiss').exists() and 
-                (index_dir / 'metadata.pkl').exists())
+                (index_dir / self.INDEX_FILE).exists() and 
+                ((index_dir / self.METADATA_FILE).exists() or
+                 (index_dir / self.LEGACY_METADATA_FILE).exists()))
+    
+    @classmethod
+    def _index_files(cls, index_path: str) -> List[str]:
+        """Files an index is loaded from (used to detect on-disk changes)"""
+        index_dir = Path(index_path)
+        if (index_dir / cls.METADATA_FILE).exists():
+            names = [cls.INDEX_FILE, cls.METADATA_FILE, CHUNKS_FILE, OFFSETS_FILE, DUPLICATES_FILE]
+        else:
+            names = [cls.INDEX_FILE, cls.LEGACY_METADATA_FILE]
+        return [str(index_dir / name) for name in names]
+    
+    @classmethod
+    def _read_metadata(cls, index_path: str) -> Dict[str, Any]:
+        """
+        Read index metadata
+        
+        With the current format 'chunks' is a ChunkStore, so only the records a
+        query returns are read from disk, and 'duplicates' the DuplicateMap of
+        de-duplicated chunks; legacy metadata.pkl indexes are unpickled whole
+        and 'chunks' is a list.
+        """
+        index_dir = Path(index_path)
+        metadata_file = index_dir / cls.METADATA_FILE
+        if metadata_file.exists():
+            with open(metadata_file, 'r', encoding='utf-8') as f:
+                metadata = json.load(f)
+            metadata['chunks'] = ChunkStore(str(index_dir / CHUNKS_FILE), str(index_dir / OFFSETS_FILE))
+            if len(metadata['chunks']) != metadata.get('num_chunks', len(metadata['chunks'])):
+                raise ValueError(f"Chunk store of {index_path} does not match its metadata")
+            metadata['duplicates'] = DuplicateMap.load(str(index_dir / DUPLICATES_FILE))
+            return metadata
+        
+        with open(index_dir / cls.LEGACY_METADATA_FILE, 'rb') as f:
+            metadata = pickle.load(f)
+        metadata['duplicates'] = DuplicateMap()
+        return metadata
+    
+    def _stage_rows(self, index_path: str, rows, lexical: Optional[LexicalIndexBuilder] = None) -> int:
+        """
+        Write the chunk records and raw vectors of a build as temporary files
+        
+        (vectors, records, duplicates) batches are appended to
+        chunks.jsonl.tmp, chunks.offsets.tmp, duplicates.jsonl.tmp and
+        vectors.f32.tmp as they arrive, so no batch is kept after it is
+        written; records are also added to the lexical index builder.
+        Returns the number of rows.
+        """
+        import numpy as np
+        
+        index_dir = Path(index_path)
+        index_dir.mkdir(parents=True, exist_ok=True)
+        writer = ChunkStoreWriter(str(index_dir / f"{CHUNKS_FILE}.tmp"), str(index_dir / f"{OFFSETS_FILE}.tmp"))
+        try:
+            with open(index_dir / f"{self.VECTORS_FILE}.tmp", 'wb') as f, \
+                    open(index_dir / f"{DUPLICATES_FILE}.tmp", 'w', encoding='utf-8') as duplicates_file:
+                for vectors, records, duplicates in rows:
+                    if records:
+                        f.write(np.ascontiguousarray(vectors, dtype='<f4').tobytes())
+                    for record in records:
+                        writer.append(record)
+                    if lexical is not None:
+                        lexical.add(records)
+                    for entry in duplicates:
+                        duplicates_file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        finally:
+            writer.close()
+        return len(writer)
+    
+    def _discard_staged(self, index_path: str) -> None:
+        """Remove temporary files left by an unfinished build"""
+        for name in (self.INDEX_FILE, self.METADATA_FILE, self.VECTORS_FILE, CHUNKS_FILE, OFFSETS_FILE,
+                     DUPLICATES_FILE):
+            tmp_file = Path(index_path) / f"{name}.tmp"
+            if tmp_file.exists():
+                tmp_file.unlink()
+    
+    def _build_index(self, index_path: str, embedding_model: str, rows) -> int:
+        """
+        Stage rows, build the FAISS index from the staged vectors and publish it
+        
+        The staged vectors are memory-mapped while the index is trained and
+        filled, so the build holds the FAISS index itself plus one slice of
+        vectors. Returns the number of rows (0: nothing was written).
+        """
+        import numpy as np
+        
+        try:
+            lexical = LexicalIndexBuilder()
+            count = self._stage_rows(index_path, rows, lexical)
+            if not count:
+                self._discard_staged(index_path)
+                return 0
+            
+            print(f"Creating FAISS index with {count} vectors...")
+            vectors_tmp = Path(index_path) / f"{self.VECTORS_FILE}.tmp"
+            vectors = np.memmap(str(vectors_tmp), dtype='<f4', mode='r').reshape(count, -1)
+            index = self._create_faiss_index(vectors)
+            del vectors
+            self._write_index_files(index_path, index, embedding_model, count, lexical)
+        except Exception:
+            self._discard_staged(index_path)
+            raise
+        return count
+    
+    def _write_index_files(self, index_path: str, index, embedding_model: str, num_chunks: int,
+                           lexical: Optional[LexicalIndexBuilder] = None) -> None:
+        """
+        Write index.faiss, the lexical index and metadata.json and publish the staged chunk store
+        
+        Every file is written next to its target and moved into place, so
+        processes that memory-mapped the previous version keep a valid mapping.
+        metadata.json is replaced last; a legacy metadata.pkl is removed. For
+        quantized index types the staged raw vectors are kept in vectors.f32.
+        """
+        import faiss
+        
+        index_dir = Path(index_path)
+        get_index_cache().invalidate(index_path)
+        
+        faiss.write_index(index, str(index_dir / f"{self.INDEX_FILE}.tmp"))
+        if lexical is not None:
+            lexical.write(str(index_dir))
+        
+        names = [self.INDEX_FILE, CHUNKS_FILE, OFFSETS_FILE, DUPLICATES_FILE]
+        keep_vectors = self.index_type in self.LOSSY_INDEX_TYPES
+        if keep_vectors:
+            names.append(self.VECTORS_FILE)
+        else:
+            (index_dir / f"{self.VECTORS_FILE}.tmp").unlink()
+        
+        metadata = {
+            'format_version': self.METADATA_VERSION,
+            'provider': 'faiss',
+            'embedding_model': embedding_model,
+            'index_type': self.index_type,
+            'metric_type': self.metric_type,
+            'dimension': int(index.d),
+            'num_chunks': num_chunks,
+            'build_config': self._build_config(),
+            'search_params': self.search_params,
+        }
+        with open(index_dir / f"{self.METADATA_FILE}.tmp", 'w', encoding='utf-8') as f:
+            json.dump(metadata, f, ensure_ascii=False, indent=2)
+        names.append(self.METADATA_FILE)
+        
+        for name in names:
+            os.replace(index_dir / f"{name}.tmp", index_dir / name)
+        
+        vectors_file = index_dir / self.VECTORS_FILE
+        if not keep_vectors and vectors_file.exists():
+            vectors_file.unlink()
+        
+        legacy_file = index_dir / self.LEGACY_METADATA_FILE
+        if legacy_file.exists():
+            legacy_file.unlink()
     
     def _create_default_index(self, index_path: str, embedding_model: str = DEFAULT_MODEL) -> bool:
         """Create a default empty index with sample data"""
@@ -133,29 +433,11 @@ class FaissProvider(BaseRAGProvider):
             print(f"Creating default FAISS index with {len(sample_chunks)} sample chunks...")
             
             # Generate embeddings
-            embeddings_list = list(model.embed(sample_chunks, batch_size=256))
+            embeddings_list = list(model.embed(sample_chunks, batch_size=self.batch_size))
             embeddings_array = self._convert_embeddings(embeddings_list)
             
-            # Create FAISS index
-            index = self._create_faiss_index(embeddings_array)
-            
-            # Save index
-            index_dir = Path(index_path)
-            index_dir.mkdir(parents=True, exist_ok=True)
-            
-            import faiss
-            faiss.write_index(index, str(index_dir / 'index.faiss'))
-            
-            metadata = {
-                'provider': 'faiss',
-                'embedding_model': embedding_model,
-                'index_type': self.index_type,
-                'metric_type': self.metric_type,
-                'chunks': chunk_metadata,
-            }
-            
-            with open(index_dir / 'metadata.pkl', 'wb') as f:
-                pickle.dump(metadata, f)
+            # Create and save the FAISS index
+            self._build_index(index_path, embedding_model, [(embeddings_array, chunk_metadata, [])])
             
             print(f"Default FAISS index created successfully: {index_path}")
             print(f"Total sample chunks: {len(sample_chunks)}")
@@ -170,61 +452,52 @@ class FaissProvider(BaseRAGProvider):
             return False
     
     def _create_index(self, index_path: str, source_folder: str, chunk_size: int = 512, 
-                     overlap: int = 50, embedding_model: str = DEFAULT_MODEL) -> bool:
-        """Create FAISS index from source folder/file"""
+                     overlap: int = 50, embedding_model: str = DEFAULT_MODEL,
+                     source_files: Optional[List[str]] = None) -> bool:
+        """Create FAISS index from source folder/file
+        
+        If a compatible index and manifest already exist, only added or changed
+        files are re-read and re-embedded; vectors of removed files are dropped.
+        source_files, when given, replaces the files listed from source_folder.
+        """
         try:
-            model = self._initialize_model(embedding_model)
-            
-            documents = self._collect_documents(source_folder)
-            if not documents:
+            if source_files is None:
+                source_files = self.list_source_files(source_folder)
+            if not source_files:
                 print(f"No documents found in {source_folder}")
                 return False
             
-            print(f"Found {len(documents)} documents. Creating chunks...")
-            
-            chunks = []
-            chunk_metadata = []
-            
-            for doc_path, content in documents:
-                doc_chunks = self._create_chunks(content, chunk_size, overlap)
-                for i, chunk in enumerate(doc_chunks):
-                    chunks.append(chunk)
-                    chunk_metadata.append({
-                        'source': doc_path,
-                        'chunk_id': i,
-                        'text': chunk
-                    })
-            
-            print(f"Created {len(chunks)} chunks. Generating embeddings...")
-            
-            embeddings_list = list(model.embed(chunks, batch_size=256))
-            embeddings_array = self._convert_embeddings(embeddings_list)
-            
-            print(f"Creating FAISS index with {len(chunks)} vectors...")
-            
-            # Create FAISS index
-            index = self._create_faiss_index(embeddings_array)
-            
-            # Save index
-            index_dir = Path(index_path)
-            index_dir.mkdir(parents=True, exist_ok=True)
-            
-            import faiss
-            faiss.write_index(index, str(index_dir / 'index.faiss'))
-            
-            metadata = {
-                'provider': 'faiss',
-                'embedding_model': embedding_model,
-                'index_type': self.index_type,
-                'metric_type': self.metric_type,
-                'chunks': chunk_metadata,
-            }
+            settings = {'embedding_model': embedding_model, 'chunk_size': chunk_size, 'overlap': overlap,
+                        'text_normalizer': NORMALIZER_VERSION, 'dedup': self.dedup,
+                        'dedup_threshold': self.dedup_threshold if self.dedup == DEDUP_NEAR else None}
+            manifest_file = manifest_path_for(index_path)
+            previous_manifest, previous_build = self._load_previous_build(index_path, manifest_file, settings)
+            diff = (previous_manifest or IndexManifest(settings)).diff(source_files)
+            
+            if previous_build is not None:
+                previous_metadata, _ = previous_build
+                if not diff.has_changes and self._same_index_config(previous_metadata):
+                    previous_manifest.refreshed(diff).save(manifest_file)
+                    print(f"FAISS index is up to date: {index_path} ({len(source_files)} files unchanged)")
+                    return True
+                print(f"Updating FAISS index incrementally: {diff.summary()}")
+            
+            # Documents -> chunks -> embedding batches -> staged files, one batch at a time
+            pipeline = self._chunk_pipeline(source_files, diff, previous_build,
+                                            chunk_size, overlap, embedding_model)
+            previous_build = None
+            written = self._build_index(index_path, embedding_model, pipeline)
+            
+            if not written:
+                print(f"No documents found in {source_folder}")
+                return False
             
-            with open(index_dir / 'metadata.pkl', 'wb') as f:
-                pickle.dump(metadata, f)
+            IndexManifest.from_diff(settings, diff, chunk_counts=pipeline.chunk_counts).save(manifest_file)
             
             print(f"FAISS index created successfully: {index_path}")
-            print(f"Total chunks: {len(chunks)}")
+            print(f"Total chunks: {pipeline.rows} ({pipeline.unique} unique, "
+                  f"{pipeline.embedded} embedded in {pipeline.batches} batches)")
+            print(f"Build stages: {pipeline.stage_report()}")
             print(f"Index type: {self.index_type}, Metric: {self.metric_type}")
             return True
             
@@ -235,58 +508,212 @@ class FaissProvider(BaseRAGProvider):
             print(f"Error creating FAISS index: {str(e)}")
             return False
     
+    def _chunk_pipeline(self, source_files: List[str], diff, previous_build,
+                        chunk_size: int, overlap: int, embedding_model: str) -> ChunkPipeline:
+        """Streaming pipeline that embeds diff.to_embed and copies unchanged rows from previous_build"""
+        import numpy as np
+        
+        def embed(texts):
+            return embed_texts(self._initialize_model(embedding_model), texts, self.batch_size)
+        
+        previous = None
+        if previous_build is not None:
+            metadata, vectors = previous_build
+            chunks = metadata['chunks']
+            duplicates = metadata.get('duplicates') or DuplicateMap()
+            
+            def fetch(rows):
+                return np.asarray(vectors[rows], dtype=np.float32), self._get_chunks(chunks, rows)
+            
+            previous = PreviousRows((chunk['source'] for chunk in chunks), duplicates, fetch)
+        
+        return ChunkPipeline(
+            source_files, diff.unchanged, self._iter_documents(diff.to_embed, diff.digests(diff.to_embed)),
+            lambda content: self._create_chunks(content, chunk_size, overlap),
+            embed, self.batch_size, previous, self.queue_size,
+            ChunkDeduplicator(self.dedup, self.dedup_threshold), self.progress,
+        )
+    
+    def _build_config(self) -> Dict[str, Any]:
+        """Requested settings that shape the stored index (search parameters excluded)"""
+        return {
+            'n_clusters': self.n_clusters,
+            'pq_m': self.pq_m,
+            'pq_nbits': self.pq_nbits,
+            'hnsw_m': self.hnsw_m,
+        }
+    
+    def _same_index_config(self, metadata: Dict[str, Any]) -> bool:
+        """True if an existing index was built with the current index type, metric and build settings"""
+        return (metadata.get('index_type') == self.index_type and
+                metadata.get('metric_type') == self.metric_type and
+                metadata.get('build_config', self._build_config()) == self._build_config())
+    
+    def _load_previous_build(self, index_path: str, manifest_file: str, settings: Dict[str, Any]):
+        """Return (manifest, (metadata, vectors)) of an existing compatible build, or (None, None)
+        
+        Vectors are memory-mapped from vectors.f32 or reconstructed from the
+        stored index, so the FAISS index can be rebuilt (and retrained) without
+        re-embedding unchanged files.
+        """
+        if not self.incremental or not self._index_exists(index_path):
+            return None, None
+        manifest = IndexManifest.load(manifest_file)
+        if manifest is None or not manifest.is_compatible(settings):
+            return None, None
+        try:
+            import faiss
+            
+            import numpy as np
+            
+            metadata = self._read_metadata(index_path)
+            vectors_file = Path(index_path) / self.VECTORS_FILE
+            if vectors_file.exists():
+                vectors = np.memmap(str(vectors_file), dtype='<f4', mode='r').reshape(len(metadata['chunks']), -1)
+            elif metadata.get('index_type') in self.LOSSY_INDEX_TYPES:
+                raise ValueError("quantized index has no stored vectors")
+            else:
+                index = faiss.read_index(str(Path(index_path) / self.INDEX_FILE))
+                vectors = self._reconstruct_vectors(index)
+            if vectors.shape[0] != len(metadata['chunks']):
+                raise ValueError("index and metadata sizes differ")
+        except Exception as e:
+            print(f"Existing FAISS index cannot be reused, rebuilding from scratch: {str(e)}")
+            return None, None
+        return manifest, (metadata, vectors)
+    
+    @staticmethod
+    def _reconstruct_vectors(index):
+        """Read all stored vectors back from a FAISS index"""
+        import faiss
+        
+        ivf = faiss.try_extract_index_ivf(index)
+        if ivf is not None:
+            ivf.make_direct_map()
+        return index.reconstruct_n(0, index.ntotal)
+    
     def _create_faiss_index(self, embeddings_array):
-        """Create appropriate FAISS index based on configuration"""
+        """
+        Create appropriate FAISS index based on configuration
+        
+        Also sets self.search_params, the default nprobe/efSearch stored in
+        metadata.json with the index.
+        """
         try:
             import faiss
             import numpy as np
             
-            d = embeddings_array.shape[1]  # Dimension
+            n, d = embeddings_array.shape  # Count, dimension
+            metric = faiss.METRIC_INNER_PRODUCT if self.metric_type == 'IP' else faiss.METRIC_L2
+            self.search_params = {}
             
             if self.index_type == 'flat':
-                if self.metric_type == 'IP':
-                    index = faiss.IndexFlatIP(d)
-                else:  # L2
-                    index = faiss.IndexFlatL2(d)
+                index = faiss.IndexFlat(d, metric)
+            
+            elif self.index_type in ('ivf', 'ivfpq', 'ivfsq8'):
+                nlist = self._nlist(n)
+                quantizer = faiss.IndexFlat(d, metric)
+                if self.index_type == 'ivf':
+                    index = faiss.IndexIVFFlat(quantizer, d, nlist, metric)
+                elif self.index_type == 'ivfpq':
+                    pq_m = self.pq_m or self._default_pq_m(d)
+                    if d % pq_m:
+                        raise ValueError(f"pq_m ({pq_m}) must divide the embedding dimension ({d})")
+                    # k-means needs at least 2^nbits training points per sub-quantizer
+                    nbits = min(self.pq_nbits, max(1, int(np.log2(min(n, self._training_limit(nlist))))))
+                    index = faiss.IndexIVFPQ(quantizer, d, nlist, pq_m, nbits, metric)
+                else:
+                    index = faiss.IndexIVFScalarQuantizer(quantizer, d, nlist,
+                                                          faiss.ScalarQuantizer.QT_8bit, metric)
+                index.train(self._training_sample(embeddings_array, nlist))
+                self.search_params['nprobe'] = max(1, int(round(nlist ** 0.5)))
             
-            elif self.index_type == 'ivf':
-                nlist = min(self.n_clusters, embeddings_array.shape[0] // 4)
-                quantizer = faiss.IndexFlatL2(d) if self.metric_type == 'L2' else faiss.IndexFlatIP(d)
-                index = faiss.IndexIVFFlat(quantizer, d, nlist)
-                index.train(embeddings_array.astype(np.float32))
+            elif self.index_type == 'sq8':
+                index = faiss.IndexScalarQuantizer(d, faiss.ScalarQuantizer.QT_8bit, metric)
+                index.train(self._training_sample(embeddings_array))
             
             elif self.index_type == 'hnsw':
-                index = faiss.IndexHNSWFlat(d, 32)
-                if self.metric_type == 'IP':
-                    index.metric_type = faiss.METRIC_INNER_PRODUCT
+                index = faiss.IndexHNSWFlat(d, self.hnsw_m, metric)
+                self.search_params['ef_search'] = 64
             
             else:
                 # Default to flat
-                index = faiss.IndexFlatL2(d)
+                print(f"Unknown FAISS index type '{self.index_type}', using 'flat'")
+                index = faiss.IndexFlat(d, metric)
             
-            index.add(embeddings_array.astype(np.float32))
+            for start in range(0, n, self.ADD_BATCH_SIZE):
+                index.add(np.ascontiguousarray(embeddings_array[start:start + self.ADD_BATCH_SIZE],
+                                               dtype=np.float32))
             return index
             
         except ImportError:
             raise ImportError("FAISS not installed")
     
+    def _training_limit(self, nlist: int = 1) -> int:
+        return max(self.MAX_TRAINING_POINTS, 256 * nlist)
+    
+    def _training_sample(self, embeddings_array, nlist: int = 1):
+        """All rows, or a fixed-seed random sample of _training_limit(nlist) rows for large builds"""
+        import numpy as np
+        
+        n = embeddings_array.shape[0]
+        limit = self._training_limit(nlist)
+        if n <= limit:
+            return np.ascontiguousarray(embeddings_array, dtype=np.float32)
+        rows = np.sort(np.random.default_rng(0).choice(n, size=limit, replace=False))
+        return np.ascontiguousarray(embeddings_array[rows], dtype=np.float32)
+    
+    def _nlist(self, n: int) -> int:
+        """Number of IVF lists: n_clusters, lowered so each list gets ~39 training points"""
+        return max(1, min(self.n_clusters, n // 39))
+    
+    @staticmethod
+    def _default_pq_m(d: int) -> int:
+        """Largest divisor of d not above d / 8 (8-bit codes are then 32x smaller than float32)"""
+        for m in range(max(1, d // 8), 0, -1):
+            if d % m == 0:
+                return m
+        return 1
+    
+    def _search_parameters(self, index, metadata: Dict[str, Any]):
+        """faiss SearchParameters from provider_config, falling back to values stored with the index"""
+        import faiss
+        
+        stored = metadata.get('search_params', {})
+        if faiss.try_extract_index_ivf(index) is not None:
+            nprobe = self.nprobe if self.nprobe is not None else stored.get('nprobe')
+            if nprobe:
+                return faiss.SearchParametersIVF(nprobe=int(nprobe))
+        elif isinstance(index, faiss.IndexHNSW):
+            ef_search = self.ef_search if self.ef_search is not None else stored.get('ef_search')
+            if ef_search:
+                return faiss.SearchParametersHNSW(efSearch=int(ef_search))
+        return None
+    
     def _collect_documents(self, source_path: str) -> List[tuple]:
         """Collect documents from source path"""
-        documents = []
+        return self._read_documents(self.list_source_files(source_path))
+    
+    def list_source_files(self, source_path: str) -> List[str]:
+        """List supported files under source path in a stable order"""
         source_path = Path(source_path)
         
         if source_path.is_file():
-            content = self._read_file_content(str(source_path))
-            if content:
-                documents.append((str(source_path), content))
-        elif source_path.is_dir():
-            for file_path in source_path.rglob('*'):
-                if file_path.is_file() and self._is_text_file(file_path):
-                    content = self._read_file_content(str(file_path))
-                    if content:
-                        documents.append((str(file_path), content))
-        
-        return documents
+            return [str(source_path)]
+        if source_path.is_dir():
+            return sorted(
+                str(file_path) for file_path in source_path.rglob('*')
+                if file_path.is_file() and self._is_text_file(file_path)
+            )
+        return []
+    
+    def _read_documents(self, file_paths: List[str]) -> List[tuple]:
+        """Read files in a process pool (in order), skipping empty or unreadable ones"""
+        return list(self._iter_documents(file_paths))
+    
+    def _iter_documents(self, file_paths: List[str], digests: Optional[Dict[str, str]] = None):
+        """Yield (path, content) lazily, extracting ahead in a process pool (digests: known SHA-256 per file)"""
+        return iter_documents(file_paths, type(self)._read_file_content, self.workers, digests)
     
     @staticmethod
     def _is_text_file(file_path: Path) -> bool:
@@ -296,35 +723,34 @@ class FaissProvider(BaseRAGProvider):
                           '.pdf', '.docx', '.doc'}
         return file_path.suffix.lower() in text_extensions
     
-    def _read_file_content(self, file_path: str) -> str:
-        """Read content from various file types"""
+    @classmethod
+    def _read_file_content(cls, file_path: str, digest: Optional[str] = None) -> str:
+        """Read content from various file types (classmethod, so worker processes can run it)
+        
+        digest is the file's SHA-256 when already known, used as the extraction cache key.
+        """
         try:
             file_ext = Path(file_path).suffix.lower()
             
             if file_ext == '.pdf':
-                return self._read_pdf(file_path)
+                return cls._read_pdf(file_path, digest)
             elif file_ext in ['.docx', '.doc']:
-                return self._read_docx(file_path)
+                return cls._read_docx(file_path, digest)
             else:
                 with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
                     content = f.read()
-                return self._clean_text(content)
+                return cls._clean_text(content)
         except Exception as e:
             print(f"Error reading {file_path}: {str(e)}")
             return ""
     
     @staticmethod
-    def _read_pdf(file_path: str) -> str:
-        """Read PDF content using pdfplumber"""
+    def _read_pdf(file_path: str, digest: Optional[str] = None) -> str:
+        """Read PDF content using pdfplumber (cached, shared with local rules)"""
         try:
-            import pdfplumber
-            text = ""
-            with pdfplumber.open(file_path) as pdf:
-                for page in pdf.pages:
-                    page_text = page.extract_text()
-                    if page_text:
-                        text += page_text + "\n"
-            return FaissProvider._clean_text(text)
+            from ...extraction_cache import cached_extract
+            from ..pdf import PdfProvider
+            return FaissProvider._clean_text(cached_extract(file_path, PdfProvider(), digest=digest))
         except ImportError:
             print("pdfplumber not available for PDF reading")
             return ""
@@ -333,15 +759,13 @@ class FaissProvider(BaseRAGProvider):
             return ""
     
     @staticmethod
-    def _read_docx(file_path: str) -> str:
-        """Read DOCX content"""
+    def _read_docx(file_path: str, digest: Optional[str] = None) -> str:
+        """Read DOCX content (cached, shared with local rules)"""
         try:
-            from docx import Document
-            doc = Document(file_path)
-            text = ""
-            for paragraph in doc.paragraphs:
-                text += paragraph.text + "\n"
-            return FaissProvider._clean_text(text)
+            from ...extraction_cache import cached_extract
+            from ..docx import DocxProvider
+            # DocxProvider drops blank paragraphs, which normalization removes anyway
+            return FaissProvider._clean_text(cached_extract(file_path, DocxProvider(), digest=digest))
         except ImportError:
             print("python-docx not available for DOCX reading")
             return ""
@@ -351,24 +775,15 @@ class FaissProvider(BaseRAGProvider):
     
     @staticmethod
     def _clean_text(text: str) -> str:
-        """Clean and normalize extracted text"""
-        text = re.sub(r'\s+', ' ', text)
-        text = re.sub(r'\n\s*\n', '\n\n', text)
-        text = re.sub(r'([a-z])([A-Z])', r'\1 \2', text)
-        text = re.sub(r'([.!?])([A-Z])', r'\1 \2', text)
-        text = re.sub(r'(\w)-\n(\w)', r'\1\2', text)
-        text = re.sub(r'(\w)\n(\w)', r'\1 \2', text)
-        text = re.sub(r'([a-z])([A-Z][a-z])', r'\1 \2', text)
-        text = re.sub(r'(\w)([A-Z]+)(\w)', r'\1 \2 \3', text)
-        text = ' '.join(text.split())
-        
-        return text
+        """Clean and normalize extracted text (see text_normalizer)"""
+        return normalize_text(text)
     
     @staticmethod
     def _create_chunks(text: str, chunk_size: int, overlap: int) -> List[str]:
-        """Create overlapping text chunks"""
-        text = FaissProvider._clean_text(text)
+        """Create overlapping text chunks
         
+        Expects text already normalized by _read_file_content.
+        """
         if len(text) <= chunk_size:
             return [text]
         
@@ -409,48 +824,115 @@ class FaissProvider(BaseRAGProvider):
     def _search_index(self, index_path: str, query: str, top_k: int, 
                      embedding_model: str = DEFAULT_MODEL) -> List[Dict]:
         """Search FAISS index for relevant documents"""
+        return self._search_index_batch(index_path, [query], [top_k], embedding_model)[0]
+    
+    def _search_index_batch(self, index_path: str, queries: List[str], top_ks: List[int],
+                            embedding_model: str = DEFAULT_MODEL, query_embeddings=None) -> List[List[Dict]]:
+        """Search FAISS index for several queries with one index.search call
+        
+        query_embeddings, when given, are used instead of embedding the queries.
+        """
+        if sharding.is_sharded(index_path):
+            return self._search_sharded_batch(index_path, queries, top_ks, embedding_model)
+        
         try:
             import faiss
             import numpy as np
             
-            model = self._initialize_model(embedding_model)
-            
-            # Load index and metadata
-            index_dir = Path(index_path)
-            index = faiss.read_index(str(index_dir / 'index.faiss'))
-            
-            with open(index_dir / 'metadata.pkl', 'rb') as f:
-                metadata = pickle.load(f)
+            # Load index and metadata (shared across providers through the index cache)
+            index, metadata = self._load_index(index_path, mmap=self.mmap)
             
             chunks_metadata = metadata['chunks']
             
-            # Generate query embedding
-            query_embedding_raw = list(model.embed([query]))[0]
-            query_embedding = query_embedding_raw.tolist() if hasattr(query_embedding_raw, 'tolist') else query_embedding_raw
-            query_array = np.array([query_embedding], dtype=np.float32)
-            
-            # Search
-            distances, indices = index.search(query_array, min(top_k, len(chunks_metadata)))
-            
-            # Prepare results
-            results = []
-            for rank, idx in enumerate(indices[0], 1):
-                if idx < len(chunks_metadata):
-                    result = chunks_metadata[int(idx)].copy()
-                    # Convert distance to similarity (for L2 distance, use negative distance)
-                    score = 1.0 / (1.0 + distances[0][rank - 1]) if distances[0][rank - 1] > 0 else 0.0
+            def dense(dense_top_ks):
+                # Generate query embeddings (the model is only loaded on query cache misses)
+                query_array = query_embeddings
+                if query_array is None:
+                    query_array = self._embed_queries(queries, embedding_model)
+                
+                # Search all queries at once with the largest k, then cut per query
+                k = min(max(dense_top_ks), len(chunks_metadata))
+                if k <= 0:
+                    return [[] for _ in queries]
+                distances, indices = index.search(query_array, k, params=self._search_parameters(index, metadata))
+                inner_product = index.metric_type == faiss.METRIC_INNER_PRODUCT
+                
+                rankings = []
+                for row, top_k in enumerate(dense_top_ks):
+                    ranking = []
+                    for distance, idx in zip(distances[row][:max(top_k, 0)], indices[row][:max(top_k, 0)]):
+                        if 0 <= idx < len(chunks_metadata):
+                            # Inner product is already a similarity; map L2 distance to (0, 1]
+                            distance = float(distance)
+                            score = distance if inner_product else 1.0 / (1.0 + max(distance, 0.0))
+                            ranking.append((score, int(idx)))
+                    rankings.append(ranking)
+                return rankings
+            
+            def load_lexical():
+                return self._load_lexical_index(index_path, len(chunks_metadata), lambda: iter(chunks_metadata))
+            
+            # Prepare results, reading only the returned chunk records
+            all_results = []
+            for ranking in self._rank_batch(queries, top_ks, dense, load_lexical):
+                records = self._get_chunks(chunks_metadata, [idx for _, idx in ranking], metadata.get('duplicates'))
+                results = []
+                for rank, ((score, _), result) in enumerate(zip(ranking, records), 1):
                     result['score'] = float(score)
                     result['rank'] = rank
                     results.append(result)
+                all_results.append(results)
             
-            return results
+            return all_results
             
         except ImportError:
             print("FAISS not installed")
-            return []
+            return [[] for _ in queries]
         except Exception as e:
             print(f"Error searching FAISS index: {str(e)}")
-            return []
+            return [[] for _ in queries]
+    
+    def _open_lexical_index(self, index_path: str):
+        """The lexical index of a FAISS index (built from its chunks when missing)"""
+        _, metadata = self._load_index(index_path, mmap=self.mmap)
+        chunks_metadata = metadata['chunks']
+        return self._load_lexical_index(index_path, len(chunks_metadata), lambda: iter(chunks_metadata))
+    
+    @classmethod
+    def _load_index(cls, index_path: str, mmap: bool = True):
+        """Load (faiss index, metadata) through the process-wide index cache
+        
+        With mmap the index file is memory-mapped (faiss.IO_FLAG_MMAP); index
+        types that cannot be mapped are read into memory instead.
+        """
+        files = cls._index_files(index_path)
+        
+        def loader():
+            import faiss
+            index = None
+            if mmap:
+                try:
+                    index = faiss.read_index(files[0], faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+                except Exception as e:
+                    print(f"Memory-mapping {files[0]} not supported, reading it into memory: {str(e)}")
+            if index is None:
+                index = faiss.read_index(files[0])
+            metadata = cls._read_metadata(index_path)
+            return (index, metadata), sum(os.path.getsize(path) for path in files)
+        
+        namespace = 'faiss-mmap' if mmap else 'faiss'
+        return get_index_cache().get(namespace, index_path, files, loader)
+    
+    @staticmethod
+    def _get_chunks(chunks, ids: List[int], duplicates: Optional[DuplicateMap] = None) -> List[Dict[str, Any]]:
+        """Copies of the chunk records with the given ids (ChunkStore or legacy list), with their duplicates"""
+        if hasattr(chunks, 'get_many'):
+            records = chunks.get_many(ids)
+        else:
+            records = [dict(chunks[idx]) for idx in ids]
+        if duplicates:
+            records = [duplicates.attach(idx, record) for idx, record in zip(ids, records)]
+        return records
     
     @staticmethod
     def _convert_embeddings(embeddings_list):
@@ -476,6 +958,8 @@ class FaissProvider(BaseRAGProvider):
         for result in results:
             output += f"Rank {result['rank']} (Score: {result['score']:.3f})\n"
             output += f"Source: {result['source']}\n"
+            if result.get('duplicates'):
+                output += f"Also in: {self._format_duplicates(result['duplicates'])}\n"
             output += f"Chunk ID: {result['chunk_id']}\n"
             output += "-" * 30 + "\n"
             
@@ -7,11 +7,22 @@ from typing import Dict, Any, Optional, List
 import re
 
 from .base import BaseRAGProvider
+from .model_registry import get_embedding_model
+from .extraction import iter_documents
+from .text_normalizer import normalize_text, NORMALIZER_VERSION
+from . import vector_store
+from .index_cache import get_index_cache
+from .manifest import IndexManifest, manifest_path_for
+from .pipeline import ChunkPipeline, PreviousRows, embed_texts, DEFAULT_QUEUE_SIZE
+from .dedup import ChunkDeduplicator, resolve_dedup_mode, DEDUP_EXACT, DEDUP_NEAR, DEFAULT_NEAR_THRESHOLD
+from .lexical import LexicalIndexBuilder, resolve_retrieval_mode
+from . import sharding
 
 
 class FastembedProvider(BaseRAGProvider):
     """RAG provider using FastEmbed for lightweight embeddings"""
     
+    PROVIDER_NAME = 'fastembed'
     DEFAULT_MODEL = 'BAAI/bge-small-en-v1.5'
     
     def __init__(self):
@@ -19,28 +30,30 @@ class FastembedProvider(BaseRAGProvider):
         self.model = None
         self.embeddings_cache = {}
         self._current_model_name = None
+        self.model_options = {}
+        self.index_format = None
+        self.incremental = True
+        self.workers = None
+        self.queue_size = DEFAULT_QUEUE_SIZE
+        self.dedup = DEDUP_EXACT
+        self.dedup_threshold = DEFAULT_NEAR_THRESHOLD
+        self.dtype = vector_store.DTYPE_FLOAT32
+        self.rerank = 0
     
     def _initialize_model(self, model_name: str = DEFAULT_MODEL):
-        """Initialize FastEmbed model (lightweight, no PyTorch dependency)"""
-        try:
-            from fastembed import TextEmbedding
-            
-            # Reload model only if model_name is different or model is None
-            if self.model is None or self._current_model_name != model_name:
-                print(f"Loading FastEmbed model: {model_name}")
-                self.model = TextEmbedding(model_name=model_name)
-                self._current_model_name = model_name
-                print(f"Model loaded successfully")
-            return self.model
-        except ImportError:
-            raise ImportError("fastembed library not installed. Install with: pip install fastembed")
+        """Get the FastEmbed model from the process-wide model registry"""
+        if self.model is None or self._current_model_name != model_name:
+            self.model = get_embedding_model(model_name, **self.model_options)
+            self._current_model_name = model_name
+        return self.model
     
     def parse(self, index_path: str, options: Optional[Dict[str, Any]] = None) -> str:
         """
         Parse RAG request and return relevant documents using FastEmbed
         
         Args:
-            index_path: Path to the vector index file (JSON format)
+            index_path: Path to the vector index: a directory for the binary
+                        format, or a file ending in .json for the legacy JSON format
             options: Dictionary containing:
                 - query: Search query for RAG retrieval
                 - source_folder: Folder/file to embed if index file doesn't exist
@@ -52,6 +65,35 @@ class FastembedProvider(BaseRAGProvider):
                 - provider_config: Provider-specific options:
                     - batch_size: Batch size for embedding (default: 256)
                     - device: 'cpu' or 'gpu' (default: 'cpu')
+                    - index_format: 'binary' or 'json' (default: 'json' for
+                      *.json paths, 'binary' otherwise)
+                    - incremental: Reuse embeddings of unchanged files when an
+                      index is rebuilt (default: True)
+                    - model_options: Extra TextEmbedding arguments, e.g. threads
+                    - workers: Processes used to extract documents (default:
+                      one per CPU; 1 extracts in-process)
+                    - queue_size: Extracted documents buffered ahead of the
+                      embedder while building (default: 16)
+                    - dedup: 'exact' to store repeated chunks once, 'near' to
+                      also drop near-duplicates, 'off' (default: 'exact')
+                    - dedup_threshold: MinHash similarity for 'near' (default: 0.9)
+                    - query_cache: Reuse query embeddings stored on disk
+                      (default: True)
+                    - retrieval: 'dense' (embedding similarity), 'lexical'
+                      (BM25, no model loaded) or 'hybrid' (both, fused by
+                      reciprocal rank) (default: 'dense')
+                    - shards: Split the index into shards, one per top-level
+                      'subfolder' of source_folder or a number of shards
+                      (files assigned by path hash); shards are built and
+                      searched in parallel (default: no sharding)
+                    - shard_workers: Shards built or searched at the same
+                      time (default: one per CPU)
+                    - dtype: Stored vector precision of binary indexes:
+                      'float32', 'float16' or 'int8' (per-dimension scale)
+                      (default: 'float32')
+                    - rerank: With float16/int8, re-score this many best
+                      candidates with full-precision vectors, which the
+                      build then keeps as well (default: 0, off)
         
         Returns:
             Retrieved and ranked text content
@@ -63,8 +105,64 @@ class FastembedProvider(BaseRAGProvider):
         if not query:
             return "Error: No query provided for RAG search"
         
-        source_folder = options.get('source_folder', '')
         top_k = options.get('top_k', 5)
+        embedding_model = options.get('embedding_model', self.DEFAULT_MODEL)
+        
+        error = self._prepare_index(index_path, options)
+        if error:
+            return error
+        
+        # Load index and perform search
+        try:
+            results = self._search_index(index_path, query, top_k, embedding_model)
+            return self._format_results(results, query)
+        except Exception as e:
+            return f"Error during RAG search: {str(e)}"
+    
+    def parse_batch(self, index_path: str, options_list: List[Dict[str, Any]]) -> List[str]:
+        """
+        Run several RAG requests against the same index in one pass
+        
+        The index is prepared once (from the first request's settings), all
+        queries are embedded with one model.embed call and scored with one
+        matrix-matrix product.
+        
+        Returns:
+            One result string per request, in the order given
+        """
+        if not options_list:
+            return []
+        
+        options = options_list[0]
+        embedding_model = options.get('embedding_model', self.DEFAULT_MODEL)
+        error = self._prepare_index(index_path, options)
+        if error:
+            return [error] * len(options_list)
+        
+        outputs = ["Error: No query provided for RAG search"] * len(options_list)
+        pending = [i for i, item in enumerate(options_list) if item.get('query', '')]
+        if not pending:
+            return outputs
+        
+        queries = [options_list[i]['query'] for i in pending]
+        top_ks = [options_list[i].get('top_k', 5) for i in pending]
+        try:
+            batch_results = self._search_index_batch(index_path, queries, top_ks, embedding_model)
+            for i, query, results in zip(pending, queries, batch_results):
+                outputs[i] = self._format_results(results, query)
+        except Exception as e:
+            for i in pending:
+                outputs[i] = f"Error during RAG search: {str(e)}"
+        return outputs
+    
+    def _prepare_index(self, index_path: str, options: Dict[str, Any],
+                       source_files: Optional[List[str]] = None) -> Optional[str]:
+        """Apply provider_config and create the index if needed; returns an error message or None
+        
+        source_files restricts a build to these files of source_folder (used
+        for the shards of a sharded index).
+        """
+        source_folder = options.get('source_folder', '')
         chunk_size = options.get('chunk_size', 512)
         overlap = options.get('overlap', 50)
         force_override = options.get('force_override', False)
@@ -73,9 +171,27 @@ class FastembedProvider(BaseRAGProvider):
         
         self.batch_size = provider_config.get('batch_size', 256)
         self.device = provider_config.get('device', 'cpu')
+        self.index_format = vector_store.resolve_index_format(
+            index_path, provider_config.get('index_format')
+        )
+        self.incremental = provider_config.get('incremental', True)
+        self.workers = provider_config.get('workers')
+        self.queue_size = provider_config.get('queue_size', DEFAULT_QUEUE_SIZE)
+        self.dedup = resolve_dedup_mode(provider_config.get('dedup'))
+        self.dedup_threshold = provider_config.get('dedup_threshold', DEFAULT_NEAR_THRESHOLD)
+        self.model_options = provider_config.get('model_options', {})
+        self.query_cache = provider_config.get('query_cache', True)
+        self.retrieval = resolve_retrieval_mode(provider_config.get('retrieval'))
+        self.shards = sharding.resolve_shards(provider_config.get('shards'))
+        self.shard_workers = provider_config.get('shard_workers')
+        self.dtype = vector_store.resolve_vector_dtype(provider_config.get('dtype'))
+        self.rerank = int(provider_config.get('rerank') or 0)
+        if self.index_format == vector_store.FORMAT_JSON and self.dtype != vector_store.DTYPE_FLOAT32:
+            print(f"Warning: dtype '{self.dtype}' needs the binary index format; {index_path} stores float32")
+            self.dtype = vector_store.DTYPE_FLOAT32
         
-        # Check if index file exists and if we should override it
-        should_create_index = force_override or not os.path.exists(index_path)
+        # Check if index exists and if we should override it
+        should_create_index = force_override or not (vector_store.index_exists(index_path) or sharding.is_sharded(index_path))
         
         if should_create_index:
             # If source_folder is provided, ALWAYS create index from source folder documents
@@ -87,7 +203,13 @@ class FastembedProvider(BaseRAGProvider):
                 else:
                     print(f"Index file '{index_path}' not found. Creating from source: {source_folder}")
                     
-                success = self._create_index(index_path, source_folder, chunk_size, overlap, embedding_model)
+                if self.shards:
+                    success = self._create_sharded_index(index_path, source_folder, options)
+                else:
+                    if sharding.is_sharded(index_path):
+                        sharding.remove_shards(index_path)
+                    success = self._create_index(index_path, source_folder, chunk_size, overlap, embedding_model,
+                                                 source_files)
                 if not success:
                     return f"Error: Failed to create index from {source_folder}"
             else:
@@ -97,12 +219,7 @@ class FastembedProvider(BaseRAGProvider):
                 if not success:
                     return f"Error: Failed to create default index at {index_path}"
         
-        # Load index and perform search
-        try:
-            results = self._search_index(index_path, query, top_k, embedding_model)
-            return self._format_results(results, query)
-        except Exception as e:
-            return f"Error during RAG search: {str(e)}"
+        return None
     
     def _create_default_index(self, index_file: str, embedding_model: str = DEFAULT_MODEL) -> bool:
         """Create a default empty index with sample data"""
@@ -128,24 +245,7 @@ class FastembedProvider(BaseRAGProvider):
             # Generate embeddings for sample chunks
             embeddings_list = list(model.embed(sample_chunks, batch_size=self.batch_size))
             
-            # Convert numpy arrays to lists for JSON serialization
-            embeddings_list = [emb.tolist() if hasattr(emb, 'tolist') else emb for emb in embeddings_list]
-            
-            # Create index structure
-            index_data = {
-                'provider': 'fastembed',
-                'embedding_model': embedding_model,
-                'chunks': chunk_metadata,
-                'embeddings': embeddings_list
-            }
-            
-            # Save index to file
-            index_dir = os.path.dirname(index_file)
-            if index_dir:
-                os.makedirs(index_dir, exist_ok=True)
-            
-            with open(index_file, 'w', encoding='utf-8') as f:
-                json.dump(index_data, f, ensure_ascii=False, indent=2)
+            self._save_index(index_file, embedding_model, chunk_metadata, embeddings_list)
             
             print(f"Default index created successfully: {index_file}")
             print(f"Total sample chunks: {len(sample_chunks)}")
@@ -156,59 +256,53 @@ class FastembedProvider(BaseRAGProvider):
             print(f"Error creating default index: {str(e)}")
             return False
     
-    def _create_index(self, index_file: str, source_folder: str, chunk_size: int = 512, overlap: int = 50, embedding_model: str = DEFAULT_MODEL) -> bool:
-        """Create vector index from source folder/file using FastEmbed"""
+    def _create_index(self, index_file: str, source_folder: str, chunk_size: int = 512, overlap: int = 50,
+                      embedding_model: str = DEFAULT_MODEL, source_files: Optional[List[str]] = None) -> bool:
+        """Create vector index from source folder/file using FastEmbed
+        
+        If a compatible index and manifest already exist, only added or changed
+        files are re-read and re-embedded; rows of removed files are dropped.
+        source_files, when given, replaces the files listed from source_folder.
+        """
         try:
-            model = self._initialize_model(embedding_model)
-            
-            # Collect all text documents
-            documents = self._collect_documents(source_folder)
-            if not documents:
+            if source_files is None:
+                source_files = self.list_source_files(source_folder)
+            if not source_files:
                 print(f"No documents found in {source_folder}")
                 return False
             
-            print(f"Found {len(documents)} documents. Creating chunks...")
+            settings = {'embedding_model': embedding_model, 'chunk_size': chunk_size, 'overlap': overlap,
+                        'text_normalizer': NORMALIZER_VERSION, 'dedup': self.dedup,
+                        'dedup_threshold': self.dedup_threshold if self.dedup == DEDUP_NEAR else None}
+            manifest_file = self._manifest_path(index_file)
+            previous_manifest, previous_index = self._load_previous_build(index_file, manifest_file, settings)
+            diff = (previous_manifest or IndexManifest(settings)).diff(source_files)
             
-            # Create text chunks
-            chunks = []
-            chunk_metadata = []
+            if previous_index is not None:
+                if not diff.has_changes and self._same_storage(previous_index):
+                    previous_manifest.refreshed(diff).save(manifest_file)
+                    print(f"Index is up to date: {index_file} ({len(source_files)} files unchanged)")
+                    return True
+                print(f"Updating index incrementally: {diff.summary()}")
             
-            for doc_path, content in documents:
-                doc_chunks = self._create_chunks(content, chunk_size, overlap)
-                for i, chunk in enumerate(doc_chunks):
-                    chunks.append(chunk)
-                    chunk_metadata.append({
-                        'source': doc_path,
-                        'chunk_id': i,
-                        'text': chunk
-                    })
+            # Documents -> chunks -> embedding batches -> index writer, one batch at a time
+            pipeline = self._chunk_pipeline(source_files, diff, previous_index,
+                                            chunk_size, overlap, embedding_model)
+            # From here only the pipeline holds the previous index, and it lets go once
+            # the old rows are copied, before the new index replaces the memory-mapped one
+            previous_index = None
+            written = self._write_rows(index_file, embedding_model, pipeline)
             
-            print(f"Created {len(chunks)} chunks. Generating embeddings with FastEmbed...")
-            
-            # Generate embeddings using FastEmbed (very fast, no GPU needed)
-            embeddings_list = list(model.embed(chunks, batch_size=self.batch_size))
-            
-            # Convert numpy arrays to lists for JSON serialization
-            embeddings_list = [emb.tolist() if hasattr(emb, 'tolist') else emb for emb in embeddings_list]
-            
-            # Create index structure
-            index_data = {
-                'provider': 'fastembed',
-                'embedding_model': embedding_model,
-                'chunks': chunk_metadata,
-                'embeddings': embeddings_list
-            }
-            
-            # Save index to file
-            index_dir = os.path.dirname(index_file)
-            if index_dir:
-                os.makedirs(index_dir, exist_ok=True)
+            if not written:
+                print(f"No documents found in {source_folder}")
+                return False
             
-            with open(index_file, 'w', encoding='utf-8') as f:
-                json.dump(index_data, f, ensure_ascii=False, indent=2)
+            IndexManifest.from_diff(settings, diff, chunk_counts=pipeline.chunk_counts).save(manifest_file)
             
             print(f"Index created successfully: {index_file}")
-            print(f"Total chunks: {len(chunks)}")
+            print(f"Total chunks: {pipeline.rows} ({pipeline.unique} unique, "
+                  f"{pipeline.embedded} embedded in {pipeline.batches} batches)")
+            print(f"Build stages: {pipeline.stage_report()}")
             print(f"Used embedding model: {embedding_model}")
             return True
             
@@ -216,24 +310,163 @@ class FastembedProvider(BaseRAGProvider):
             print(f"Error creating index: {str(e)}")
             return False
     
+    def _chunk_pipeline(self, source_files: List[str], diff, previous_index,
+                        chunk_size: int, overlap: int, embedding_model: str) -> ChunkPipeline:
+        """Streaming pipeline that embeds diff.to_embed and copies unchanged rows from previous_index"""
+        def embed(texts):
+            model = self._initialize_model(embedding_model)
+            return vector_store.normalize_rows(embed_texts(model, texts, self.batch_size))
+        
+        previous = None
+        if previous_index is not None:
+            def fetch(rows):
+                return (vector_store.normalize_rows(previous_index.vectors(rows)),
+                        previous_index.get_chunks(rows))
+            
+            previous = PreviousRows((chunk['source'] for chunk in previous_index.chunks),
+                                    previous_index.duplicates, fetch)
+        
+        return ChunkPipeline(
+            source_files, diff.unchanged, self._iter_documents(diff.to_embed, diff.digests(diff.to_embed)),
+            lambda content: self._create_chunks(content, chunk_size, overlap),
+            embed, self.batch_size, previous, self.queue_size,
+            ChunkDeduplicator(self.dedup, self.dedup_threshold), self.progress,
+        )
+    
+    def _write_rows(self, index_file: str, embedding_model: str, rows) -> int:
+        """
+        Write (vectors, records, duplicates) batches in the configured index format
+        
+        Binary indexes are appended to batch by batch and swapped into place
+        at the end; the legacy JSON format is a single document, so its rows
+        are gathered in memory first. Returns the number of rows written
+        (nothing is written when there are none).
+        """
+        header = {'normalized': True}
+        lexical = LexicalIndexBuilder()
+        index_format = self.index_format or vector_store.resolve_index_format(index_file)
+        if index_format == vector_store.FORMAT_JSON:
+            chunk_metadata, embeddings, duplicates = [], [], []
+            for vectors, records, batch_duplicates in rows:
+                chunk_metadata.extend(records)
+                embeddings.extend(vectors)
+                duplicates.extend(batch_duplicates)
+                lexical.add(records)
+            if chunk_metadata:
+                get_index_cache().invalidate(index_file, 'fastembed')
+                vector_store.write_json_index(index_file, embedding_model, chunk_metadata, embeddings,
+                                              extra_header=header, duplicates=duplicates)
+                lexical.write(self._lexical_path(index_file))
+            return len(chunk_metadata)
+        
+        writer = vector_store.VectorStoreWriter(index_file, embedding_model, 'fastembed', extra_header=header,
+                                                dtype=self.dtype, keep_exact=self._keep_exact)
+        try:
+            for vectors, records, duplicates in rows:
+                if records:
+                    writer.add(vectors, records)
+                    lexical.add(records)
+                writer.add_duplicates(duplicates)
+            written = writer.header['count']
+            if written:
+                # Published together with the vectors when the directory is swapped in
+                lexical.write(str(writer.tmp_path))
+        except Exception:
+            writer.abort()
+            raise
+        if not written:
+            writer.abort()
+            return 0
+        get_index_cache().invalidate(index_file, 'fastembed')
+        writer.close()
+        return written
+    
+    @staticmethod
+    def _lexical_path(index_file: str) -> str:
+        """Lexical index location: inside binary index directories, '<index>.lexical' next to JSON index files"""
+        if os.path.isdir(index_file):
+            return index_file
+        return f"{index_file}.lexical"
+    
+    def _manifest_path(self, index_file: str) -> str:
+        """Manifest location: inside binary index directories, next to JSON index files"""
+        index_format = self.index_format or vector_store.resolve_index_format(index_file)
+        return manifest_path_for(index_file, sidecar=index_format == vector_store.FORMAT_JSON)
+    
+    def _load_previous_build(self, index_file: str, manifest_file: str, settings: Dict[str, Any]):
+        """Return (manifest, index) of an existing compatible build, or (None, None)
+        
+        An index storing less precise vectors than this build needs (e.g. int8
+        rows for a float32 build) is not reused: its rows are re-embedded.
+        """
+        if not self.incremental or not vector_store.index_exists(index_file):
+            return None, None
+        manifest = IndexManifest.load(manifest_file)
+        if manifest is None or not manifest.is_compatible(settings):
+            return None, None
+        try:
+            index = vector_store.load_index(index_file)
+        except Exception as e:
+            print(f"Existing index could not be loaded, rebuilding from scratch: {str(e)}")
+            return None, None
+        stored = vector_store.DTYPE_FLOAT32 if index.exact is not None else index.dtype
+        needed = vector_store.DTYPE_FLOAT32 if self._keep_exact else self.dtype
+        if vector_store.VECTOR_DTYPES.index(stored) > vector_store.VECTOR_DTYPES.index(needed):
+            print(f"Existing index stores {stored} vectors, {needed} requested: re-embedding all files")
+            return None, None
+        return manifest, index
+    
+    @property
+    def _keep_exact(self) -> bool:
+        """True if a reduced-precision build also stores float32 vectors for re-ranking"""
+        return self.rerank > 0 and self.dtype != vector_store.DTYPE_FLOAT32
+    
+    def _same_storage(self, index) -> bool:
+        """True if an existing index stores its vectors as the current build would"""
+        return index.dtype == self.dtype and (index.exact is not None) == self._keep_exact
+    
+    def _save_index(self, index_file: str, embedding_model: str, chunk_metadata: List[Dict], embeddings_list) -> None:
+        """Write chunks and unit-normalized embeddings in the configured index format"""
+        embeddings = vector_store.normalize_rows(
+            [emb.tolist() if hasattr(emb, 'tolist') else emb for emb in embeddings_list]
+        )
+        header = {'normalized': True}
+        get_index_cache().invalidate(index_file, 'fastembed')
+        index_format = self.index_format or vector_store.resolve_index_format(index_file)
+        if index_format == vector_store.FORMAT_BINARY:
+            vector_store.write_binary_index(index_file, embedding_model, chunk_metadata, embeddings, extra_header=header,
+                                            dtype=self.dtype, keep_exact=self._keep_exact)
+        else:
+            vector_store.write_json_index(index_file, embedding_model, chunk_metadata, embeddings, extra_header=header)
+        lexical = LexicalIndexBuilder()
+        lexical.add(chunk_metadata)
+        lexical.write(self._lexical_path(index_file))
+    
     def _collect_documents(self, source_path: str) -> List[tuple]:
         """Collect documents from source path"""
-        documents = []
+        return self._read_documents(self.list_source_files(source_path))
+    
+    def list_source_files(self, source_path: str) -> List[str]:
+        """List supported files under source path in a stable order"""
         source_path = Path(source_path)
         
         if source_path.is_file():
-            content = self._read_file_content(str(source_path))
-            if content:
-                documents.append((str(source_path), content))
-        elif source_path.is_dir():
+            return [str(source_path)]
+        if source_path.is_dir():
             # Recursively collect all text files
-            for file_path in source_path.rglob('*'):
-                if file_path.is_file() and self._is_text_file(file_path):
-                    content = self._read_file_content(str(file_path))
-                    if content:
-                        documents.append((str(file_path), content))
-        
-        return documents
+            return sorted(
+                str(file_path) for file_path in source_path.rglob('*')
+                if file_path.is_file() and self._is_text_file(file_path)
+            )
+        return []
+    
+    def _read_documents(self, file_paths: List[str]) -> List[tuple]:
+        """Read files in a process pool (in order), skipping empty or unreadable ones"""
+        return list(self._iter_documents(file_paths))
+    
+    def _iter_documents(self, file_paths: List[str], digests: Optional[Dict[str, str]] = None):
+        """Yield (path, content) lazily, extracting ahead in a process pool (digests: known SHA-256 per file)"""
+        return iter_documents(file_paths, type(self)._read_file_content, self.workers, digests)
     
     @staticmethod
     def _is_text_file(file_path: Path) -> bool:
@@ -243,36 +476,35 @@ class FastembedProvider(BaseRAGProvider):
                           '.pdf', '.docx', '.doc'}
         return file_path.suffix.lower() in text_extensions
     
-    def _read_file_content(self, file_path: str) -> str:
-        """Read content from various file types"""
+    @classmethod
+    def _read_file_content(cls, file_path: str, digest: Optional[str] = None) -> str:
+        """Read content from various file types (classmethod, so worker processes can run it)
+        
+        digest is the file's SHA-256 when already known, used as the extraction cache key.
+        """
         try:
             file_ext = Path(file_path).suffix.lower()
             
             if file_ext == '.pdf':
-                return self._read_pdf(file_path)
+                return cls._read_pdf(file_path, digest)
             elif file_ext in ['.docx', '.doc']:
-                return self._read_docx(file_path)
+                return cls._read_docx(file_path, digest)
             else:
                 # Regular text file
                 with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
                     content = f.read()
-                return self._clean_text(content)
+                return cls._clean_text(content)
         except Exception as e:
             print(f"Error reading {file_path}: {str(e)}")
             return ""
     
     @staticmethod
-    def _read_pdf(file_path: str) -> str:
-        """Read PDF content using pdfplumber"""
+    def _read_pdf(file_path: str, digest: Optional[str] = None) -> str:
+        """Read PDF content using pdfplumber (cached, shared with local rules)"""
         try:
-            import pdfplumber
-            text = ""
-            with pdfplumber.open(file_path) as pdf:
-                for page in pdf.pages:
-                    page_text = page.extract_text()
-                    if page_text:
-                        text += page_text + "\n"
-            return FastembedProvider._clean_text(text)
+            from ...extraction_cache import cached_extract
+            from ..pdf import PdfProvider
+            return FastembedProvider._clean_text(cached_extract(file_path, PdfProvider(), digest=digest))
         except ImportError:
             print("pdfplumber not available for PDF reading")
             return ""
@@ -281,15 +513,13 @@ class FastembedProvider(BaseRAGProvider):
             return ""
     
     @staticmethod
-    def _read_docx(file_path: str) -> str:
-        """Read DOCX content"""
+    def _read_docx(file_path: str, digest: Optional[str] = None) -> str:
+        """Read DOCX content (cached, shared with local rules)"""
         try:
-            from docx import Document
-            doc = Document(file_path)
-            text = ""
-            for paragraph in doc.paragraphs:
-                text += paragraph.text + "\n"
-            return FastembedProvider._clean_text(text)
+            from ...extraction_cache import cached_extract
+            from ..docx import DocxProvider
+            # DocxProvider drops blank paragraphs, which normalization removes anyway
+            return FastembedProvider._clean_text(cached_extract(file_path, DocxProvider(), digest=digest))
         except ImportError:
             print("python-docx not available for DOCX reading")
             return ""
@@ -299,29 +529,15 @@ class FastembedProvider(BaseRAGProvider):
     
     @staticmethod
     def _clean_text(text: str) -> str:
-        """Clean and normalize extracted text"""
-        # Remove excessive whitespace and normalize line breaks
-        text = re.sub(r'\s+', ' ', text)
-        text = re.sub(r'\n\s*\n', '\n\n', text)
-        
-        # Fix common PDF extraction issues
-        text = re.sub(r'([a-z])([A-Z])', r'\1 \2', text)
-        text = re.sub(r'([.!?])([A-Z])', r'\1 \2', text)
-        text = re.sub(r'(\w)-\n(\w)', r'\1\2', text)
-        text = re.sub(r'(\w)\n(\w)', r'\1 \2', text)
-        
-        text = re.sub(r'([a-z])([A-Z][a-z])', r'\1 \2', text)
-        text = re.sub(r'(\w)([A-Z]+)(\w)', r'\1 \2 \3', text)
-        
-        text = ' '.join(text.split())
-        
-        return text
+        """Clean and normalize extracted text (see text_normalizer)"""
+        return normalize_text(text)
     
     @staticmethod
     def _create_chunks(text: str, chunk_size: int, overlap: int) -> List[str]:
-        """Create overlapping text chunks with improved sentence boundaries"""
-        text = FastembedProvider._clean_text(text)
+        """Create overlapping text chunks with improved sentence boundaries
         
+        Expects text already normalized by _read_file_content.
+        """
         if len(text) <= chunk_size:
             return [text]
         
@@ -362,52 +578,84 @@ class FastembedProvider(BaseRAGProvider):
     
     def _search_index(self, index_file: str, query: str, top_k: int, embedding_model: str = DEFAULT_MODEL) -> List[Dict]:
         """Search index for relevant documents using FastEmbed"""
-        model = self._initialize_model(embedding_model)
+        return self._search_index_batch(index_file, [query], [top_k], embedding_model)[0]
+    
+    def _search_index_batch(self, index_file: str, queries: List[str], top_ks: List[int],
+                            embedding_model: str = DEFAULT_MODEL, query_embeddings=None) -> List[List[Dict]]:
+        """Search index for several queries at once, returning one result list per query
+        
+        query_embeddings, when given, are used instead of embedding the queries.
+        """
+        if sharding.is_sharded(index_file):
+            return self._search_sharded_batch(index_file, queries, top_ks, embedding_model)
         
         try:
-            with open(index_file, 'r', encoding='utf-8') as f:
-                index_data = json.load(f)
+            index = self._load_index(index_file)
         except json.JSONDecodeError as e:
             print(f"Error: Invalid JSON in index file {index_file}: {str(e)}")
             print("Recreating index...")
-            return []
+            return [[] for _ in queries]
+        except ValueError as e:
+            print(f"Error: {str(e)}")
+            return [[] for _ in queries]
         except Exception as e:
             print(f"Error loading index file {index_file}: {str(e)}")
-            return []
-        
-        if 'chunks' not in index_data or 'embeddings' not in index_data:
-            print("Error: Invalid index structure (missing 'chunks' or 'embeddings')")
-            return []
-        
-        saved_model = index_data.get('embedding_model', self.DEFAULT_MODEL)
-        chunks_metadata = index_data['chunks']
-        embeddings = index_data['embeddings']
+            return [[] for _ in queries]
         
-        if saved_model != embedding_model:
-            print(f"Warning: Index was created with model '{saved_model}' but searching with '{embedding_model}'")
-            print("Consider recreating the index with force_override for better results")
+        def dense(dense_top_ks):
+            saved_model = index.embedding_model or self.DEFAULT_MODEL
+            
+            if saved_model != embedding_model:
+                print(f"Warning: Index was created with model '{saved_model}' but searching with '{embedding_model}'")
+                print("Consider recreating the index with force_override for better results")
+            
+            # Generate query embeddings (the model is only loaded on query cache misses)
+            vectors = query_embeddings
+            if vectors is None:
+                vectors = self._embed_queries(queries, embedding_model)
+            
+            # Cosine similarity for every chunk and query in one matrix-matrix product, then top-k selection
+            rerank = self.rerank if index.exact is not None else 0
+            if self.rerank and index.exact is None and index.dtype != vector_store.DTYPE_FLOAT32:
+                print(f"Warning: {index_file} has no full-precision vectors to re-rank with; "
+                      f"rebuild it with rerank set")
+            depths = [max(top_k, rerank) if top_k > 0 else 0 for top_k in dense_top_ks]
+            rankings = self._top_k_cosine_batch(index.embeddings, vectors, depths,
+                                                normalized=index.normalized, scales=index.scales)
+            if rerank:
+                rankings = self._rerank_exact(index.exact, vectors, rankings, dense_top_ks)
+            return rankings
         
-        # Generate query embedding
-        query_embedding_raw = list(model.embed([query]))[0]
-        query_embedding = query_embedding_raw.tolist() if hasattr(query_embedding_raw, 'tolist') else query_embedding_raw
+        def load_lexical():
+            return self._load_lexical_index(self._lexical_path(index_file), len(index), lambda: iter(index.chunks))
         
-        # Compute cosine similarity scores
-        scores_and_indices = []
-        for idx, embedding in enumerate(embeddings):
-            score = self._cosine_similarity(query_embedding, embedding)
-            scores_and_indices.append((score, idx))
+        top_results = self._rank_batch(queries, top_ks, dense, load_lexical)
         
-        scores_and_indices.sort(key=lambda x: x[0], reverse=True)
-        top_results = scores_and_indices[:top_k]
+        all_results = []
+        for query_top in top_results:
+            records = index.get_chunks(idx for _, idx in query_top)
+            results = []
+            for rank, ((score, idx), result) in enumerate(zip(query_top, records), 1):
+                result['score'] = float(score)
+                result['rank'] = rank
+                results.append(result)
+            all_results.append(results)
         
-        results = []
-        for rank, (score, idx) in enumerate(top_results, 1):
-            result = chunks_metadata[idx].copy()
-            result['score'] = float(score)
-            result['rank'] = rank
-            results.append(result)
+        return all_results
+    
+    def _open_lexical_index(self, index_file: str):
+        """The lexical index of an index file (built from its chunks when missing)"""
+        index = self._load_index(index_file)
+        return self._load_lexical_index(self._lexical_path(index_file), len(index), lambda: iter(index.chunks))
+    
+    @staticmethod
+    def _load_index(index_file: str) -> 'vector_store.VectorIndex':
+        """Load an index through the process-wide index cache"""
+        def loader():
+            index = vector_store.load_index(index_file)
+            return index, index.memory_bytes
         
-        return results
+        return get_index_cache().get('fastembed', index_file, vector_store.index_files(index_file), loader)
     
     def _format_results(self, results: List[Dict], query: str) -> str:
         """Format search results for output"""
@@ -420,6 +668,8 @@ class FastembedProvider(BaseRAGProvider):
         for result in results:
             output += f"Rank {result['rank']} (Score: {result['score']:.3f})\n"
             output += f"Source: {result['source']}\n"
+            if result.get('duplicates'):
+                output += f"Also in: {self._format_duplicates(result['duplicates'])}\n"
             output += f"Chunk ID: {result['chunk_id']}\n"
             output += "-" * 30 + "\n"
             
@@ -0,0 +1,134 @@
+"""Process-wide cache of loaded RAG indexes
+
+Every RAG rule gets a fresh provider from the factory, so without a shared cache
+the same index is read from disk once per rule. Entries are keyed by provider
+and resolved index path and carry a fingerprint (size, mtime, inode) of the
+files the index was loaded from: when any of them changes on disk, the next
+lookup reloads it. The total estimated size of cached indexes is capped and the
+least recently used entries are evicted first.
+
+The cap defaults to 1024 MB and can be changed with the PEAC_INDEX_CACHE_MB
+environment variable (0 disables caching).
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+
+DEFAULT_MAX_MB = 1024
+
+
+def _max_bytes_from_env() -> int:
+    try:
+        return int(float(os.environ.get('PEAC_INDEX_CACHE_MB', DEFAULT_MAX_MB)) * 1024 * 1024)
+    except ValueError:
+        return DEFAULT_MAX_MB * 1024 * 1024
+
+
+def fingerprint(files: Iterable[str]) -> Tuple:
+    """Identify the on-disk state of a set of files"""
+    state = []
+    for file_path in files:
+        try:
+            stat = os.stat(file_path)
+            state.append((str(file_path), stat.st_size, stat.st_mtime_ns, stat.st_ino))
+        except OSError:
+            state.append((str(file_path), None, None, None))
+    return tuple(state)
+
+
+class IndexCache:
+    """Thread-safe LRU cache of loaded indexes with a memory cap"""
+
+    def __init__(self, max_bytes: Optional[int] = None):
+        self.max_bytes = _max_bytes_from_env() if max_bytes is None else max_bytes
+        self._entries: 'OrderedDict[Tuple[str, str], Dict[str, Any]]' = OrderedDict()
+        self._lock = threading.RLock()
+        self._key_locks: Dict[Tuple[str, str], threading.Lock] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _key(namespace: str, index_path: str) -> Tuple[str, str]:
+        return namespace, os.path.realpath(index_path)
+
+    def get(self, namespace: str, index_path: str, files: Iterable[str],
+            loader: Callable[[], Tuple[Any, int]]) -> Any:
+        """
+        Return the cached index, loading it if missing or stale
+
+        Args:
+            namespace: Provider name, so different index types never collide
+            index_path: Path of the index (resolved before use as key)
+            files: Files whose state defines the freshness of the entry
+            loader: Callable returning (loaded index, estimated size in bytes)
+        """
+        key = self._key(namespace, index_path)
+        files = list(files)
+
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        # One loader per key at a time; other keys load concurrently
+        with key_lock:
+            current = fingerprint(files)
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and entry['fingerprint'] == current:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry['value']
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+
+            value, size = loader()
+            if self.max_bytes <= 0 or size > self.max_bytes:
+                return value
+
+            with self._lock:
+                self._entries[key] = {'fingerprint': current, 'value': value, 'size': size}
+                self._evict()
+            return value
+
+    def _evict(self):
+        while self._entries and self.total_bytes > self.max_bytes:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(entry['size'] for entry in self._entries.values())
+
+    def invalidate(self, index_path: Optional[str] = None, namespace: Optional[str] = None):
+        """Drop one index (all namespaces unless given) or, with no path, everything"""
+        with self._lock:
+            if index_path is None:
+                self._entries.clear()
+                return
+            resolved = os.path.realpath(index_path)
+            for key in list(self._entries):
+                if key[1] == resolved and (namespace is None or key[0] == namespace):
+                    del self._entries[key]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self.total_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+
+_index_cache = IndexCache()
+
+
+def get_index_cache() -> IndexCache:
+    """The shared cache used by all RAG providers in this process"""
+    return _index_cache
@@ -0,0 +1,285 @@
+"""BM25 inverted index stored next to a vector index
+
+Dense retrieval needs the embedding model for every query it cannot find in
+the query cache, and it is weak at matching exact identifiers. Every index
+build therefore also writes a lexical index of the same rows:
+
+    lexical.json        header (k1, b, row count, average length) and the
+                        vocabulary: term -> [offset, document frequency]
+    lexical.postings    (row int32, term frequency float32) pairs, grouped by
+                        term in vocabulary order and sorted by row
+    lexical.lengths     int32 number of tokens of every row
+
+Terms are the lowercased word tokens (``\\w+``) of the normalized chunk text;
+queries go through the same normalization, so ``getPromptSentence`` matches
+the ``get Prompt Sentence`` stored in the index. Postings and lengths are
+memory-mapped, and a query only touches the postings of its own terms, so
+lexical search needs neither the model nor the embeddings matrix.
+
+``provider_config.retrieval`` selects how the providers rank chunks:
+'dense' (embeddings, the default), 'lexical' (BM25 only) or 'hybrid' (both
+rankings combined with reciprocal rank fusion, see fuse_rankings).
+
+The shards of a sharded index are searched with the statistics of the whole
+index (CorpusStats: row count, average length and document frequencies), so
+their BM25 scores are on one scale and can be merged.
+"""
+
+import json
+import math
+import os
+import re
+from array import array
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .text_normalizer import normalize_text
+
+
+LEXICAL_VERSION = 1
+
+HEADER_FILE = 'lexical.json'
+POSTINGS_FILE = 'lexical.postings'
+LENGTHS_FILE = 'lexical.lengths'
+
+RETRIEVAL_DENSE = 'dense'
+RETRIEVAL_LEXICAL = 'lexical'
+RETRIEVAL_HYBRID = 'hybrid'
+RETRIEVAL_MODES = (RETRIEVAL_DENSE, RETRIEVAL_LEXICAL, RETRIEVAL_HYBRID)
+
+DEFAULT_K1 = 1.2
+DEFAULT_B = 0.75
+
+# Reciprocal rank fusion: constant of 1 / (RRF_K + rank), and how many
+# candidates each ranking contributes (at least top_k)
+RRF_K = 60
+HYBRID_DEPTH = 50
+
+_TOKEN = re.compile(r'\w+')
+_POSTING = [('row', '<i4'), ('tf', '<f4')]
+
+
+def resolve_retrieval_mode(mode) -> str:
+    """Validate a provider_config 'retrieval' value (default: dense)"""
+    if mode is None:
+        return RETRIEVAL_DENSE
+    mode = str(mode).lower().strip()
+    if mode not in RETRIEVAL_MODES:
+        raise ValueError(f"Unknown retrieval mode: '{mode}'. Available modes: {', '.join(RETRIEVAL_MODES)}")
+    return mode
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word tokens of already normalized text"""
+    return _TOKEN.findall(text.lower())
+
+
+def lexical_files(directory: str) -> List[str]:
+    """Files a lexical index is loaded from (used to detect on-disk changes)"""
+    return [os.path.join(directory, name) for name in (HEADER_FILE, POSTINGS_FILE, LENGTHS_FILE)]
+
+
+def lexical_exists(directory: str) -> bool:
+    return all(os.path.isfile(path) for path in lexical_files(directory))
+
+
+class LexicalIndexBuilder:
+    """Collects the postings of index rows as they are written, then writes the lexical index"""
+
+    def __init__(self, k1: float = DEFAULT_K1, b: float = DEFAULT_B):
+        self.k1 = k1
+        self.b = b
+        self._rows: Dict[str, array] = {}
+        self._tfs: Dict[str, array] = {}
+        self._lengths = array('i')
+
+    def __len__(self) -> int:
+        return len(self._lengths)
+
+    def add(self, records: Iterable[Dict[str, Any]]):
+        """Index chunk records; each record is the next row"""
+        for record in records:
+            row = len(self._lengths)
+            tokens = tokenize(record.get('text', ''))
+            self._lengths.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                rows = self._rows.get(term)
+                if rows is None:
+                    rows = self._rows[term] = array('i')
+                    self._tfs[term] = array('f')
+                rows.append(row)
+                self._tfs[term].append(tf)
+
+    def write(self, directory: str):
+        """Write the index files into directory, each moved into place once complete"""
+        import numpy as np
+
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        vocab = {}
+        offset = 0
+        with open(directory / f"{POSTINGS_FILE}.tmp", 'wb') as f:
+            for term in sorted(self._rows):
+                rows = self._rows[term]
+                postings = np.empty(len(rows), dtype=_POSTING)
+                postings['row'] = np.frombuffer(rows, dtype=np.int32)
+                postings['tf'] = np.frombuffer(self._tfs[term], dtype=np.float32)
+                f.write(postings.tobytes())
+                vocab[term] = [offset, len(rows)]
+                offset += len(rows)
+        lengths = np.frombuffer(self._lengths, dtype=np.int32) if self._lengths else np.zeros(0, np.int32)
+        lengths.astype('<i4').tofile(str(directory / f"{LENGTHS_FILE}.tmp"))
+
+        header = {
+            'version': LEXICAL_VERSION,
+            'k1': self.k1,
+            'b': self.b,
+            'count': len(self._lengths),
+            'avgdl': float(lengths.mean()) if len(lengths) else 0.0,
+            'postings': offset,
+            'vocab': vocab,
+        }
+        with open(directory / f"{HEADER_FILE}.tmp", 'w', encoding='utf-8') as f:
+            json.dump(header, f, ensure_ascii=False)
+
+        # Header last: a reader never sees new postings with an old vocabulary
+        for name in (POSTINGS_FILE, LENGTHS_FILE, HEADER_FILE):
+            os.replace(directory / f"{name}.tmp", directory / name)
+
+
+class LexicalIndex:
+    """A loaded lexical index answering BM25 queries"""
+
+    def __init__(self, header: Dict[str, Any], postings, lengths):
+        import numpy as np
+
+        self.header = header
+        self.vocab: Dict[str, List[int]] = header['vocab']
+        self.count = int(header['count'])
+        self.k1 = float(header['k1'])
+        self.b = float(header['b'])
+        self.postings = postings
+        self.avgdl = float(header['avgdl'])
+        self.lengths = lengths
+        # Per-row length normalization of the BM25 denominator
+        self.norms = self._norms(np.asarray(lengths, dtype=np.float64), self.avgdl)
+
+    def _norms(self, lengths, avgdl: float):
+        return self.k1 * (1.0 - self.b + self.b * lengths / (avgdl or 1.0))
+
+    @classmethod
+    def load(cls, directory: str) -> 'LexicalIndex':
+        import numpy as np
+
+        directory = Path(directory)
+        with open(directory / HEADER_FILE, 'r', encoding='utf-8') as f:
+            header = json.load(f)
+        if header.get('version') != LEXICAL_VERSION:
+            raise ValueError(f"Unsupported lexical index version: {header.get('version')}")
+        count, total = int(header['count']), int(header['postings'])
+        postings = (np.memmap(directory / POSTINGS_FILE, dtype=_POSTING, mode='r', shape=(total,))
+                    if total else np.zeros(0, dtype=_POSTING))
+        lengths = (np.memmap(directory / LENGTHS_FILE, dtype='<i4', mode='r', shape=(count,))
+                   if count else np.zeros(0, dtype=np.int32))
+        return cls(header, postings, lengths)
+
+    def __len__(self) -> int:
+        return self.count
+
+    @property
+    def memory_bytes(self) -> int:
+        """Rough heap footprint (vocabulary and row norms; postings are memory-mapped)"""
+        return int(self.norms.nbytes) + 80 * len(self.vocab)
+
+    def search(self, query: str, top_k: int, corpus: Optional['CorpusStats'] = None) -> List[Tuple[float, int]]:
+        """
+        Rank rows by BM25 score for a query
+
+        Args:
+            corpus: Statistics of all the indexes searched together (the
+                    shards of one index); default: this index alone
+
+        Returns:
+            Up to top_k (score, row) pairs sorted by descending score, ties by
+            row; rows sharing no term with the query are never returned
+        """
+        import numpy as np
+
+        if top_k <= 0:
+            return []
+        row_parts, score_parts = [], []
+        for term, query_tf in Counter(tokenize(normalize_text(query))).items():
+            entry = self.vocab.get(term)
+            if entry is None:
+                continue
+            offset, df = entry
+            postings = self.postings[offset:offset + df]
+            rows = np.asarray(postings['row'])
+            tf = np.asarray(postings['tf'], dtype=np.float64)
+            if corpus is None:
+                count, norms = self.count, self.norms[rows]
+            else:
+                count, df = corpus.count, corpus.df(term)
+                norms = self._norms(np.asarray(self.lengths[rows], dtype=np.float64), corpus.avgdl)
+            idf = math.log(1.0 + (count - df + 0.5) / (df + 0.5))
+            row_parts.append(rows)
+            score_parts.append(query_tf * idf * tf * (self.k1 + 1.0) / (tf + norms))
+        if not row_parts:
+            return []
+
+        rows = np.concatenate(row_parts)
+        scores = np.concatenate(score_parts)
+        if len(row_parts) > 1:
+            rows, inverse = np.unique(rows, return_inverse=True)
+            scores = np.bincount(inverse, weights=scores)
+        if top_k < len(rows):
+            candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+        else:
+            candidates = np.arange(len(rows))
+        order = np.lexsort((rows[candidates], -scores[candidates]))
+        return [(float(scores[i]), int(rows[i])) for i in candidates[order]]
+
+    def search_batch(self, queries: List[str], top_ks: List[int],
+                     corpus: Optional['CorpusStats'] = None) -> List[List[Tuple[float, int]]]:
+        return [self.search(query, top_k, corpus) for query, top_k in zip(queries, top_ks)]
+
+
+class CorpusStats:
+    """BM25 statistics of several lexical indexes searched as one (the shards of an index)"""
+
+    def __init__(self, indexes: List[LexicalIndex]):
+        self.indexes = indexes
+        self.count = sum(index.count for index in indexes)
+        total_length = sum(index.count * index.avgdl for index in indexes)
+        self.avgdl = total_length / self.count if self.count else 0.0
+
+    def df(self, term: str) -> int:
+        """Rows containing term, over all indexes"""
+        return sum(index.vocab[term][1] for index in self.indexes if term in index.vocab)
+
+
+def build_lexical_index(directory: str, records: Iterable[Dict[str, Any]]) -> int:
+    """Write the lexical index of existing rows (e.g. for an index built before lexical search)"""
+    builder = LexicalIndexBuilder()
+    builder.add(records)
+    builder.write(directory)
+    return len(builder)
+
+
+def fuse_rankings(rankings: List[List[Tuple[float, int]]], top_k: int) -> List[Tuple[float, int]]:
+    """
+    Combine rankings with reciprocal rank fusion
+
+    Every row scores sum(1 / (RRF_K + rank)) over the rankings it appears in,
+    so scores on different scales (cosine, BM25) need no calibration.
+
+    Returns:
+        Up to top_k (fused score, row) pairs, best first, ties by row
+    """
+    fused: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, (_, row) in enumerate(ranking, 1):
+            fused[row] = fused.get(row, 0.0) + 1.0 / (RRF_K + rank)
+    ordered = sorted(fused.items(), key=lambda item: (-item[1], item[0]))
+    return [(score, row) for row, score in ordered[:max(top_k, 0)]]
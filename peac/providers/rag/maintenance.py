@@ -0,0 +1,617 @@
+"""Building, inspecting and verifying RAG indexes outside of a prompt render
+
+Backs the ``peac index`` commands:
+
+- BuildProgress reports the files, chunks and throughput of running builds
+  (the providers call it after every written batch, see ChunkPipeline).
+- index_stats() summarizes an index (provider, model, dimension, chunk
+  counts, disk size, shards) from its headers and manifest, without loading
+  vectors.
+- verify_index() checks that the files of an index agree with each other
+  (row counts, offsets, vector sizes, lexical index, shards) and that the
+  stored vectors are finite, without loading a model or running a query.
+
+All three work on every layout the providers write: FastEmbed binary
+directories and legacy JSON files, FAISS directories and sharded indexes.
+"""
+
+import json
+import os
+import pickle
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from . import lexical
+from . import sharding
+from . import vector_store
+from .faiss_provider import FaissProvider
+from .manifest import IndexManifest, manifest_path_for
+
+
+# Rows of the embeddings matrix checked at a time by verify_index
+_VERIFY_BLOCK = 65536
+# Largest deviation from unit length accepted for rows of a normalized index, per dtype
+_NORM_TOLERANCE = {
+    vector_store.DTYPE_FLOAT32: 1e-3,
+    vector_store.DTYPE_FLOAT16: 5e-3,
+    vector_store.DTYPE_INT8: 5e-2,
+}
+# Problems of one kind listed before the rest are only counted
+_MAX_REPORTED = 5
+
+
+def format_bytes(size: int) -> str:
+    """Human readable size, e.g. '12.3 MB'"""
+    value = float(size)
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if value < 1024 or unit == 'GB':
+            return f"{value:.0f} {unit}" if unit == 'B' else f"{value:.1f} {unit}"
+        value /= 1024
+    return f"{value:.1f} GB"
+
+
+def detect_provider(index_path: str) -> Optional[str]:
+    """Provider that wrote the index at index_path, or None if there is no index"""
+    if sharding.is_sharded(index_path):
+        return sharding.load_shards(index_path).get('provider')
+    if os.path.isdir(index_path):
+        index_dir = Path(index_path)
+        if (index_dir / FaissProvider.INDEX_FILE).exists():
+            return 'faiss'
+        if vector_store.is_binary_index(index_path):
+            return 'fastembed'
+        return None
+    if os.path.isfile(index_path):
+        return 'fastembed'
+    return None
+
+
+def _disk_bytes(paths: List[str]) -> int:
+    """Total size of files and directory trees"""
+    total = 0
+    for path in paths:
+        if os.path.isfile(path):
+            total += os.path.getsize(path)
+        elif os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                total += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+    return total
+
+
+class BuildProgress:
+    """
+    Progress of one or more concurrent index builds (e.g. the shards of an index)
+
+    Pass the instance as a provider's ``progress``; it is called with each
+    build's ChunkPipeline after every written batch and prints a status line
+    through ``write`` at most every ``interval`` seconds.
+
+    Args:
+        total_files: Source files of the whole build, if known
+        write: Receives each status line (default: print)
+        interval: Minimum seconds between two status lines
+    """
+
+    def __init__(self, total_files: Optional[int] = None, write: Optional[Callable[[str], None]] = None,
+                 interval: float = 1.0):
+        self.total_files = total_files
+        self.write = write or print
+        self.interval = interval
+        self.started = time.perf_counter()
+        self._pipelines: Dict[int, Any] = {}
+        self._last_report = 0.0
+        self._lock = threading.Lock()
+
+    def __call__(self, pipeline):
+        with self._lock:
+            self._pipelines[id(pipeline)] = pipeline
+            now = time.perf_counter()
+            if now - self._last_report < self.interval:
+                return
+            self._last_report = now
+        self.write(self.status())
+
+    def _total(self, attribute: str) -> int:
+        return sum(getattr(pipeline, attribute) for pipeline in list(self._pipelines.values()))
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    @property
+    def files(self) -> int:
+        return self._total('files_done')
+
+    @property
+    def chunks(self) -> int:
+        """Chunks written so far, duplicates and chunks copied from the previous build included"""
+        return self._total('rows')
+
+    @property
+    def embedded(self) -> int:
+        return self._total('embedded')
+
+    def status(self) -> str:
+        """e.g. '12/40 files, 3072 chunks, 2950 embedded (850 chunks/s)'"""
+        files = f"{self.files}/{self.total_files}" if self.total_files is not None else str(self.files)
+        rate = self.embedded / self.elapsed if self.elapsed > 0 else 0.0
+        return f"{files} files, {self.chunks} chunks, {self.embedded} embedded ({rate:.0f} chunks/s)"
+
+    def summary(self) -> str:
+        """Final line: elapsed time and throughput"""
+        elapsed = self.elapsed
+        if not self._pipelines:
+            return f"up to date ({elapsed:.1f}s)"
+        rate = self.embedded / elapsed if elapsed > 0 else 0.0
+        return (f"{self.chunks} chunks from {self.files} files in {elapsed:.1f}s "
+                f"({self.embedded} embedded, {rate:.0f} chunks/s)")
+
+
+def index_stats(index_path: str) -> Dict[str, Any]:
+    """
+    Summary of an index, read from its headers and manifest
+
+    Returns:
+        Dictionary with 'path', 'provider', 'format', 'embedding_model',
+        'dimension', 'dtype' and 'exact' (FastEmbed vector storage),
+        'rows' (stored vectors), 'duplicates', 'chunks' (rows
+        plus duplicates), 'source_files', 'disk_bytes', 'lexical' (row count
+        of the lexical index or None), 'settings' (chunking settings from the
+        manifest) and, for FAISS, 'index_type'. Sharded indexes add 'shards',
+        the stats of every shard, and sum their counts.
+
+    Raises:
+        FileNotFoundError: No index at index_path
+        ValueError: The index files cannot be read
+    """
+    provider = detect_provider(index_path)
+    if provider is None:
+        raise FileNotFoundError(f"No index found at {index_path}")
+    if sharding.is_sharded(index_path):
+        return _sharded_stats(index_path)
+    if provider == 'faiss':
+        return _faiss_stats(index_path)
+    return _fastembed_stats(index_path)
+
+
+def _manifest_stats(manifest_file: str, stats: Dict[str, Any]):
+    manifest = IndexManifest.load(manifest_file)
+    stats['source_files'] = len(manifest.files) if manifest is not None else None
+    stats['settings'] = {key: value for key, value in (manifest.settings if manifest else {}).items()
+                         if key in ('chunk_size', 'overlap', 'dedup')}
+
+
+def _lexical_count(directory: str) -> Optional[int]:
+    if not lexical.lexical_exists(directory):
+        return None
+    with open(os.path.join(directory, lexical.HEADER_FILE), 'r', encoding='utf-8') as f:
+        return int(json.load(f).get('count', 0))
+
+
+def _fastembed_stats(index_path: str) -> Dict[str, Any]:
+    index = vector_store.load_index(index_path)
+    binary = os.path.isdir(index_path)
+    stats = {
+        'path': index_path,
+        'provider': 'fastembed',
+        'format': vector_store.FORMAT_BINARY if binary else vector_store.FORMAT_JSON,
+        'embedding_model': index.embedding_model,
+        'dimension': int(index.header.get('dimension') or 0),
+        'dtype': index.dtype,
+        'exact': index.exact is not None,
+        'rows': len(index),
+        'duplicates': len(index.duplicates),
+    }
+    stats['chunks'] = stats['rows'] + stats['duplicates']
+    manifest_file = manifest_path_for(index_path, sidecar=not binary)
+    lexical_dir = index_path if binary else f"{index_path}.lexical"
+    _manifest_stats(manifest_file, stats)
+    stats['lexical'] = _lexical_count(lexical_dir)
+    stats['disk_bytes'] = _disk_bytes([index_path] if binary else [index_path, manifest_file, lexical_dir])
+    return stats
+
+
+def _faiss_stats(index_path: str) -> Dict[str, Any]:
+    metadata = FaissProvider._read_metadata(index_path)
+    duplicates = metadata.get('duplicates') or vector_store.DuplicateMap()
+    stats = {
+        'path': index_path,
+        'provider': 'faiss',
+        'format': 'faiss',
+        'embedding_model': metadata.get('embedding_model'),
+        'dimension': metadata.get('dimension'),
+        'index_type': metadata.get('index_type', 'flat'),
+        'rows': len(metadata['chunks']),
+        'duplicates': len(duplicates),
+    }
+    stats['chunks'] = stats['rows'] + stats['duplicates']
+    _manifest_stats(manifest_path_for(index_path), stats)
+    stats['lexical'] = _lexical_count(index_path)
+    stats['disk_bytes'] = _disk_bytes([index_path])
+    return stats
+
+
+def _sharded_stats(index_path: str) -> Dict[str, Any]:
+    info = sharding.load_shards(index_path)
+    shards = []
+    for shard in info.get('shards', []):
+        shard_stats = index_stats(sharding.shard_path(index_path, shard['name']))
+        shard_stats['name'] = shard['name']
+        shards.append(shard_stats)
+    stats = {
+        'path': index_path,
+        'provider': info.get('provider'),
+        'format': 'sharded',
+        'strategy': info.get('strategy'),
+        'embedding_model': shards[0]['embedding_model'] if shards else None,
+        'dimension': shards[0]['dimension'] if shards else None,
+        'dtype': shards[0].get('dtype') if shards else None,
+        'exact': shards[0].get('exact') if shards else False,
+        'settings': shards[0]['settings'] if shards else {},
+        'disk_bytes': _disk_bytes([index_path]),
+        'shards': shards,
+    }
+    for key in ('rows', 'duplicates', 'chunks'):
+        stats[key] = sum(shard[key] for shard in shards)
+    for key in ('source_files', 'lexical'):
+        values = [shard[key] for shard in shards]
+        stats[key] = None if None in values else sum(values)
+    return stats
+
+
+def format_stats(stats: Dict[str, Any]) -> List[str]:
+    """Lines printed by ``peac index stats``"""
+    def count(value):
+        return 'unknown' if value is None else str(value)
+
+    kind = stats['format']
+    if stats.get('index_type'):
+        kind += f" ({stats['index_type']})"
+    if kind == 'sharded':
+        strategy = stats['strategy'] if stats['strategy'] == sharding.STRATEGY_SUBFOLDER else 'path hash'
+        kind += f" ({len(stats['shards'])} shards by {strategy})"
+    lines = [
+        f"Index:        {stats['path']}",
+        f"Provider:     {stats['provider']}, {kind}",
+        f"Model:        {stats['embedding_model']}",
+        f"Dimension:    {stats['dimension']}",
+    ]
+    if stats.get('dtype'):
+        vectors = stats['dtype'] + (' (float32 copy for re-ranking)' if stats.get('exact') else '')
+        lines.append(f"Vectors:      {vectors}")
+    lines += [
+        f"Chunks:       {stats['chunks']} ({stats['rows']} stored, {stats['duplicates']} duplicates)",
+        f"Source files: {count(stats['source_files'])}",
+        f"Lexical:      {'not built' if stats['lexical'] is None else str(stats['lexical']) + ' rows'}",
+        f"Disk size:    {format_bytes(stats['disk_bytes'])}",
+    ]
+    if stats.get('settings'):
+        lines.append("Settings:     " + ', '.join(f"{key}={value}" for key, value in stats['settings'].items()))
+    for shard in stats.get('shards', []):
+        lines.append(f"  {shard['name']}: {shard['chunks']} chunks, {count(shard['source_files'])} files, "
+                     f"{format_bytes(shard['disk_bytes'])}")
+    return lines
+
+
+class VerifyResult:
+    """Problems found by verify_index; the index is usable if there are no errors"""
+
+    def __init__(self):
+        self.errors: List[str] = []
+        self.warnings: List[str] = []
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors
+
+    def error(self, message: str):
+        self.errors.append(message)
+
+    def warning(self, message: str):
+        self.warnings.append(message)
+
+    def extend(self, other: 'VerifyResult', prefix: str = ''):
+        self.errors.extend(prefix + message for message in other.errors)
+        self.warnings.extend(prefix + message for message in other.warnings)
+
+
+def _listed(problems: List[str]) -> str:
+    shown = ', '.join(problems[:_MAX_REPORTED])
+    if len(problems) > _MAX_REPORTED:
+        shown += f" and {len(problems) - _MAX_REPORTED} more"
+    return shown
+
+
+def verify_index(index_path: str, check_sources: bool = True) -> VerifyResult:
+    """
+    Check the integrity of an index without loading a model or searching it
+
+    Checks that the header, chunk store (records and offsets), stored vectors,
+    duplicates, manifest and lexical index agree on the number of rows, that
+    every chunk record parses and that all vectors are finite (and of unit
+    length when the index says so). Shards of a sharded index are verified
+    one by one. A missing manifest or lexical index is only a warning, and
+    so are source files changed since the build (when check_sources is set;
+    sizes and modification times are compared, nothing is hashed).
+    """
+    result = VerifyResult()
+    provider = detect_provider(index_path)
+    if provider is None:
+        result.error(f"no index found at {index_path}")
+        return result
+    try:
+        if sharding.is_sharded(index_path):
+            _verify_sharded(index_path, result, check_sources)
+        elif provider == 'faiss':
+            _verify_faiss(index_path, result, check_sources)
+        elif os.path.isdir(index_path):
+            _verify_binary(index_path, result, check_sources)
+        else:
+            _verify_json(index_path, result, check_sources)
+    except (OSError, ValueError, KeyError, TypeError, pickle.UnpicklingError) as e:
+        result.error(f"unreadable index: {str(e)}")
+    return result
+
+
+def _verify_chunk_store(index_dir: Path, count: int, result: VerifyResult) -> Optional[List[str]]:
+    """Check chunks.jsonl against chunks.offsets; returns the source of every row if readable"""
+    import numpy as np
+
+    chunks_file = index_dir / vector_store.CHUNKS_FILE
+    offsets_file = index_dir / vector_store.OFFSETS_FILE
+    for path in (chunks_file, offsets_file):
+        if not path.is_file():
+            result.error(f"missing {path.name}")
+            return None
+
+    offsets = np.fromfile(str(offsets_file), dtype='<i8')
+    if len(offsets) != count + 1:
+        result.error(f"{offsets_file.name} has {len(offsets) - 1} entries, expected {count}")
+        return None
+    if offsets[0] != 0 or np.any(np.diff(offsets) <= 0):
+        result.error(f"{offsets_file.name} is not strictly increasing from 0")
+        return None
+    if offsets[-1] != chunks_file.stat().st_size:
+        result.error(f"{offsets_file.name} ends at byte {int(offsets[-1])}, "
+                     f"{chunks_file.name} has {chunks_file.stat().st_size} bytes")
+        return None
+
+    sources, bad = [], []
+    with open(chunks_file, 'rb') as f:
+        for row, line in enumerate(f):
+            try:
+                record = json.loads(line.decode('utf-8'))
+                if not all(key in record for key in ('source', 'chunk_id', 'text')):
+                    raise ValueError
+                sources.append(record['source'])
+            except ValueError:
+                bad.append(str(row))
+                sources.append(None)
+    if bad:
+        result.error(f"unreadable chunk records at rows {_listed(bad)}")
+    return sources
+
+
+def _verify_vectors(vectors, normalized: bool, result: VerifyResult, scales=None,
+                    dtype: str = vector_store.DTYPE_FLOAT32):
+    """Check that all rows are finite and, for a normalized index, of unit (or zero) length"""
+    import numpy as np
+
+    not_finite, not_unit = 0, 0
+    for start in range(0, len(vectors), _VERIFY_BLOCK):
+        block = np.asarray(vectors[start:start + _VERIFY_BLOCK], dtype=np.float32)
+        if scales is not None:
+            block *= scales
+        finite = np.isfinite(block).all(axis=1)
+        not_finite += int((~finite).sum())
+        if normalized:
+            norms = np.linalg.norm(block[finite], axis=1)
+            not_unit += int(((np.abs(norms - 1.0) > _NORM_TOLERANCE[dtype]) & (norms > 0)).sum())
+    if not_finite:
+        result.error(f"{not_finite} vectors contain NaN or infinite values")
+    if not_unit:
+        result.error(f"{not_unit} vectors are not unit length in a normalized index")
+
+
+def _verify_duplicates(duplicates, count: int, result: VerifyResult):
+    bad = [str(row) for row in duplicates.by_row if row < 0 or row >= count]
+    if bad:
+        result.error(f"duplicates point at missing rows {_listed(bad)}")
+
+
+def _verify_manifest(manifest_file: str, rows: int, duplicates: int, embedding_model: Optional[str],
+                     result: VerifyResult, check_sources: bool):
+    manifest = IndexManifest.load(manifest_file)
+    if manifest is None:
+        result.warning("no manifest: the next update rebuilds the index from scratch")
+        return
+    chunks = sum(state.get('chunks', 0) for state in manifest.files.values())
+    if chunks != rows + duplicates:
+        result.error(f"manifest lists {chunks} chunks, the index has {rows + duplicates}")
+    if embedding_model and manifest.settings.get('embedding_model') not in (None, embedding_model):
+        result.error(f"manifest model {manifest.settings.get('embedding_model')} "
+                     f"differs from index model {embedding_model}")
+    if not check_sources:
+        return
+    missing, changed = [], []
+    for path, state in manifest.files.items():
+        try:
+            stat = os.stat(path)
+        except OSError:
+            missing.append(path)
+            continue
+        if stat.st_size != state.get('size') or stat.st_mtime_ns != state.get('mtime_ns'):
+            changed.append(path)
+    if missing:
+        result.warning(f"{len(missing)} source files no longer exist: {_listed(missing)}")
+    if changed:
+        result.warning(f"{len(changed)} source files changed since the build "
+                       f"(run 'peac index update'): {_listed(changed)}")
+
+
+def _verify_lexical(directory: str, count: int, result: VerifyResult):
+    if not lexical.lexical_exists(directory):
+        result.warning("no lexical index: it is built on the first lexical or hybrid query")
+        return
+    with open(os.path.join(directory, lexical.HEADER_FILE), 'r', encoding='utf-8') as f:
+        header = json.load(f)
+    if int(header.get('count', -1)) != count:
+        result.error(f"lexical index has {header.get('count')} rows, the index has {count}")
+    postings = int(header.get('postings', 0))
+    if os.path.getsize(os.path.join(directory, lexical.POSTINGS_FILE)) != postings * 8:
+        result.error(f"{lexical.POSTINGS_FILE} does not hold the {postings} postings of its header")
+    if os.path.getsize(os.path.join(directory, lexical.LENGTHS_FILE)) != int(header.get('count', 0)) * 4:
+        result.error(f"{lexical.LENGTHS_FILE} does not match the lexical row count")
+    if any(offset < 0 or offset + df > postings for offset, df in header.get('vocab', {}).values()):
+        result.error("lexical vocabulary points past the end of the postings")
+
+
+def _verify_binary(index_path: str, result: VerifyResult, check_sources: bool):
+    import numpy as np
+
+    index_dir = Path(index_path)
+    with open(index_dir / vector_store.HEADER_FILE, 'r', encoding='utf-8') as f:
+        header = json.load(f)
+    count = int(header.get('count', 0))
+    dimension = int(header.get('dimension') or 0)
+    dtype = vector_store.resolve_vector_dtype(header.get('dtype'))
+    normalized = bool(header.get('normalized'))
+
+    scales = None
+    if dtype == vector_store.DTYPE_INT8:
+        scales_file = index_dir / vector_store.SCALES_FILE
+        if not scales_file.is_file() or scales_file.stat().st_size != dimension * 4:
+            result.error(f"{vector_store.SCALES_FILE} is missing or does not hold {dimension} scales")
+            return
+        scales = np.fromfile(scales_file, dtype='<f4')
+        if not (np.isfinite(scales).all() and (scales > 0).all()):
+            result.error(f"{vector_store.SCALES_FILE} holds non-positive or non-finite scales")
+
+    stored = [(vector_store.embeddings_file(dtype), dtype, scales)]
+    if dtype != vector_store.DTYPE_FLOAT32 and header.get('exact'):
+        stored.append((vector_store.EMBEDDINGS_FILE, vector_store.DTYPE_FLOAT32, None))
+    for name, file_dtype, file_scales in stored:
+        embeddings_file = index_dir / name
+        storage = vector_store.storage_dtype(file_dtype)
+        expected = count * dimension * storage.itemsize
+        if not embeddings_file.is_file():
+            result.error(f"missing {embeddings_file.name}")
+        elif embeddings_file.stat().st_size != expected:
+            result.error(f"{embeddings_file.name} has {embeddings_file.stat().st_size} bytes, "
+                         f"expected {expected} ({count} x {dimension} {file_dtype})")
+        elif count and dimension:
+            vectors = np.memmap(embeddings_file, dtype=storage, mode='r', shape=(count, dimension))
+            _verify_vectors(vectors, normalized, result, file_scales, file_dtype)
+
+    _verify_chunk_store(index_dir, count, result)
+    duplicates = vector_store.DuplicateMap.load(str(index_dir / vector_store.DUPLICATES_FILE))
+    _verify_duplicates(duplicates, count, result)
+    if 'duplicates' in header and int(header['duplicates']) != len(duplicates):
+        result.error(f"header declares {header['duplicates']} duplicates, "
+                     f"{vector_store.DUPLICATES_FILE} has {len(duplicates)}")
+    _verify_manifest(manifest_path_for(index_path), count, len(duplicates), header.get('embedding_model'),
+                     result, check_sources)
+    _verify_lexical(index_path, count, result)
+
+
+def _verify_json(index_path: str, result: VerifyResult, check_sources: bool):
+    index = vector_store.load_json_index(index_path)
+    count = len(index.chunks)
+    if index.embeddings.shape[0] != count:
+        result.error(f"{index.embeddings.shape[0]} embeddings for {count} chunks")
+    else:
+        _verify_vectors(index.embeddings, index.normalized, result)
+    bad = [str(row) for row, record in enumerate(index.chunks)
+           if not all(key in record for key in ('source', 'chunk_id', 'text'))]
+    if bad:
+        result.error(f"incomplete chunk records at rows {_listed(bad)}")
+    _verify_duplicates(index.duplicates, count, result)
+    _verify_manifest(manifest_path_for(index_path, sidecar=True), count, len(index.duplicates),
+                     index.embedding_model, result, check_sources)
+    _verify_lexical(f"{index_path}.lexical", count, result)
+
+
+def _verify_faiss(index_path: str, result: VerifyResult, check_sources: bool):
+    index_dir = Path(index_path)
+    metadata_file = index_dir / FaissProvider.METADATA_FILE
+    if not metadata_file.is_file():
+        if (index_dir / FaissProvider.LEGACY_METADATA_FILE).is_file():
+            _verify_legacy_faiss(index_path, result)
+        else:
+            result.error(f"missing {FaissProvider.METADATA_FILE}")
+        return
+
+    with open(metadata_file, 'r', encoding='utf-8') as f:
+        metadata = json.load(f)
+    count = int(metadata.get('num_chunks', 0))
+    dimension = int(metadata.get('dimension') or 0)
+    _verify_chunk_store(index_dir, count, result)
+
+    try:
+        import faiss
+    except ImportError:
+        result.warning("faiss is not installed: index.faiss was not checked")
+    else:
+        try:
+            index = faiss.read_index(str(index_dir / FaissProvider.INDEX_FILE),
+                                     faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+        except RuntimeError:
+            index = faiss.read_index(str(index_dir / FaissProvider.INDEX_FILE))
+        if index.ntotal != count:
+            result.error(f"{FaissProvider.INDEX_FILE} holds {index.ntotal} vectors, metadata declares {count}")
+        if index.d != dimension:
+            result.error(f"{FaissProvider.INDEX_FILE} has dimension {index.d}, metadata declares {dimension}")
+
+    vectors_file = index_dir / FaissProvider.VECTORS_FILE
+    if vectors_file.is_file():
+        expected = count * dimension * 4
+        if vectors_file.stat().st_size != expected:
+            result.error(f"{vectors_file.name} has {vectors_file.stat().st_size} bytes, expected {expected}")
+        elif count and dimension:
+            import numpy as np
+            _verify_vectors(np.memmap(vectors_file, dtype='<f4', mode='r', shape=(count, dimension)),
+                            False, result)
+    elif metadata.get('index_type') in FaissProvider.LOSSY_INDEX_TYPES:
+        result.warning(f"no {vectors_file.name}: the next update re-embeds every file")
+
+    duplicates = vector_store.DuplicateMap.load(str(index_dir / vector_store.DUPLICATES_FILE))
+    _verify_duplicates(duplicates, count, result)
+    _verify_manifest(manifest_path_for(index_path), count, len(duplicates), metadata.get('embedding_model'),
+                     result, check_sources)
+    _verify_lexical(index_path, count, result)
+
+
+def _verify_legacy_faiss(index_path: str, result: VerifyResult):
+    index_dir = Path(index_path)
+    with open(index_dir / FaissProvider.LEGACY_METADATA_FILE, 'rb') as f:
+        metadata = pickle.load(f)
+    result.warning(f"legacy {FaissProvider.LEGACY_METADATA_FILE} metadata: "
+                   f"run 'peac index build' to migrate the index")
+    try:
+        import faiss
+    except ImportError:
+        return
+    index = faiss.read_index(str(index_dir / FaissProvider.INDEX_FILE))
+    if index.ntotal != len(metadata.get('chunks', [])):
+        result.error(f"{FaissProvider.INDEX_FILE} holds {index.ntotal} vectors, "
+                     f"metadata has {len(metadata.get('chunks', []))} chunks")
+
+
+def _verify_sharded(index_path: str, result: VerifyResult, check_sources: bool):
+    info = sharding.load_shards(index_path)
+    names = [shard['name'] for shard in info.get('shards', [])]
+    if not names:
+        result.error(f"{sharding.SHARDS_FILE} lists no shards")
+    for name in names:
+        path = sharding.shard_path(index_path, name)
+        if detect_provider(path) != info.get('provider'):
+            result.error(f"shard {name}: no {info.get('provider')} index at {path}")
+            continue
+        result.extend(verify_index(path, check_sources), prefix=f"shard {name}: ")
+    shards_dir = Path(index_path) / sharding.SHARDS_DIR
+    extra = sorted(entry.name for entry in shards_dir.iterdir()
+                   if entry.is_dir() and entry.name not in names) if shards_dir.is_dir() else []
+    if extra:
+        result.warning(f"shard directories not listed in {sharding.SHARDS_FILE}: {_listed(extra)}")
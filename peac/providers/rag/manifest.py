@@ -0,0 +1,184 @@
+"""Per-file manifest for incremental RAG index rebuilds
+
+The manifest records, for every source file that went into an index, its size,
+modification time and content hash, plus the settings that shape the chunks
+(embedding model, chunk size, overlap). On a rebuild the providers diff the
+current source files against it and only re-read and re-embed files that were
+added or changed; rows of deleted or changed files are dropped.
+"""
+
+import os
+import json
+from typing import Dict, Any, Iterable, Optional, List, Tuple
+
+# Shared with the extraction cache, which keys extracted text by the same hash
+from ...extraction_cache import file_digest as hash_file
+
+
+MANIFEST_VERSION = 1
+MANIFEST_FILE = 'manifest.json'
+
+
+def manifest_path_for(index_path: str, sidecar: bool = False) -> str:
+    """
+    Location of the manifest for an index
+
+    Directory indexes keep it inside the directory; single-file indexes
+    (legacy JSON) use a '<index>.manifest.json' file next to the index.
+    """
+    if sidecar:
+        return f"{index_path}.manifest.json"
+    return os.path.join(index_path, MANIFEST_FILE)
+
+
+def file_state(file_path: str, sha256: Optional[str] = None) -> Dict[str, Any]:
+    """Size, mtime and content hash of a file (hash computed unless given)"""
+    stat = os.stat(file_path)
+    return {
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'sha256': sha256 if sha256 is not None else hash_file(file_path),
+    }
+
+
+class ManifestDiff:
+    """Result of comparing source files against a previous manifest"""
+
+    def __init__(self):
+        self.added: List[str] = []
+        self.changed: List[str] = []
+        self.removed: List[str] = []
+        self.unchanged: List[str] = []
+        self.states: Dict[str, Dict[str, Any]] = {}
+
+    @property
+    def to_embed(self) -> List[str]:
+        """Files whose content must be (re-)read and embedded, in source order"""
+        pending = set(self.added) | set(self.changed)
+        return [path for path in self.states if path in pending]
+
+    def digests(self, file_paths: Iterable[str]) -> Dict[str, str]:
+        """Content hash of each of file_paths computed by the diff (so extraction need not hash again)"""
+        return {path: self.states[path]['sha256'] for path in file_paths
+                if self.states.get(path, {}).get('sha256')}
+
+    @property
+    def has_changes(self) -> bool:
+        return bool(self.added or self.changed or self.removed)
+
+    def summary(self) -> str:
+        return (f"{len(self.added)} added, {len(self.changed)} changed, "
+                f"{len(self.removed)} removed, {len(self.unchanged)} unchanged")
+
+
+class IndexManifest:
+    """Source file states and chunking settings of a built index"""
+
+    def __init__(self, settings: Optional[Dict[str, Any]] = None,
+                 files: Optional[Dict[str, Dict[str, Any]]] = None):
+        self.settings = settings or {}
+        self.files = files or {}
+
+    @classmethod
+    def load(cls, path: str) -> Optional['IndexManifest']:
+        """Load a manifest, returning None if it is missing or unreadable"""
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get('version') != MANIFEST_VERSION:
+            return None
+        return cls(data.get('settings', {}), data.get('files', {}))
+
+    def save(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': MANIFEST_VERSION, 'settings': self.settings, 'files': self.files},
+                      f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+
+    def is_compatible(self, settings: Dict[str, Any]) -> bool:
+        """True if chunks built with these settings can be reused"""
+        return all(self.settings.get(key) == value for key, value in settings.items())
+
+    def diff(self, file_paths: List[str]) -> ManifestDiff:
+        """
+        Classify current source files against this manifest
+
+        Size and mtime are compared first; the content hash is only computed
+        when they differ, so a touched but unmodified file still counts as
+        unchanged.
+        """
+        result = ManifestDiff()
+        for path in file_paths:
+            previous = self.files.get(path)
+            if previous is None:
+                result.added.append(path)
+                result.states[path] = file_state(path)
+                continue
+
+            stat = os.stat(path)
+            if stat.st_size == previous.get('size') and stat.st_mtime_ns == previous.get('mtime_ns'):
+                result.unchanged.append(path)
+                result.states[path] = {
+                    'size': stat.st_size,
+                    'mtime_ns': stat.st_mtime_ns,
+                    'sha256': previous.get('sha256'),
+                }
+                continue
+
+            state = file_state(path)
+            result.states[path] = state
+            if state['sha256'] == previous.get('sha256'):
+                result.unchanged.append(path)
+            else:
+                result.changed.append(path)
+
+        current = set(file_paths)
+        result.removed = [path for path in self.files if path not in current]
+        return result
+
+    @classmethod
+    def from_diff(cls, settings: Dict[str, Any], diff: ManifestDiff,
+                  chunk_sources: Iterable[str] = (),
+                  chunk_counts: Optional[Dict[str, int]] = None) -> 'IndexManifest':
+        """Build the manifest of a freshly written index from its chunk sources or per-file counts"""
+        counts: Dict[str, int] = dict(chunk_counts or {})
+        for source in chunk_sources:
+            counts[source] = counts.get(source, 0) + 1
+        files = {}
+        for path, state in diff.states.items():
+            files[path] = dict(state, chunks=counts.get(path, 0))
+        return cls(settings, files)
+
+    def refreshed(self, diff: ManifestDiff) -> 'IndexManifest':
+        """Copy with the file states seen by an unchanged diff (e.g. touched files)"""
+        files = {
+            path: dict(state, chunks=self.files.get(path, {}).get('chunks', 0))
+            for path, state in diff.states.items()
+        }
+        return IndexManifest(self.settings, files)
+
+
+def row_ranges(sources: Iterable[str]) -> Dict[str, List[Tuple[int, int]]]:
+    """
+    Row ranges of every source file in an existing index
+
+    Rows are grouped per source file, so each file normally owns a single
+    contiguous [start, end) range; the result only grows with the number of
+    files, not with the number of rows.
+    """
+    ranges: Dict[str, List[Tuple[int, int]]] = {}
+    current, start, row = None, 0, 0
+    for row, source in enumerate(sources):
+        if source != current:
+            if current is not None:
+                ranges.setdefault(current, []).append((start, row))
+            current, start = source, row
+    if current is not None:
+        ranges.setdefault(current, []).append((start, row + 1))
+    return ranges
@@ -0,0 +1,88 @@
+"""Process-wide registry of FastEmbed embedding models
+
+Loading a TextEmbedding (ONNX session + tokenizer) is the most expensive step of
+a RAG query. Providers are created per rule, so models are kept here instead of
+on the provider instance: every provider asking for the same model name and
+options gets the same object, and each model is loaded at most once per process
+even when several threads ask for it at the same time.
+"""
+
+import json
+import threading
+from typing import Any, Dict, Iterable, List, Tuple, Union
+
+
+_models: Dict[Tuple[str, str], Any] = {}
+_lock = threading.Lock()
+_key_locks: Dict[Tuple[str, str], threading.Lock] = {}
+
+
+def _registry_key(model_name: str, options: Dict[str, Any]) -> Tuple[str, str]:
+    return model_name, json.dumps(options, sort_keys=True, default=str)
+
+
+def _create_model(model_name: str, options: Dict[str, Any]):
+    """Instantiate a FastEmbed model (separate so tests can substitute it)"""
+    try:
+        from fastembed import TextEmbedding
+    except ImportError:
+        raise ImportError("fastembed library not installed. Install with: pip install fastembed")
+    return TextEmbedding(model_name=model_name, **options)
+
+
+def get_embedding_model(model_name: str, **options):
+    """
+    Return the shared embedding model, loading it on first use
+
+    Args:
+        model_name: FastEmbed model name (e.g. 'BAAI/bge-small-en-v1.5')
+        **options: Extra TextEmbedding arguments (e.g. threads, cache_dir);
+                   different options give a different model instance
+
+    Returns:
+        fastembed.TextEmbedding instance
+    """
+    key = _registry_key(model_name, options)
+    model = _models.get(key)
+    if model is not None:
+        return model
+
+    with _lock:
+        key_lock = _key_locks.setdefault(key, threading.Lock())
+
+    with key_lock:
+        model = _models.get(key)
+        if model is None:
+            print(f"Loading FastEmbed model: {model_name}")
+            model = _create_model(model_name, options)
+            _models[key] = model
+            print(f"Model loaded successfully")
+    return model
+
+
+def warm_up(model_names: Union[str, Iterable[str]], **options) -> List[Any]:
+    """
+    Load models ahead of time so the first query does not pay the load cost
+
+    Args:
+        model_names: One model name or an iterable of names
+        **options: TextEmbedding arguments shared by all models
+
+    Returns:
+        The loaded models, in the order given
+    """
+    if isinstance(model_names, str):
+        model_names = [model_names]
+    return [get_embedding_model(name, **options) for name in model_names]
+
+
+def loaded_models() -> List[str]:
+    """Names of the models currently held by the registry"""
+    return sorted({name for name, _ in _models})
+
+
+def clear_models():
+    """Release all models (mainly for tests and long-running processes)"""
+    with _lock:
+        _models.clear()
+        _key_locks.clear()
@@ -0,0 +1,301 @@
+"""Streaming chunk-and-embed pipeline for RAG index builds
+
+An index build used to read every document, chunk them all, embed all chunks
+in one call and only then write the index, so peak memory grew with the
+corpus. ChunkPipeline chains the stages lazily instead:
+
+    documents (iter_documents) -> chunks -> de-duplication
+    -> batches of at most batch_size rows -> embed(batch)
+    -> (vectors, records, duplicates) handed to the index writer
+
+Extraction and chunking run in a producer thread (with extraction itself in
+the process pool of iter_documents) that fills a bounded queue of chunked
+documents, while the consumer embeds and writes. PDF parsing and ONNX
+inference, which both release the GIL or run in other processes, therefore
+overlap instead of taking turns. At any time only the queued documents, the
+extraction window and one embedding batch are held in memory, so peak RSS is
+bounded by the queue and batch sizes rather than by the corpus size.
+
+Chunks that duplicate an earlier chunk (see dedup.ChunkDeduplicator) are not
+embedded and get no row; they are passed on as duplicate entries pointing at
+the earlier row.
+
+Incremental rebuilds go through the same pipeline: every chunk of an unchanged
+file, including its recorded duplicates, is replayed from the previous index
+(see PreviousRows) with its stored vector, at the position the file has in
+``source_files``. Rows and duplicates therefore come out as in a full rebuild.
+
+The time spent in each stage is collected in ``timings`` (see STAGES) and
+summarized by stage_report(), to help size ``workers``, ``queue_size`` and
+``batch_size``. An optional ``progress`` callback is called with the pipeline
+after every written batch (see maintenance.BuildProgress).
+"""
+
+import heapq
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .dedup import ChunkDeduplicator, DEDUP_OFF
+from .manifest import row_ranges
+
+
+# Chunked documents buffered between the producer thread and the embedder
+DEFAULT_QUEUE_SIZE = 16
+
+STAGES = (
+    ('extract', 'extract'),                # producer waiting for extracted documents
+    ('chunk', 'chunk'),                    # producer splitting documents into chunks
+    ('dedup', 'dedup'),                    # consumer looking up duplicate chunks
+    ('embed', 'embed'),                    # consumer embedding batches
+    ('write', 'write'),                    # index writer handling each batch
+    ('copy', 'copy'),                      # chunks read back from the previous index
+    ('embed_idle', 'embedder idle'),       # consumer waiting on an empty queue
+    ('queue_full', 'extraction blocked'),  # producer waiting on a full queue
+)
+
+_DONE = object()
+
+
+class PreviousRows:
+    """
+    Chunks of the index being rebuilt, read back per source file
+
+    Args:
+        sources: Source of every row of the previous index, in row order
+        duplicates: The previous index's DuplicateMap
+        fetch: Returns (vectors, records) for a list of previous row ids
+    """
+
+    def __init__(self, sources: Iterable[str], duplicates, fetch: Callable[[List[int]], Tuple[Any, List[Dict]]]):
+        self.ranges = row_ranges(sources)
+        self.duplicates = duplicates.by_source()
+        self.fetch = fetch
+
+    def occurrences(self, path: str, batch_size: int) -> Iterator[Tuple[int, Dict[str, Any], Any]]:
+        """(chunk_id, record, vector) of every chunk of a file, rows and duplicates, in chunk order"""
+        return heapq.merge(self._rows(path, batch_size), self._duplicates(path, batch_size),
+                           key=lambda occurrence: occurrence[0])
+
+    def _rows(self, path: str, batch_size: int):
+        for start, end in self.ranges.get(path, []):
+            for offset in range(start, end, batch_size):
+                vectors, records = self.fetch(list(range(offset, min(end, offset + batch_size))))
+                for vector, record in zip(vectors, records):
+                    record.pop('duplicates', None)
+                    yield record['chunk_id'], record, vector
+
+    def _duplicates(self, path: str, batch_size: int):
+        occurrences = self.duplicates.get(path, [])
+        for offset in range(0, len(occurrences), batch_size):
+            group = occurrences[offset:offset + batch_size]
+            vectors, records = self.fetch([row for _, row in group])
+            for (chunk_id, _), vector, record in zip(group, vectors, records):
+                yield chunk_id, {'source': path, 'chunk_id': chunk_id, 'text': record['text']}, vector
+
+
+class ChunkPipeline:
+    """
+    Iterate the content of a (re)built index as (vectors, records, duplicates) batches
+
+    Args:
+        source_files: All source files of the index, in row order
+        unchanged: Files whose chunks are replayed from the previous index
+        documents: (path, content) of the files to embed, in source order;
+                   files missing from it (empty or unreadable) get no rows
+        chunker: Splits one document's content into chunk texts
+        embed: Returns the float32 embedding matrix of a list of chunk texts
+        batch_size: Maximum rows per batch (and per embed call)
+        previous: The previous index (PreviousRows) for incremental rebuilds
+        queue_size: Chunked documents buffered between the producer thread
+                    and the embedder
+        dedup: ChunkDeduplicator deciding which chunks share a row (default:
+               none, every chunk gets a row)
+        progress: Called with the pipeline after every written batch
+
+    ``duplicates`` in each batch are {'row', 'source', 'chunk_id'} entries
+    whose row has already been yielded. After iteration, ``chunk_counts``
+    holds the number of chunks per source (duplicates included), ``unique``
+    the number of rows, ``duplicates`` the number of duplicate entries,
+    ``embedded`` the number of newly embedded chunks and ``batches`` the
+    number of embed calls. ``files_done`` counts the source files handled
+    so far.
+    """
+
+    def __init__(self, source_files: List[str], unchanged: Iterable[str],
+                 documents: Iterable[Tuple[str, str]], chunker: Callable[[str], List[str]],
+                 embed: Callable[[List[str]], Any], batch_size: int = 256,
+                 previous: Optional[PreviousRows] = None,
+                 queue_size: int = DEFAULT_QUEUE_SIZE,
+                 dedup: Optional[ChunkDeduplicator] = None,
+                 progress: Optional[Callable[['ChunkPipeline'], None]] = None):
+        self.source_files = source_files
+        self.unchanged = set(unchanged)
+        self.documents = documents
+        self.chunker = chunker
+        self.embed = embed
+        self.batch_size = max(1, int(batch_size))
+        self.previous = previous
+        self.queue_size = max(1, int(queue_size))
+        self.dedup = dedup or ChunkDeduplicator(DEDUP_OFF)
+        self.progress = progress
+        self.chunk_counts: Dict[str, int] = {}
+        self.unique = 0
+        self.duplicates = 0
+        self.embedded = 0
+        self.batches = 0
+        self.files_done = 0
+        self.timings: Dict[str, float] = {stage: 0.0 for stage, _ in STAGES}
+        self._pending: List[Tuple[Dict[str, Any], Any]] = []
+        self._pending_duplicates: List[Dict[str, Any]] = []
+
+    @property
+    def rows(self) -> int:
+        """Chunks produced so far, duplicates included"""
+        return sum(self.chunk_counts.values())
+
+    def stage_report(self) -> str:
+        """One-line summary of the time spent per stage"""
+        return ', '.join(f"{label} {self.timings[stage]:.2f}s" for stage, label in STAGES)
+
+    def __iter__(self) -> Iterator[Tuple[Any, List[Dict[str, Any]], List[Dict[str, Any]]]]:
+        chunked = queue.Queue(maxsize=self.queue_size)
+        stop = threading.Event()
+        producer = threading.Thread(target=self._produce, args=(chunked, stop),
+                                    name='peac-index-producer', daemon=True)
+        producer.start()
+        try:
+            yield from self._consume(chunked)
+        finally:
+            # Also reached when the consumer gives up early: unblock and join the producer
+            stop.set()
+            while producer.is_alive():
+                try:
+                    chunked.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            producer.join()
+        # Every old chunk is replayed: release the previous index before it is replaced
+        self.previous = None
+
+    def _produce(self, chunked: queue.Queue, stop: threading.Event):
+        """Producer thread: extract and chunk documents in order into the bounded queue"""
+        documents = iter(self.documents)
+        try:
+            while not stop.is_set():
+                start = time.perf_counter()
+                document = next(documents, None)
+                self.timings['extract'] += time.perf_counter() - start
+                if document is None:
+                    break
+                path, content = document
+                start = time.perf_counter()
+                chunks = self.chunker(content)
+                self.timings['chunk'] += time.perf_counter() - start
+                self._put(chunked, stop, (path, chunks))
+            self._put(chunked, stop, _DONE)
+        except BaseException as e:
+            self._put(chunked, stop, e)
+        finally:
+            close = getattr(documents, 'close', None)
+            if close is not None:
+                close()
+
+    def _put(self, chunked: queue.Queue, stop: threading.Event, item):
+        start = time.perf_counter()
+        while not stop.is_set():
+            try:
+                chunked.put(item, timeout=0.1)
+                break
+            except queue.Full:
+                continue
+        self.timings['queue_full'] += time.perf_counter() - start
+
+    def _next_document(self, chunked: queue.Queue):
+        start = time.perf_counter()
+        item = chunked.get()
+        self.timings['embed_idle'] += time.perf_counter() - start
+        if isinstance(item, BaseException):
+            raise item
+        return None if item is _DONE else item
+
+    def _consume(self, chunked: queue.Queue):
+        next_document = self._next_document(chunked)
+
+        for path in self.source_files:
+            self.files_done += 1
+            if path in self.unchanged:
+                if self.previous is not None:
+                    yield from self._replay(path)
+                continue
+
+            if next_document is None or next_document[0] != path:
+                continue
+            for i, text in enumerate(next_document[1]):
+                yield from self._add({'source': path, 'chunk_id': i, 'text': text})
+            next_document = self._next_document(chunked)
+
+        yield from self._flush()
+
+    def _replay(self, path: str):
+        occurrences = self.previous.occurrences(path, self.batch_size)
+        while True:
+            start = time.perf_counter()
+            occurrence = next(occurrences, None)
+            self.timings['copy'] += time.perf_counter() - start
+            if occurrence is None:
+                break
+            _, record, vector = occurrence
+            yield from self._add(record, vector)
+
+    def _add(self, record: Dict[str, Any], vector=None):
+        """Queue one chunk as a new row or as a duplicate of an earlier one"""
+        self.chunk_counts[record['source']] = self.chunk_counts.get(record['source'], 0) + 1
+        start = time.perf_counter()
+        row = self.dedup.canonical_row(record['text'], self.unique)
+        self.timings['dedup'] += time.perf_counter() - start
+
+        if row != self.unique:
+            self._pending_duplicates.append({'row': row, 'source': record['source'],
+                                             'chunk_id': record['chunk_id']})
+            self.duplicates += 1
+            return
+        self.unique += 1
+        self._pending.append((record, vector))
+        if len(self._pending) >= self.batch_size:
+            yield from self._flush()
+
+    def _flush(self):
+        """Embed the pending rows that have no vector yet and yield the batch"""
+        import numpy as np
+
+        pending, self._pending = self._pending, []
+        duplicates, self._pending_duplicates = self._pending_duplicates, []
+        if not pending and not duplicates:
+            return
+
+        vectors = [vector for _, vector in pending]
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            start = time.perf_counter()
+            embedded = self.embed([pending[i][0]['text'] for i in missing])
+            self.timings['embed'] += time.perf_counter() - start
+            for i, vector in zip(missing, embedded):
+                vectors[i] = vector
+            self.embedded += len(missing)
+            self.batches += 1
+        matrix = np.stack(vectors).astype(np.float32, copy=False) if vectors else np.zeros((0, 0), np.float32)
+
+        start = time.perf_counter()
+        yield matrix, [record for record, _ in pending], duplicates
+        self.timings['write'] += time.perf_counter() - start
+        if self.progress is not None:
+            self.progress(self)
+
+
+def embed_texts(model, texts: List[str], batch_size: int):
+    """Embed one batch of texts with a FastEmbed model into a float32 matrix"""
+    import numpy as np
+
+    return np.asarray(list(model.embed(texts, batch_size=batch_size)), dtype=np.float32).reshape(len(texts), -1)
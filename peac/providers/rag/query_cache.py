@@ -0,0 +1,79 @@
+"""Persistent cache of query embeddings
+
+Prompts are rendered again and again with the same RAG queries, and embedding a
+query is the only reason a search needs the model at all. Query vectors are
+stored in a small SQLite database under the PEaC cache directory, keyed by
+embedding model name and query text; when every query of a run is found there,
+the embedding model is never loaded.
+
+The number of stored queries is capped (PEAC_QUERY_CACHE_SIZE, default 10000);
+the least recently used entries are evicted first. Any error while reading or
+writing the database is treated as a cache miss.
+"""
+
+import os
+import threading
+from typing import Optional
+
+from ...cache_paths import get_cache_dir
+from ...sqlite_cache import EVICT_COUNT, SQLiteLRUCache
+
+
+DEFAULT_MAX_ENTRIES = 10000
+DB_FILE = 'query_embeddings.sqlite3'
+
+
+class QueryEmbeddingCache(SQLiteLRUCache):
+    """SQLite-backed LRU store of query vectors"""
+
+    TABLE = 'query_embeddings'
+    KEY_COLUMNS = ('model', 'query')
+    COLUMNS = ('dimension INTEGER NOT NULL', 'vector BLOB NOT NULL')
+    EVICTION = EVICT_COUNT
+    LIMIT_ENV = 'PEAC_QUERY_CACHE_SIZE'
+    DEFAULT_LIMIT = DEFAULT_MAX_ENTRIES
+    NAME = 'query embedding cache'
+
+    def __init__(self, db_path: str, max_entries: Optional[int] = None):
+        super().__init__(db_path, max_entries)
+
+    @property
+    def max_entries(self) -> int:
+        return self.limit
+
+    def get(self, model: str, query: str):
+        """Return the cached float32 vector, or None on a miss"""
+        row = self._get((model, query), ('dimension', 'vector'))
+        if row is None:
+            return None
+        import numpy as np
+
+        dimension, blob = row
+        vector = np.frombuffer(blob, dtype=np.float32)
+        if vector.shape[0] != dimension:
+            return None
+        return vector.copy()
+
+    def put(self, model: str, query: str, vector) -> None:
+        """Store a query vector, evicting the least recently used entries over the cap"""
+        if self.limit <= 0:
+            return
+        import numpy as np
+
+        vector = np.asarray(vector, dtype=np.float32).reshape(-1)
+        self._put((model, query), {'dimension': int(vector.shape[0]), 'vector': vector.tobytes()})
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_query_cache() -> QueryEmbeddingCache:
+    """The query cache of the current cache directory (see peac.cache_paths)"""
+    db_path = os.path.join(get_cache_dir(), DB_FILE)
+    with _caches_lock:
+        cache = _caches.get(db_path)
+        if cache is None:
+            cache = QueryEmbeddingCache(db_path)
+            _caches[db_path] = cache
+        return cache
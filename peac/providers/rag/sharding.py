@@ -0,0 +1,169 @@
+"""Sharded RAG indexes
+
+A sharded index is a directory holding one complete sub-index per shard and a
+``shards.json`` listing them::
+
+    index_path/
+        shards.json         strategy and shard names, in search order
+        shards/<name>/      a regular index of the provider (own manifest)
+
+Shards are built independently and in parallel, each with its own incremental
+manifest, so a rebuild only re-embeds the shards whose files changed; the
+others report "up to date". At query time the shards are searched
+concurrently (NumPy and FAISS release the GIL while scoring), each returns its
+own top_k, and the per-shard lists are combined with a k-way merge. Only the
+shards being searched need to be mapped, so an index can grow past RAM.
+
+``provider_config.shards`` selects how source files are split:
+
+- 'subfolder': one shard per top-level subfolder of source_folder (files
+  directly in it form the '_root' shard);
+- an integer N: N shards, each file assigned by a stable hash of its path
+  relative to source_folder, so files never move between shards when others
+  are added or removed.
+
+BM25 statistics (and hence lexical and hybrid scores) are computed per shard.
+"""
+
+import heapq
+import json
+import os
+import shutil
+import zlib
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+
+SHARDS_FILE = 'shards.json'
+SHARDS_DIR = 'shards'
+SHARDS_VERSION = 1
+
+STRATEGY_SUBFOLDER = 'subfolder'
+ROOT_SHARD = '_root'
+
+
+def resolve_shards(value) -> Optional[Union[str, int]]:
+    """Validate a provider_config 'shards' value; None means a single, unsharded index"""
+    if value is None or value is False:
+        return None
+    if isinstance(value, str) and not value.strip().isdigit():
+        value = value.lower().strip()
+        if value != STRATEGY_SUBFOLDER:
+            raise ValueError(f"Unknown shard strategy: '{value}'. Use '{STRATEGY_SUBFOLDER}' or a number of shards")
+        return value
+    count = int(value)
+    if count < 1:
+        raise ValueError(f"Number of shards must be at least 1, got {count}")
+    return count
+
+
+def is_sharded(index_path: str) -> bool:
+    return os.path.isfile(os.path.join(index_path, SHARDS_FILE))
+
+
+def shard_path(index_path: str, name: str) -> str:
+    return os.path.join(index_path, SHARDS_DIR, name)
+
+
+def plan_shards(source_folder: str, source_files: List[str], strategy: Union[str, int]) -> Dict[str, List[str]]:
+    """
+    Split source files into shards
+
+    Returns:
+        Shard name -> files (in the given order), sorted by shard name; empty
+        shards are left out
+    """
+    root = Path(source_folder)
+    plan: Dict[str, List[str]] = {}
+    for file_path in source_files:
+        try:
+            relative = Path(file_path).relative_to(root)
+        except ValueError:
+            relative = Path(Path(file_path).name)
+        if strategy == STRATEGY_SUBFOLDER:
+            name = relative.parts[0] if len(relative.parts) > 1 else ROOT_SHARD
+        else:
+            width = max(3, len(str(strategy - 1)))
+            name = f"shard-{zlib.crc32(relative.as_posix().encode('utf-8')) % strategy:0{width}d}"
+        plan.setdefault(name, []).append(file_path)
+    return dict(sorted(plan.items()))
+
+
+def load_shards(index_path: str) -> Dict[str, Any]:
+    """Read shards.json of a sharded index"""
+    with open(os.path.join(index_path, SHARDS_FILE), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def write_shards(index_path: str, provider: str, strategy: Union[str, int], shards: List[Dict[str, Any]]):
+    """Write shards.json (moved into place once complete)"""
+    os.makedirs(index_path, exist_ok=True)
+    info = {'format_version': SHARDS_VERSION, 'provider': provider, 'strategy': strategy, 'shards': shards}
+    tmp_file = os.path.join(index_path, f"{SHARDS_FILE}.tmp")
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(info, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_file, os.path.join(index_path, SHARDS_FILE))
+
+
+def remove_stale_shards(index_path: str, keep: List[str]) -> List[str]:
+    """Delete shard directories not in keep; returns their names"""
+    shards_dir = Path(index_path) / SHARDS_DIR
+    if not shards_dir.is_dir():
+        return []
+    removed = []
+    for entry in sorted(shards_dir.iterdir()):
+        if entry.is_dir() and entry.name not in keep:
+            shutil.rmtree(entry)
+            removed.append(entry.name)
+    return removed
+
+
+def remove_shards(index_path: str):
+    """Turn a sharded index directory back into a plain one (shards.json and shards/ removed)"""
+    shards_file = Path(index_path) / SHARDS_FILE
+    if shards_file.exists():
+        shards_file.unlink()
+    shutil.rmtree(Path(index_path) / SHARDS_DIR, ignore_errors=True)
+
+
+def merge_top_k(rankings: List[List[Dict[str, Any]]], top_k: int) -> List[Dict[str, Any]]:
+    """
+    k-way merge of per-shard results, each sorted by descending score
+
+    Equal scores keep shard order. Returns the top_k results with their
+    'rank' renumbered.
+    """
+    merged = heapq.merge(*rankings, key=lambda result: -result['score'])
+    results = []
+    for rank, result in enumerate(merged, 1):
+        if rank > top_k:
+            break
+        result['rank'] = rank
+        results.append(result)
+    return results
+
+
+def fuse_results(rankings: List[List[Dict[str, Any]]], top_k: int) -> List[Dict[str, Any]]:
+    """
+    Reciprocal rank fusion of merged result lists (see lexical.fuse_rankings)
+
+    Results are identified by their 'source' and 'chunk_id'; each fused result
+    keeps the record of its first ranking, with the fused 'score' and a new
+    'rank'. Ties are ordered by source and chunk.
+    """
+    from .lexical import fuse_rankings
+
+    records = {}
+    keyed = []
+    for ranking in rankings:
+        keyed.append([])
+        for result in ranking:
+            key = (str(result.get('source', '')), int(result.get('chunk_id', 0)))
+            records.setdefault(key, result)
+            keyed[-1].append((result['score'], key))
+    results = []
+    for rank, (score, key) in enumerate(fuse_rankings(keyed, top_k), 1):
+        result = dict(records[key], score=score, rank=rank)
+        results.append(result)
+    return results
+
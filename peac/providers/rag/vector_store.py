@@ -0,0 +1,603 @@
+"""Binary vector store for FastEmbed indexes - memory-mapped embeddings + chunk sidecar
+
+On-disk layout of a binary index (``index_path`` is a directory)::
+
+    index_path/
+        index.json          header: provider, model, dimension, count, dtype
+        embeddings.f32      raw float32 matrix (count x dimension), C order,
+                            rows L2-normalized when the header says 'normalized'
+        embeddings.f16      instead of embeddings.f32 for dtype 'float16'
+        embeddings.i8       instead of embeddings.f32 for dtype 'int8': rows
+                            quantized per dimension, x ~= q * scale
+        embeddings.scales   float32 scale of every dimension (int8 only)
+        chunks.jsonl        one JSON object per chunk (source, chunk_id, text)
+        chunks.offsets      raw int64 byte offsets into chunks.jsonl (count + 1)
+        duplicates.jsonl    extra (row, source, chunk_id) occurrences of rows
+                            whose text appeared more than once (see dedup)
+
+The embeddings matrix is opened with ``numpy.memmap`` so loading an index costs
+only the header and offsets, and chunk records are read on demand by id.
+
+float16 halves and int8 quarters the size of the matrix; searches score the
+stored matrix directly, converting one block of rows at a time. When the
+header says 'exact', a reduced-precision index also keeps embeddings.f32 so
+the best candidates can be re-scored at full precision (see VectorIndex.exact).
+Legacy JSON indexes (single file with 'chunks' and 'embeddings') are still
+readable through ``load_index`` and can be migrated with ``convert_json_index``.
+"""
+
+import os
+import json
+import shutil
+import struct
+from pathlib import Path
+from typing import Dict, Any, Optional, List, Iterable, Iterator, Tuple
+
+import numpy as np
+
+
+FORMAT_VERSION = 1
+
+HEADER_FILE = 'index.json'
+EMBEDDINGS_FILE = 'embeddings.f32'
+SCALES_FILE = 'embeddings.scales'
+CHUNKS_FILE = 'chunks.jsonl'
+OFFSETS_FILE = 'chunks.offsets'
+DUPLICATES_FILE = 'duplicates.jsonl'
+
+FORMAT_JSON = 'json'
+FORMAT_BINARY = 'binary'
+INDEX_FORMATS = (FORMAT_JSON, FORMAT_BINARY)
+
+DTYPE_FLOAT32 = 'float32'
+DTYPE_FLOAT16 = 'float16'
+DTYPE_INT8 = 'int8'
+# From most to least precise
+VECTOR_DTYPES = (DTYPE_FLOAT32, DTYPE_FLOAT16, DTYPE_INT8)
+
+# dtype -> (embeddings file, on-disk numpy dtype)
+_STORAGE = {
+    DTYPE_FLOAT32: (EMBEDDINGS_FILE, '<f4'),
+    DTYPE_FLOAT16: ('embeddings.f16', '<f2'),
+    DTYPE_INT8: ('embeddings.i8', 'i1'),
+}
+
+# Rows converted at a time when quantizing a staged float32 matrix
+_QUANTIZE_BLOCK = 65536
+
+
+def resolve_index_format(index_path: str, index_format: Optional[str] = None) -> str:
+    """
+    Decide which on-disk format an index path uses
+
+    An explicit ``index_format`` wins. Otherwise an existing directory or any
+    path without a ``.json`` suffix is treated as a binary index, so existing
+    YAML files pointing at ``*.json`` keep their legacy format.
+    """
+    if index_format:
+        index_format = index_format.lower().strip()
+        if index_format not in INDEX_FORMATS:
+            raise ValueError(
+                f"Unknown index format: '{index_format}'. "
+                f"Available formats: {', '.join(INDEX_FORMATS)}"
+            )
+        return index_format
+    if os.path.isdir(index_path):
+        return FORMAT_BINARY
+    return FORMAT_JSON if index_path.lower().endswith('.json') else FORMAT_BINARY
+
+
+def resolve_vector_dtype(dtype: Optional[str] = None) -> str:
+    """Validate a provider_config 'dtype' value (default: float32)"""
+    if dtype is None:
+        return DTYPE_FLOAT32
+    dtype = str(dtype).lower().strip()
+    if dtype not in VECTOR_DTYPES:
+        raise ValueError(f"Unknown vector dtype: '{dtype}'. Available dtypes: {', '.join(VECTOR_DTYPES)}")
+    return dtype
+
+
+def embeddings_file(dtype: str) -> str:
+    """Name of the embeddings file of a binary index with the given dtype"""
+    return _STORAGE[dtype][0]
+
+
+def storage_dtype(dtype: str) -> np.dtype:
+    """numpy dtype of the stored embeddings matrix"""
+    return np.dtype(_STORAGE[dtype][1])
+
+
+def normalize_rows(embeddings):
+    """Return a float32 copy of the matrix with every row scaled to unit L2 norm"""
+    matrix = np.array(embeddings, dtype=np.float32, copy=True)
+    if matrix.ndim != 2 or matrix.size == 0:
+        return matrix
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix /= norms
+    return matrix
+
+
+def is_binary_index(index_path: str) -> bool:
+    """Check if a binary index exists at the given path"""
+    return (Path(index_path) / HEADER_FILE).is_file()
+
+
+def index_files(index_path: str) -> List[str]:
+    """Files whose state identifies the content of an index (for cache fingerprints)"""
+    if os.path.isdir(index_path):
+        index_dir = Path(index_path)
+        names = [HEADER_FILE] + [name for name, _ in _STORAGE.values()] + [SCALES_FILE, CHUNKS_FILE,
+                                                                            OFFSETS_FILE, DUPLICATES_FILE]
+        return [str(index_dir / name) for name in names]
+    return [index_path]
+
+
+def index_exists(index_path: str) -> bool:
+    """Check if an index in any supported format exists at the given path"""
+    if os.path.isdir(index_path):
+        return is_binary_index(index_path)
+    return os.path.isfile(index_path)
+
+
+class ChunkStore:
+    """Random-access chunk metadata backed by a JSON lines file and byte offsets"""
+
+    def __init__(self, chunks_path: str, offsets_path: str):
+        self.chunks_path = str(chunks_path)
+        self.offsets = np.fromfile(str(offsets_path), dtype='<i8')
+
+    def __len__(self) -> int:
+        return max(len(self.offsets) - 1, 0)
+
+    def __getitem__(self, idx: int) -> Dict[str, Any]:
+        return self.get_many([idx])[0]
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        with open(self.chunks_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                yield json.loads(line)
+
+    def get_many(self, ids: Iterable[int]) -> List[Dict[str, Any]]:
+        """Read the records for the given chunk ids, touching only those lines"""
+        ids = [int(i) for i in ids]
+        records = []
+        with open(self.chunks_path, 'rb') as f:
+            for idx in ids:
+                if idx < 0 or idx >= len(self):
+                    raise IndexError(f"Chunk id {idx} out of range (0..{len(self) - 1})")
+                start, end = self.offsets[idx], self.offsets[idx + 1]
+                f.seek(int(start))
+                records.append(json.loads(f.read(int(end - start)).decode('utf-8')))
+        return records
+
+
+class ChunkStoreWriter:
+    """Append-only writer for a ChunkStore; both files are written as records arrive"""
+
+    def __init__(self, chunks_path: str, offsets_path: str):
+        self.offsets_path = str(offsets_path)
+        self._file = open(chunks_path, 'wb')
+        self._offsets_file = open(offsets_path, 'wb')
+        self._offset = 0
+        self._count = 0
+        self._offsets_file.write(struct.pack('<q', 0))
+
+    def append(self, record: Dict[str, Any]):
+        line = (json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8')
+        self._file.write(line)
+        self._offset += len(line)
+        self._count += 1
+        self._offsets_file.write(struct.pack('<q', self._offset))
+
+    def __len__(self) -> int:
+        return self._count
+
+    def close(self):
+        self._file.close()
+        self._offsets_file.close()
+
+
+class DuplicateMap:
+    """
+    Extra occurrences of de-duplicated rows
+
+    A chunk found again in another place (or the same file) is stored once;
+    every further occurrence is kept here as {'row', 'source', 'chunk_id'}.
+    """
+
+    def __init__(self, entries: Iterable[Dict[str, Any]] = ()):
+        self.by_row: Dict[int, List[Dict[str, Any]]] = {}
+        self.count = 0
+        for entry in entries:
+            self.by_row.setdefault(int(entry['row']), []).append(
+                {'source': entry['source'], 'chunk_id': entry['chunk_id']}
+            )
+            self.count += 1
+
+    @classmethod
+    def load(cls, path: str) -> 'DuplicateMap':
+        """Read a duplicates.jsonl file; a missing file means no duplicates"""
+        if not os.path.isfile(path):
+            return cls()
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(json.loads(line) for line in f if line.strip())
+
+    def __len__(self) -> int:
+        return self.count
+
+    def for_row(self, row: int) -> List[Dict[str, Any]]:
+        return [dict(entry) for entry in self.by_row.get(int(row), ())]
+
+    def entries(self) -> List[Dict[str, Any]]:
+        return [dict(entry, row=row) for row, entries in self.by_row.items() for entry in entries]
+
+    def by_source(self) -> Dict[str, List[Tuple[int, int]]]:
+        """(chunk_id, row) of every duplicate occurrence, per source, in chunk order"""
+        result: Dict[str, List[Tuple[int, int]]] = {}
+        for row, entries in self.by_row.items():
+            for entry in entries:
+                result.setdefault(entry['source'], []).append((entry['chunk_id'], row))
+        for occurrences in result.values():
+            occurrences.sort()
+        return result
+
+    def attach(self, row: int, record: Dict[str, Any]) -> Dict[str, Any]:
+        """Add a 'duplicates' list to a chunk record when the row has other occurrences"""
+        if row in self.by_row:
+            record['duplicates'] = self.for_row(row)
+        return record
+
+
+class VectorIndex:
+    """
+    A loaded index: embeddings matrix, chunk records and header
+
+    ``embeddings`` is the stored matrix in the index dtype. For int8 indexes
+    ``scales`` holds the per-dimension scale (row ~= embeddings[row] *
+    scales), and ``exact`` is the float32 copy of a reduced-precision index
+    built for re-ranking (None otherwise).
+    """
+
+    def __init__(self, header: Dict[str, Any], embeddings, chunks, path: str = '',
+                 duplicates: Optional[DuplicateMap] = None, scales=None, exact=None):
+        self.header = header
+        self.embeddings = embeddings
+        self.chunks = chunks
+        self.path = path
+        self.duplicates = duplicates if duplicates is not None else DuplicateMap()
+        self.scales = scales
+        self.exact = exact
+
+    @property
+    def embedding_model(self) -> Optional[str]:
+        return self.header.get('embedding_model')
+
+    @property
+    def format(self) -> str:
+        return self.header.get('format', FORMAT_JSON)
+
+    @property
+    def normalized(self) -> bool:
+        return bool(self.header.get('normalized', False))
+
+    @property
+    def dtype(self) -> str:
+        return self.header.get('dtype', DTYPE_FLOAT32)
+
+    def vectors(self, rows) -> np.ndarray:
+        """float32 vectors of the given rows: the exact copy if there is one, else dequantized"""
+        rows = np.asarray(rows, dtype=np.int64)
+        if self.exact is not None:
+            return np.asarray(self.exact[rows], dtype=np.float32)
+        matrix = np.asarray(self.embeddings[rows], dtype=np.float32)
+        if self.scales is not None:
+            matrix = matrix * self.scales
+        return matrix
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    @property
+    def memory_bytes(self) -> int:
+        """Rough heap footprint; memory-mapped embeddings live in the page cache"""
+        size = 0
+        if not isinstance(self.embeddings, np.memmap):
+            size += int(self.embeddings.nbytes)
+        if self.scales is not None:
+            size += int(self.scales.nbytes)
+        if isinstance(self.chunks, ChunkStore):
+            size += int(self.chunks.offsets.nbytes)
+        else:
+            size += sum(len(chunk.get('text', '')) + 200 for chunk in self.chunks)
+        return size + 150 * len(self.duplicates)
+
+    def get_chunks(self, ids: Iterable[int]) -> List[Dict[str, Any]]:
+        """Return copies of the chunk records for the given row ids, with their duplicates"""
+        ids = [int(i) for i in ids]
+        if isinstance(self.chunks, ChunkStore):
+            records = self.chunks.get_many(ids)
+        else:
+            records = [dict(self.chunks[i]) for i in ids]
+        return [self.duplicates.attach(i, record) for i, record in zip(ids, records)]
+
+
+class VectorStoreWriter:
+    """
+    Write a binary index incrementally, then publish it atomically on close()
+
+    float16 rows are converted as they arrive. int8 rows are staged as
+    float32 while the largest magnitude of every dimension is tracked, and
+    quantized in blocks on close() with scale = max |x| / 127. keep_exact
+    also publishes the float32 matrix of a reduced-precision index.
+    """
+
+    def __init__(self, index_path: str, embedding_model: str, provider: str = 'fastembed',
+                 extra_header: Optional[Dict[str, Any]] = None, dtype: str = DTYPE_FLOAT32,
+                 keep_exact: bool = False):
+        self.dtype = resolve_vector_dtype(dtype)
+        self.keep_exact = bool(keep_exact) and self.dtype != DTYPE_FLOAT32
+        self.index_path = Path(index_path)
+        self.tmp_path = self.index_path.with_name(self.index_path.name + '.tmp')
+        if self.tmp_path.exists():
+            shutil.rmtree(self.tmp_path)
+        self.tmp_path.mkdir(parents=True)
+
+        self.header = {
+            'provider': provider,
+            'format': FORMAT_BINARY,
+            'format_version': FORMAT_VERSION,
+            'embedding_model': embedding_model,
+            'dtype': self.dtype,
+            'dimension': None,
+            'count': 0,
+        }
+        if self.dtype != DTYPE_FLOAT32:
+            self.header['exact'] = self.keep_exact
+        if extra_header:
+            self.header.update(extra_header)
+
+        # float32 rows: the stored matrix, the int8 staging file or the exact copy
+        self._embeddings = None
+        if self.dtype != DTYPE_FLOAT16 or self.keep_exact:
+            self._embeddings = open(self.tmp_path / EMBEDDINGS_FILE, 'wb')
+        self._half = open(self.tmp_path / embeddings_file(DTYPE_FLOAT16), 'wb') if self.dtype == DTYPE_FLOAT16 else None
+        self._max_abs = None
+        self._chunks = ChunkStoreWriter(self.tmp_path / CHUNKS_FILE, self.tmp_path / OFFSETS_FILE)
+        self._duplicates = open(self.tmp_path / DUPLICATES_FILE, 'w', encoding='utf-8')
+        self.duplicate_count = 0
+
+    def add(self, embeddings, chunks: List[Dict[str, Any]]):
+        """Append a batch of embeddings with their chunk records"""
+        matrix = np.ascontiguousarray(np.asarray(embeddings, dtype=np.float32))
+        if matrix.ndim != 2 or matrix.shape[0] != len(chunks):
+            raise ValueError(
+                f"Embeddings shape {matrix.shape} does not match {len(chunks)} chunks"
+            )
+        if len(chunks) == 0:
+            return
+        if self.header['dimension'] is None:
+            self.header['dimension'] = int(matrix.shape[1])
+        elif matrix.shape[1] != self.header['dimension']:
+            raise ValueError(
+                f"Embedding dimension {matrix.shape[1]} does not match index dimension "
+                f"{self.header['dimension']}"
+            )
+        if self._embeddings is not None:
+            self._embeddings.write(matrix.tobytes())
+        if self._half is not None:
+            self._half.write(matrix.astype('<f2').tobytes())
+        if self.dtype == DTYPE_INT8:
+            batch_max = np.abs(matrix).max(axis=0)
+            self._max_abs = batch_max if self._max_abs is None else np.maximum(self._max_abs, batch_max)
+        for record in chunks:
+            self._chunks.append(record)
+        self.header['count'] += len(chunks)
+
+    def add_duplicates(self, entries: Iterable[Dict[str, Any]]):
+        """Record further occurrences ({'row', 'source', 'chunk_id'}) of rows already added"""
+        for entry in entries:
+            self._duplicates.write(json.dumps(
+                {'row': entry['row'], 'source': entry['source'], 'chunk_id': entry['chunk_id']},
+                ensure_ascii=False) + '\n')
+            self.duplicate_count += 1
+
+    def _close_files(self):
+        for f in (self._embeddings, self._half, self._duplicates):
+            if f is not None:
+                f.close()
+        self._chunks.close()
+
+    def _quantize(self):
+        """Write embeddings.i8 and embeddings.scales from the staged float32 rows"""
+        count, dimension = self.header['count'], self.header['dimension']
+        scales = np.ones(dimension, dtype=np.float32)
+        nonzero = self._max_abs > 0
+        scales[nonzero] = self._max_abs[nonzero] / 127.0
+        staged = np.memmap(self.tmp_path / EMBEDDINGS_FILE, dtype='<f4', mode='r', shape=(count, dimension))
+        with open(self.tmp_path / embeddings_file(DTYPE_INT8), 'wb') as f:
+            for start in range(0, count, _QUANTIZE_BLOCK):
+                block = np.asarray(staged[start:start + _QUANTIZE_BLOCK]) / scales
+                f.write(np.clip(np.rint(block), -127, 127).astype(np.int8).tobytes())
+        del staged
+        scales.astype('<f4').tofile(str(self.tmp_path / SCALES_FILE))
+
+    def close(self):
+        """Flush files, write the header and swap the new index into place"""
+        self._close_files()
+        if self.dtype == DTYPE_INT8 and self.header['count']:
+            self._quantize()
+        staged = self.tmp_path / EMBEDDINGS_FILE
+        if self.dtype != DTYPE_FLOAT32 and not self.keep_exact and staged.exists():
+            staged.unlink()
+        self.header['duplicates'] = self.duplicate_count
+        with open(self.tmp_path / HEADER_FILE, 'w', encoding='utf-8') as f:
+            json.dump(self.header, f, ensure_ascii=False, indent=2)
+
+        if self.index_path.exists():
+            if self.index_path.is_dir():
+                shutil.rmtree(self.index_path)
+            else:
+                self.index_path.unlink()
+        os.replace(self.tmp_path, self.index_path)
+
+    def abort(self):
+        """Discard a partially written index"""
+        self._close_files()
+        shutil.rmtree(self.tmp_path, ignore_errors=True)
+
+
+def load_binary_index(index_path: str, mmap: bool = True) -> VectorIndex:
+    """Load a binary index; embeddings are memory-mapped unless mmap is False"""
+    index_dir = Path(index_path)
+    with open(index_dir / HEADER_FILE, 'r', encoding='utf-8') as f:
+        header = json.load(f)
+
+    count = int(header.get('count', 0))
+    dimension = int(header.get('dimension') or 0)
+    dtype = resolve_vector_dtype(header.get('dtype'))
+
+    def matrix(name: str, file_dtype):
+        if count == 0 or dimension == 0:
+            return np.zeros((0, dimension), dtype=file_dtype)
+        if mmap:
+            return np.memmap(index_dir / name, dtype=file_dtype, mode='r', shape=(count, dimension))
+        return np.fromfile(index_dir / name, dtype=file_dtype).reshape(count, dimension)
+
+    embeddings = matrix(embeddings_file(dtype), storage_dtype(dtype))
+    scales = exact = None
+    if dtype == DTYPE_INT8:
+        scales = np.fromfile(index_dir / SCALES_FILE, dtype='<f4') if dimension else np.ones(0, np.float32)
+    if dtype != DTYPE_FLOAT32 and header.get('exact'):
+        exact = matrix(EMBEDDINGS_FILE, '<f4')
+
+    chunks = ChunkStore(index_dir / CHUNKS_FILE, index_dir / OFFSETS_FILE)
+    if len(chunks) != count:
+        raise ValueError(
+            f"Corrupt index at {index_path}: header declares {count} chunks, "
+            f"metadata has {len(chunks)}"
+        )
+    duplicates = DuplicateMap.load(str(index_dir / DUPLICATES_FILE))
+    return VectorIndex(header, embeddings, chunks, str(index_dir), duplicates, scales, exact)
+
+
+def load_json_index(index_path: str) -> VectorIndex:
+    """Load a legacy JSON index fully into memory"""
+    with open(index_path, 'r', encoding='utf-8') as f:
+        index_data = json.load(f)
+
+    if 'chunks' not in index_data or 'embeddings' not in index_data:
+        raise ValueError("Invalid index structure (missing 'chunks' or 'embeddings')")
+
+    embeddings = np.asarray(index_data['embeddings'], dtype=np.float32)
+    if embeddings.ndim != 2:
+        embeddings = embeddings.reshape(len(index_data['chunks']), -1)
+    # Loaded indexes may be shared through the index cache
+    embeddings.flags.writeable = False
+    header = {key: value for key, value in index_data.items()
+              if key not in ('chunks', 'embeddings', 'duplicates')}
+    header.setdefault('format', FORMAT_JSON)
+    header['count'] = len(index_data['chunks'])
+    header['dimension'] = int(embeddings.shape[1]) if embeddings.size else 0
+    duplicates = DuplicateMap(index_data.get('duplicates', []))
+    return VectorIndex(header, embeddings, index_data['chunks'], str(index_path), duplicates)
+
+
+def load_index(index_path: str, mmap: bool = True) -> VectorIndex:
+    """Load an index in either the binary or the legacy JSON format"""
+    if os.path.isdir(index_path):
+        return load_binary_index(index_path, mmap=mmap)
+    return load_json_index(index_path)
+
+
+def write_json_index(index_path: str, embedding_model: str, chunks: List[Dict[str, Any]],
+                     embeddings, provider: str = 'fastembed',
+                     extra_header: Optional[Dict[str, Any]] = None,
+                     duplicates: Optional[List[Dict[str, Any]]] = None):
+    """Write a legacy JSON index (kept for indexes addressed by a *.json path)"""
+    embeddings_list = [emb.tolist() if hasattr(emb, 'tolist') else emb for emb in embeddings]
+    index_data = {
+        'provider': provider,
+        'embedding_model': embedding_model,
+    }
+    if extra_header:
+        index_data.update(extra_header)
+    index_data['chunks'] = chunks
+    index_data['embeddings'] = embeddings_list
+    if duplicates:
+        index_data['duplicates'] = duplicates
+
+    index_dir = os.path.dirname(index_path)
+    if index_dir:
+        os.makedirs(index_dir, exist_ok=True)
+
+    with open(index_path, 'w', encoding='utf-8') as f:
+        json.dump(index_data, f, ensure_ascii=False, indent=2)
+
+
+def write_binary_index(index_path: str, embedding_model: str, chunks: List[Dict[str, Any]],
+                       embeddings, provider: str = 'fastembed',
+                       extra_header: Optional[Dict[str, Any]] = None,
+                       dtype: str = DTYPE_FLOAT32, keep_exact: bool = False):
+    """Write a complete binary index in one call"""
+    writer = VectorStoreWriter(index_path, embedding_model, provider, extra_header=extra_header,
+                               dtype=dtype, keep_exact=keep_exact)
+    try:
+        if chunks:
+            writer.add(np.asarray(list(embeddings), dtype=np.float32).reshape(len(chunks), -1), chunks)
+    except Exception:
+        writer.abort()
+        raise
+    writer.close()
+
+
+def convert_json_index(json_path: str, output_path: Optional[str] = None) -> str:
+    """
+    Convert a legacy JSON index to the binary format
+
+    Rows are L2-normalized on the way so the converted index can be scored
+    with a plain dot product.
+
+    Args:
+        json_path: Path to the existing JSON index file
+        output_path: Target directory (default: json_path without the .json suffix)
+
+    Returns:
+        Path of the binary index that was written
+    """
+    if output_path is None:
+        output_path = str(Path(json_path).with_suffix(''))
+    if os.path.abspath(output_path) == os.path.abspath(json_path):
+        raise ValueError("Output path must differ from the JSON index path")
+
+    index = load_json_index(json_path)
+    extra_header = {
+        key: value for key, value in index.header.items()
+        if key not in ('format', 'count', 'dimension', 'embedding_model', 'provider')
+    }
+    extra_header['normalized'] = True
+    writer = VectorStoreWriter(
+        output_path,
+        index.embedding_model,
+        index.header.get('provider', 'fastembed'),
+        extra_header=extra_header,
+    )
+    try:
+        writer.add(normalize_rows(index.embeddings), list(index.chunks))
+        writer.add_duplicates(index.duplicates.entries())
+    except Exception:
+        writer.abort()
+        raise
+    writer.close()
+    return output_path
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) < 2:
+        print("Usage: python -m peac.providers.rag.vector_store <index.json> [output_dir]")
+        sys.exit(1)
+
+    target = convert_json_index(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else None)
+    print(f"Converted {sys.argv[1]} -> {target}")
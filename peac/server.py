@@ -0,0 +1,394 @@
+"""Long-running prompt server (``peac serve``)
+
+Every ``peac prompt`` run is a fresh process: it imports the web, document and
+vector search libraries, loads the embedding model and maps every RAG index
+before doing a few milliseconds of actual work. PromptServer keeps one process
+alive instead, so the model registry, the index cache and the query and
+extraction caches stay warm between renders.
+
+The API is plain HTTP/1.1 with JSON bodies, on a loopback TCP address
+(``127.0.0.1:8765`` by default) or on a Unix socket (``unix:/path/to.sock``):
+
+    GET  /health    {"status": "ok", "pid", "uptime", "renders"}
+    GET  /stats     index cache counters and loaded models
+    POST /render    {"yaml_path": absolute path, "section_headers": bool,
+                     "cache": bool (use peac.prompt_cache),
+                     "rule_workers": int, "rule_pool": "thread" | "process"}
+                    -> {"output": what ``peac prompt`` would have printed}
+    POST /shutdown  stop the server
+
+Threat model: the server renders any prompt file it is given, which reads the
+local sources the file names and can build or rebuild RAG indexes, so only
+the user who started it may use it. Every request must carry
+``Authorization: Bearer <token>``, the token being a random secret stored in
+``server.token`` in the PEaC cache directory (see peac.cache_paths), created
+with mode 0600; the clients below read it from there. Other local users
+cannot read the file, and a web page cannot set the header on a cross-site
+request without a CORS preflight the server never grants. POST bodies must
+also be sent as ``application/json``, so a plain form or ``text/plain``
+request is rejected before it is parsed. The token does not encrypt
+anything: use a loopback address or a Unix socket, never a public interface.
+
+Every render re-reads the prompt file and its extends chain, and cached
+indexes are fingerprinted by their files, so edits are picked up without a
+restart. Renders are serialized: each one captures what it prints (the prompt
+and any warnings) so the forwarded output is exactly that of a local run.
+
+``peac prompt --server`` calls render_remote(); when nothing listens on the
+address it renders locally instead.
+"""
+
+import contextlib
+import hmac
+import http.client
+import io
+import json
+import os
+import secrets
+import socket
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+
+DEFAULT_ADDRESS = '127.0.0.1:8765'
+UNIX_PREFIX = 'unix:'
+
+# Seconds a client waits for a render (large RAG builds can take a while)
+DEFAULT_TIMEOUT = 600.0
+
+
+TOKEN_FILE = 'server.token'
+
+
+class ServerError(Exception):
+    """The server was reached but could not handle the request"""
+
+
+def get_server_token() -> str:
+    """The secret shared by the server and its clients, created on first use (mode 0600)"""
+    from peac.cache_paths import get_cache_dir
+
+    token_path = os.path.join(get_cache_dir(), TOKEN_FILE)
+    try:
+        fd = os.open(token_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        # Tighten a file created by hand or with a permissive umask
+        os.chmod(token_path, 0o600)
+        with open(token_path, 'r', encoding='utf-8') as f:
+            token = f.read().strip()
+        if token:
+            return token
+        fd = os.open(token_path, os.O_WRONLY | os.O_TRUNC)
+    token = secrets.token_hex(32)
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        f.write(token)
+    return token
+
+
+def parse_address(address: str) -> Tuple[str, Union[str, Tuple[str, int]]]:
+    """
+    Split a server address into its family and socket address
+
+    Returns:
+        ('unix', socket path) for 'unix:/path', ('tcp', (host, port)) for
+        'host:port', ':port' or 'port' (host defaults to 127.0.0.1)
+    """
+    address = (address or DEFAULT_ADDRESS).strip()
+    if address.startswith(UNIX_PREFIX):
+        path = address[len(UNIX_PREFIX):]
+        if not path:
+            raise ValueError("Missing socket path in server address 'unix:'")
+        return 'unix', path
+    host, _, port = address.rpartition(':')
+    try:
+        port = int(port)
+    except ValueError:
+        raise ValueError(f"Invalid server address: '{address}'. Use HOST:PORT or unix:/path/to.sock")
+    return 'tcp', (host.strip('[]') or '127.0.0.1', port)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = 'peac'
+    protocol_version = 'HTTP/1.1'
+
+    def address_string(self):
+        # Unix socket peers have no (host, port)
+        return self.client_address[0] if self.client_address else 'local'
+
+    def log_message(self, format, *args):
+        if self.server.prompt_server.verbose:
+            super().log_message(format, *args)
+
+    def _authorized(self) -> bool:
+        """Check the bearer token, replying 401 when it is missing or wrong"""
+        scheme, _, token = (self.headers.get('Authorization') or '').partition(' ')
+        if scheme.lower() == 'bearer' and hmac.compare_digest(token.strip().encode('utf-8'),
+                                                              self.server.prompt_server.token.encode('utf-8')):
+            return True
+        self._reply(401, {'error': f"Missing or invalid token (see {TOKEN_FILE} in the PEaC cache directory)"})
+        return False
+
+    def do_GET(self):
+        prompt_server = self.server.prompt_server
+        if not self._authorized():
+            return
+        if self.path == '/health':
+            self._reply(200, prompt_server.health())
+        elif self.path == '/stats':
+            self._reply(200, prompt_server.stats())
+        else:
+            self._reply(404, {'error': f"Unknown endpoint: {self.path}"})
+
+    def do_POST(self):
+        prompt_server = self.server.prompt_server
+        if not self._authorized():
+            return
+        content_type = (self.headers.get('Content-Type') or '').split(';')[0].strip().lower()
+        if content_type != 'application/json':
+            self._reply(415, {'error': 'Request body must be application/json'})
+            return
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+            request = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            self._reply(400, {'error': 'Request body is not valid JSON'})
+            return
+
+        if self.path == '/render':
+            yaml_path = request.get('yaml_path')
+            if not isinstance(yaml_path, str) or not os.path.isabs(yaml_path):
+                self._reply(400, {'error': "'yaml_path' must be an absolute path"})
+                return
+            rule_workers, rule_pool = request.get('rule_workers'), request.get('rule_pool')
+            if (rule_workers is not None and (not isinstance(rule_workers, int) or isinstance(rule_workers, bool))) \
+                    or (rule_pool is not None and not isinstance(rule_pool, str)):
+                self._reply(400, {'error': "'rule_workers' must be an integer and 'rule_pool' a string"})
+                return
+            try:
+                output = prompt_server.render(yaml_path, bool(request.get('section_headers', True)),
+                                              bool(request.get('cache', False)), rule_workers, rule_pool)
+            except Exception as e:
+                self._reply(500, {'error': f"{type(e).__name__}: {str(e)}"})
+                return
+            self._reply(200, {'output': output})
+        elif self.path == '/shutdown':
+            self._reply(200, {'status': 'stopping'})
+            # shutdown() waits for serve_forever(), which runs in another thread
+            threading.Thread(target=prompt_server.shutdown, daemon=True).start()
+        else:
+            self._reply(404, {'error': f"Unknown endpoint: {self.path}"})
+
+    def _reply(self, status: int, body: Dict[str, Any]):
+        data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        if status >= 400:
+            # The request body may not have been read: do not reuse the connection
+            self.send_header('Connection', 'close')
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class PromptServer:
+    """
+    Renders prompt files on request, keeping models and indexes loaded
+
+    Args:
+        address: 'host:port' or 'unix:/path/to.sock' (port 0 picks a free port)
+        verbose: Log every request to stderr
+        token: Secret clients must send (default: get_server_token())
+    """
+
+    def __init__(self, address: str = DEFAULT_ADDRESS, verbose: bool = False, token: Optional[str] = None):
+        self.family, socket_address = parse_address(address)
+        self.verbose = verbose
+        self.token = token or get_server_token()
+        self.renders = 0
+        self.started = time.time()
+        self._render_lock = threading.Lock()
+        if self.family == 'unix':
+            if not hasattr(socket, 'AF_UNIX'):
+                raise ValueError("Unix sockets are not supported on this platform")
+            _remove_stale_socket(socket_address)
+            self._httpd = _UnixHTTPServer(socket_address, _Handler)
+        else:
+            self._httpd = ThreadingHTTPServer(socket_address, _Handler)
+            self._httpd.daemon_threads = True
+        self._httpd.prompt_server = self
+
+    @property
+    def address(self) -> str:
+        """The address clients connect to (with the actual port when 0 was given)"""
+        if self.family == 'unix':
+            return f"{UNIX_PREFIX}{self._httpd.server_address}"
+        host, port = self._httpd.server_address[:2]
+        return f"{host}:{port}"
+
+    def render(self, yaml_path: str, section_headers: bool = True, cache: bool = False,
+               rule_workers: Optional[int] = None, rule_pool: Optional[str] = None) -> str:
+        """Everything ``peac prompt`` prints for a prompt file (``peac prompt --cache`` with cache)
+
+        rule_workers and rule_pool default to the server's PEAC_RULE_WORKERS and PEAC_RULE_POOL.
+        """
+        from peac.core.peac import PromptYaml
+
+        with self._render_lock:
+            buffer = io.StringIO()
+            with contextlib.redirect_stdout(buffer):
+                prompt = PromptYaml(yaml_path, add_section_headers=section_headers,
+                                    rule_workers=rule_workers, rule_pool=rule_pool)
+                if cache:
+                    from peac.prompt_cache import render_cached
+
+                    print(render_cached(prompt)[0])
+                else:
+                    prompt.print()
+            self.renders += 1
+            return buffer.getvalue()
+
+    def warm(self, yaml_paths: Iterable[str]) -> List[Tuple[str, str]]:
+        """Render prompt files once so their models and indexes are loaded before the first request
+
+        A file that fails to render is skipped.
+
+        Returns:
+            (yaml_path, error) for every file that failed
+        """
+        failures = []
+        for yaml_path in yaml_paths:
+            try:
+                self.render(os.path.abspath(yaml_path))
+            except Exception as e:
+                failures.append((yaml_path, f"{type(e).__name__}: {str(e)}"))
+        return failures
+
+    def health(self) -> Dict[str, Any]:
+        return {'status': 'ok', 'pid': os.getpid(), 'uptime': round(time.time() - self.started, 3),
+                'renders': self.renders}
+
+    def stats(self) -> Dict[str, Any]:
+        from peac.providers.rag.index_cache import get_index_cache
+        from peac.providers.rag.model_registry import loaded_models
+
+        return dict(self.health(), index_cache=get_index_cache().stats(), models=loaded_models())
+
+    def serve_forever(self):
+        try:
+            self._httpd.serve_forever()
+        finally:
+            self.close()
+
+    def close(self):
+        """Release the socket (and remove the unix socket file)"""
+        self._httpd.server_close()
+        if self.family == 'unix':
+            _remove_stale_socket(self._httpd.server_address)
+
+    def shutdown(self):
+        self._httpd.shutdown()
+
+
+def _remove_stale_socket(path: str):
+    """Remove a socket file left behind by a server that is no longer running"""
+    if os.path.exists(path) and not _socket_alive(path):
+        os.unlink(path)
+
+
+def _socket_alive(path: str) -> bool:
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(1.0)
+    try:
+        sock.connect(path)
+        return True
+    except OSError:
+        return False
+    finally:
+        sock.close()
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path: str, timeout: float):
+        super().__init__('localhost', timeout=timeout)
+        self.socket_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+def _request(address: str, method: str, path: str, body: Optional[Dict[str, Any]] = None,
+             timeout: float = DEFAULT_TIMEOUT, token: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """
+    Send one request with the server token; None when no server is listening on the address
+
+    Raises:
+        ServerError: The server answered with an error
+    """
+    family, socket_address = parse_address(address)
+    if family == 'unix':
+        connection = _UnixHTTPConnection(socket_address, timeout)
+    else:
+        connection = http.client.HTTPConnection(*socket_address, timeout=timeout)
+    data = json.dumps(body).encode('utf-8') if body is not None else None
+    headers = {'Authorization': f"Bearer {token or get_server_token()}"}
+    if data is not None:
+        headers['Content-Type'] = 'application/json'
+    try:
+        connection.request(method, path, body=data, headers=headers)
+        response = connection.getresponse()
+        payload = response.read()
+    except (ConnectionRefusedError, ConnectionResetError, FileNotFoundError):
+        # Nothing listening, or a server that closed the connection while shutting down
+        return None
+    except OSError as e:
+        raise ServerError(f"Lost connection to peac server at {address}: {str(e)}")
+    finally:
+        connection.close()
+
+    try:
+        result = json.loads(payload)
+    except ValueError:
+        raise ServerError(f"Unexpected response from {address} (HTTP {response.status})")
+    if response.status != 200:
+        raise ServerError(result.get('error', f"HTTP {response.status}"))
+    return result
+
+
+def render_remote(address: str, yaml_path: str, section_headers: bool = True,
+                  timeout: float = DEFAULT_TIMEOUT, cache: bool = False,
+                  token: Optional[str] = None, rule_workers: Optional[int] = None,
+                  rule_pool: Optional[str] = None) -> Optional[str]:
+    """
+    Render a prompt file on a running server
+
+    Returns:
+        The output ``peac prompt`` would print, or None when no server is
+        running at the address
+
+    Raises:
+        ServerError: The server failed to render the prompt
+    """
+    result = _request(address, 'POST', '/render',
+                      {'yaml_path': os.path.abspath(yaml_path), 'section_headers': section_headers,
+                       'cache': cache, 'rule_workers': rule_workers, 'rule_pool': rule_pool},
+                      timeout, token)
+    return None if result is None else result['output']
+
+
+def server_health(address: str, timeout: float = 5.0, token: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """/health of the server at address, or None when none is running"""
+    return _request(address, 'GET', '/health', timeout=timeout, token=token)
+
+
+def stop_server(address: str, timeout: float = 5.0, token: Optional[str] = None) -> bool:
+    """Ask the server at address to shut down; False when none is running"""
+    return _request(address, 'POST', '/shutdown', {}, timeout, token) is not None
@@ -0,0 +1,155 @@
+"""SQLite-backed least-recently-used stores under the PEaC cache directory
+
+The query embedding, extraction and prompt caches share one layout: a single
+table keyed by one or more text columns, with a ``last_used`` timestamp that
+every hit refreshes. SQLiteLRUCache owns the table, the locking and the
+eviction; subclasses only declare their columns and (de)serialize values.
+
+Eviction is either by number of rows or by total size (a ``size`` column the
+subclass fills with the byte size of each entry). Any error while reading
+the database is treated as a cache miss; a failed write prints a warning.
+"""
+
+import contextlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+EVICT_COUNT = 'count'
+EVICT_SIZE = 'size'
+
+
+class SQLiteLRUCache:
+    """
+    One SQLite table of entries, evicted least recently used first
+
+    Subclasses set:
+        TABLE: Table name
+        KEY_COLUMNS: Text columns forming the primary key
+        COLUMNS: SQL definitions of the value columns
+        EVICTION: EVICT_COUNT (cap the number of rows) or EVICT_SIZE (cap
+            the sum of the 'size' column, added to the table)
+        LIMIT_ENV, DEFAULT_LIMIT: Variable overriding the cap and its default
+            (rows, or MB with EVICT_SIZE); a cap of 0 disables the cache
+        NAME: Shown in warnings ("could not update <NAME>")
+
+    Args:
+        db_path: SQLite database file (created on first use)
+        limit: Cap in rows, or bytes with EVICT_SIZE (default: from LIMIT_ENV)
+    """
+
+    TABLE = ''
+    KEY_COLUMNS: Tuple[str, ...] = ('key',)
+    COLUMNS: Tuple[str, ...] = ()
+    EVICTION = EVICT_COUNT
+    LIMIT_ENV = ''
+    DEFAULT_LIMIT = 0
+    NAME = 'cache'
+
+    def __init__(self, db_path: str, limit: Optional[int] = None):
+        self.db_path = str(db_path)
+        self.limit = self.limit_from_env() if limit is None else limit
+        self._lock = threading.Lock()
+        self._ready = False
+
+    @classmethod
+    def limit_from_env(cls) -> int:
+        scale = 1024 * 1024 if cls.EVICTION == EVICT_SIZE else 1
+        try:
+            return int(float(os.environ.get(cls.LIMIT_ENV, cls.DEFAULT_LIMIT)) * scale)
+        except ValueError:
+            return int(cls.DEFAULT_LIMIT * scale)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        if not self._ready:
+            columns = [f"{name} TEXT NOT NULL" for name in self.KEY_COLUMNS]
+            if self.EVICTION == EVICT_SIZE:
+                columns.append("size INTEGER NOT NULL")
+            columns += list(self.COLUMNS) + ["last_used REAL NOT NULL",
+                                             f"PRIMARY KEY ({', '.join(self.KEY_COLUMNS)})"]
+            conn.execute(f"CREATE TABLE IF NOT EXISTS {self.TABLE} ({', '.join(columns)})")
+            conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{self.TABLE}_last_used ON {self.TABLE} (last_used)")
+            conn.commit()
+            self._ready = True
+        return conn
+
+    @contextlib.contextmanager
+    def _connection(self):
+        with self._lock:
+            conn = self._connect()
+            try:
+                yield conn
+            finally:
+                conn.close()
+
+    def _where_key(self) -> str:
+        return ' AND '.join(f"{name} = ?" for name in self.KEY_COLUMNS)
+
+    def _get(self, key: Sequence[str], columns: Sequence[str]) -> Optional[tuple]:
+        """The given columns of an entry, marking it used, or None on a miss"""
+        if self.limit <= 0:
+            return None
+        try:
+            with self._connection() as conn:
+                row = conn.execute(f"SELECT {', '.join(columns)} FROM {self.TABLE} WHERE {self._where_key()}",
+                                   tuple(key)).fetchone()
+                if row is None:
+                    return None
+                conn.execute(f"UPDATE {self.TABLE} SET last_used = ? WHERE {self._where_key()}",
+                             (time.time(), *key))
+                conn.commit()
+            return row
+        except sqlite3.Error:
+            return None
+
+    def _put(self, key: Sequence[str], values: Dict[str, Any], size: Optional[int] = None) -> None:
+        """Store an entry (size: its bytes, with EVICT_SIZE), then evict over the cap"""
+        if self.limit <= 0:
+            return
+        row = dict(zip(self.KEY_COLUMNS, key), **values, last_used=time.time())
+        if self.EVICTION == EVICT_SIZE:
+            if size > self.limit:
+                return
+            row['size'] = size
+            evict = (f"DELETE FROM {self.TABLE} WHERE rowid IN ("
+                     f"SELECT id FROM (SELECT rowid AS id, SUM(size) OVER (ORDER BY last_used DESC, rowid) AS used "
+                     f"FROM {self.TABLE}) WHERE used > ?)")
+        else:
+            evict = (f"DELETE FROM {self.TABLE} WHERE rowid IN ("
+                     f"SELECT rowid FROM {self.TABLE} ORDER BY last_used DESC LIMIT -1 OFFSET ?)")
+        try:
+            with self._connection() as conn:
+                conn.execute(f"INSERT OR REPLACE INTO {self.TABLE} ({', '.join(row)}) "
+                             f"VALUES ({', '.join('?' * len(row))})", tuple(row.values()))
+                conn.execute(evict, (self.limit,))
+                conn.commit()
+        except sqlite3.Error as e:
+            print(f"Warning: could not update {self.NAME}: {str(e)}")
+
+    def _update(self, key: Sequence[str], values: Dict[str, Any]) -> None:
+        """Change value columns of an entry, if present"""
+        try:
+            with self._connection() as conn:
+                conn.execute(f"UPDATE {self.TABLE} SET {', '.join(f'{name} = ?' for name in values)} "
+                             f"WHERE {self._where_key()}", (*values.values(), *key))
+                conn.commit()
+        except sqlite3.Error:
+            pass
+
+    def __len__(self) -> int:
+        try:
+            with self._connection() as conn:
+                return conn.execute(f"SELECT COUNT(*) FROM {self.TABLE}").fetchone()[0]
+        except sqlite3.Error:
+            return 0
+
+    def clear(self) -> None:
+        try:
+            with self._connection() as conn:
+                conn.execute(f"DELETE FROM {self.TABLE}")
+                conn.commit()
+        except sqlite3.Error:
+            pass
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Peak memory of RAG index builds versus corpus size.
+
+Builds a binary FastEmbed index from synthetic corpora of growing size, each
+build in a fresh process, and reports the peak RSS of that process. With the
+streaming build pipeline the peak should stay roughly flat as the corpus
+grows. Embeddings come from the offline bag-of-words FakeTextEmbedding, so
+the numbers measure the pipeline rather than an ONNX model.
+
+Usage:
+  poetry run python scripts/benchmark_index_memory.py                  # 200, 800, 3200 docs x 10 KB
+  poetry run python scripts/benchmark_index_memory.py 500 2000         # custom corpus sizes
+"""
+import contextlib
+import io
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+# Run from a checkout: make peac and tests importable
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+AVG_SIZE_KB = 10
+BATCH_SIZE = 256
+
+
+def build_index(corpus_dir: str, index_dir: str) -> None:
+    """Child process: build one index and print its peak RSS in MB"""
+    from peac.providers.rag.fastembed_provider import FastembedProvider
+    from tests.utils.fake_embedding import FakeTextEmbedding
+
+    provider = FastembedProvider()
+    model = FakeTextEmbedding(dim=384)
+    provider._initialize_model = lambda *args, **kwargs: model
+    # Build only: a search would page the memory-mapped matrix into RSS
+    error = provider._prepare_index(index_dir, {
+        'source_folder': corpus_dir,
+        'force_override': True,
+        'provider_config': {'batch_size': BATCH_SIZE, 'workers': 1},
+    })
+    if error:
+        raise SystemExit(error)
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(f"PEAK_RSS_MB {peak_kb / 1024:.1f}")
+
+
+def main(argv=None):
+    argv = argv or sys.argv[1:]
+    if argv and argv[0] == '--child':
+        build_index(argv[1], argv[2])
+        return 0
+
+    from tests.utils.generate_synthetic_corpus import generate_corpus
+
+    sizes = [int(arg) for arg in argv] or [200, 800, 3200]
+    print("\n" + "=" * 70)
+    print(f"Index build peak RSS (binary format, batch_size={BATCH_SIZE}, {AVG_SIZE_KB} KB docs)")
+    print("=" * 70)
+    for num_documents in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            corpus_dir = os.path.join(tmp, 'corpus')
+            with contextlib.redirect_stdout(io.StringIO()):
+                generate_corpus(corpus_dir, num_documents, AVG_SIZE_KB)
+            output = subprocess.run(
+                [sys.executable, __file__, '--child', corpus_dir, os.path.join(tmp, 'index')],
+                capture_output=True, text=True, check=True,
+            ).stdout
+        peak = next(line.split()[1] for line in output.splitlines() if line.startswith('PEAK_RSS_MB'))
+        corpus_mb = num_documents * AVG_SIZE_KB / 1024
+        print(f"  {num_documents:6d} documents (~{corpus_mb:6.1f} MB): peak RSS {float(peak):8.1f} MB")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark of RAG text normalization.
+
+Compares the former eight-regex _clean_text chain (applied twice: once after
+extraction, once again in _create_chunks) with the shared single-pass
+normalizer on the synthetic benchmark corpus, and checks that both produce
+the same text.
+
+Usage:
+  poetry run python scripts/benchmark_normalizer.py                # 100 docs x 10 KB
+  poetry run python scripts/benchmark_normalizer.py 300 50         # 300 docs x 50 KB
+"""
+import re
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Run from a checkout: make peac and tests importable
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from peac.providers.rag.text_normalizer import normalize_text
+from tests.utils.generate_synthetic_corpus import generate_corpus
+
+
+NUM_RUNS = 5
+
+
+def legacy_clean_text(text: str) -> str:
+    """The normalization chain used before text_normalizer"""
+    text = re.sub(r'\s+', ' ', text)
+    text = re.sub(r'\n\s*\n', '\n\n', text)
+    text = re.sub(r'([a-z])([A-Z])', r'\1 \2', text)
+    text = re.sub(r'([.!?])([A-Z])', r'\1 \2', text)
+    text = re.sub(r'(\w)-\n(\w)', r'\1\2', text)
+    text = re.sub(r'(\w)\n(\w)', r'\1 \2', text)
+    text = re.sub(r'([a-z])([A-Z][a-z])', r'\1 \2', text)
+    text = re.sub(r'(\w)([A-Z]+)(\w)', r'\1 \2 \3', text)
+    return ' '.join(text.split())
+
+
+def best_time(func, texts):
+    timings = []
+    for _ in range(NUM_RUNS):
+        start = time.perf_counter()
+        for text in texts:
+            func(text)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main(argv=None):
+    argv = argv or sys.argv[1:]
+    num_documents = int(argv[0]) if len(argv) > 0 else 100
+    avg_size_kb = int(argv[1]) if len(argv) > 1 else 10
+
+    with tempfile.TemporaryDirectory() as corpus_dir:
+        generate_corpus(corpus_dir, num_documents, avg_size_kb)
+        texts = [path.read_text(encoding='utf-8') for path in sorted(Path(corpus_dir).glob('*.md'))]
+
+    mismatches = sum(1 for text in texts if legacy_clean_text(text) != normalize_text(text))
+    total_mb = sum(len(text.encode('utf-8')) for text in texts) / (1024 * 1024)
+
+    legacy_once = best_time(legacy_clean_text, texts)
+    legacy_twice = best_time(lambda text: legacy_clean_text(legacy_clean_text(text)), texts)
+    single_pass = best_time(normalize_text, texts)
+
+    print("\n" + "=" * 70)
+    print(f"Text normalization: {len(texts)} documents, {total_mb:.2f} MB (best of {NUM_RUNS})")
+    print("=" * 70)
+    print(f"  legacy chain, once:           {legacy_once * 1000:9.1f} ms")
+    print(f"  legacy chain, twice (before): {legacy_twice * 1000:9.1f} ms")
+    print(f"  single pass (now):            {single_pass * 1000:9.1f} ms")
+    print(f"  speedup vs one legacy pass:   {legacy_once / single_pass:9.1f}x")
+    print(f"  speedup vs old pipeline:      {legacy_twice / single_pass:9.1f}x")
+    print(f"  output mismatches:            {mismatches:9d}")
+    return 0 if mismatches == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
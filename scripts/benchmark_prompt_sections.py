@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark of PromptSections merging.
+
+Merges thousands of sections spread over a few hundred preambles (as a large
+extends hierarchy with many local rules produces) with the former
+PromptSections, which scanned all sections twice per add and rebuilt the
+de-duplicated lines of a section on every merge, and with the indexed one,
+and checks that both produce the same lines.
+
+Usage:
+  poetry run python scripts/benchmark_prompt_sections.py              # 5000 sections, 250 preambles
+  poetry run python scripts/benchmark_prompt_sections.py 20000 1000   # 20000 sections, 1000 preambles
+"""
+import copy
+import random
+import re
+import sys
+import time
+from pathlib import Path
+
+# Run from a checkout: make peac importable
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from peac.core.peac import PromptSections
+
+
+NUM_RUNS = 3
+LINES_PER_SECTION = 20
+
+
+class LegacyPromptSections:
+    """PromptSections before the preamble index"""
+
+    def __init__(self):
+        self.prompt_sections = []
+
+    def already_present(self, preamble):
+        return self.get_by_preamble(preamble) != None
+
+    def get_by_preamble(self, preamble):
+        for p in self.prompt_sections:
+            if preamble is None:
+                if 'preamble' not in p:
+                    return p
+                elif p['preamble'] == None:
+                    return p
+            else:
+                if 'preamble' in p and p['preamble'] == preamble:
+                    return p
+        return None
+
+    def add_section(self, ps):
+        if self.already_present(ps['preamble'] if 'preamble' in ps else None):
+            preamble = self.get_by_preamble(ps['preamble'] if 'preamble' in ps else None)
+            preamble['lines'].extend(ps['lines'])
+            seen = set()
+            preamble['lines'] = [line for line in preamble['lines'] if not (line in seen or seen.add(line))]
+        else:
+            self.prompt_sections.append(ps)
+
+    def add_sections(self, pss):
+        for ps in pss:
+            self.add_section(ps)
+
+    def get_lines(self):
+        lines = []
+        for p in self.prompt_sections:
+            if 'preamble' in p and p['preamble'] != None and p['preamble'].strip() != '':
+                if p['lines'] and p['lines'][0] is not None:
+                    p['lines'][0] = f"{p['preamble']} - {p['lines'][0]}"
+            lines.extend(p['lines'])
+        lines = [re.sub(r'\n+', '\n', l) for l in lines if l is not None]
+        return lines
+
+
+def make_sections(num_sections, num_preambles, seed=42):
+    """Sections with overlapping lines; some without preamble"""
+    rng = random.Random(seed)
+    sections = []
+    for _ in range(num_sections):
+        group = rng.randrange(num_preambles)
+        lines = [f"line {group}-{rng.randrange(LINES_PER_SECTION * 20)}\n\ntext" for _ in range(LINES_PER_SECTION)]
+        section = {'lines': lines}
+        if group:
+            section['preamble'] = f"Preamble {group}"
+        sections.append(section)
+    return sections
+
+
+def best_time(container_class, sections):
+    timings = []
+    result = None
+    for _ in range(NUM_RUNS):
+        # The legacy class modifies the sections it is given
+        batch = copy.deepcopy(sections)
+        start = time.perf_counter()
+        container = container_class()
+        container.add_sections(batch)
+        result = container.get_lines()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main(argv=None):
+    argv = argv or sys.argv[1:]
+    num_sections = int(argv[0]) if len(argv) > 0 else 5000
+    num_preambles = int(argv[1]) if len(argv) > 1 else 250
+
+    sections = make_sections(num_sections, num_preambles)
+    legacy_time, legacy_lines = best_time(LegacyPromptSections, sections)
+    indexed_time, indexed_lines = best_time(PromptSections, sections)
+    mismatch = legacy_lines != indexed_lines
+
+    print("\n" + "=" * 70)
+    print(f"PromptSections: {num_sections} sections x {LINES_PER_SECTION} lines, "
+          f"{num_preambles} preambles (best of {NUM_RUNS})")
+    print("=" * 70)
+    print(f"  legacy (linear scans, full re-dedup): {legacy_time * 1000:9.1f} ms")
+    print(f"  indexed (now):                        {indexed_time * 1000:9.1f} ms")
+    print(f"  speedup:                              {legacy_time / indexed_time:9.1f}x")
+    print(f"  merged lines:                         {len(indexed_lines):9d}")
+    print(f"  output mismatch:                      {'yes' if mismatch else 'no':>9}")
+    return 1 if mismatch else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -92,3 +92,103 @@ class TestHierarchicalExtends:
         count2 = output_section.count(unique_instruction2)
         assert count2 == 1, \
             f"Duplicate instruction found! '{unique_instruction2}' appears {count2} times instead of 1"
+
+
+def write_yaml(folder, name, extends=(), instruction=None):
+    lines = ["prompt:"]
+    if extends:
+        lines.append("  extends:")
+        lines.extend(f"    - {other}" for other in extends)
+    lines += ["  instruction:", "    base:", f"      - {instruction or 'From ' + name}"]
+    path = folder / name
+    path.write_text("\n".join(lines) + "\n", encoding='utf-8')
+    return path
+
+
+class TestExtendsGraph:
+    """Each prompt file of the extends graph is loaded once; cycles are reported"""
+
+    def test_diamond_loads_shared_file_once(self, tmp_path, monkeypatch):
+        import yaml
+        from peac.core import peac as peac_core
+
+        write_yaml(tmp_path, 'base.yaml')
+        (tmp_path / 'layers').mkdir()
+        write_yaml(tmp_path, 'layers/a.yaml', ['../base.yaml'])
+        write_yaml(tmp_path, 'layers/b.yaml', ['../base.yaml'])
+        write_yaml(tmp_path, 'mid.yaml', ['layers/a.yaml', 'layers/b.yaml'])
+        top = write_yaml(tmp_path, 'top.yaml', ['mid.yaml', 'base.yaml'])
+
+        loads = []
+        safe_load = yaml.safe_load
+        monkeypatch.setattr(peac_core.yaml, 'safe_load', lambda data: loads.append(data) or safe_load(data))
+        py = PromptYaml(str(top))
+
+        assert len(loads) == 5
+        assert len(py.registry.prompts) == 5
+        mid, base = py.parents
+        a, b = mid.parents
+        assert a.parents[0] is b.parents[0] is base
+        prompt_sentence = py.get_prompt_sentence()
+        assert prompt_sentence.count('From base.yaml') == 1
+        assert 'From layers/a.yaml' in prompt_sentence and 'From layers/b.yaml' in prompt_sentence
+
+    def test_separate_renders_use_separate_registries(self, tmp_path):
+        write_yaml(tmp_path, 'base.yaml')
+        top = write_yaml(tmp_path, 'top.yaml', ['base.yaml'])
+
+        first, second = PromptYaml(str(top)), PromptYaml(str(top))
+        assert first.parents[0] is not second.parents[0]
+        write_yaml(tmp_path, 'base.yaml', instruction='Edited base')
+        assert 'Edited base' in PromptYaml(str(top)).get_prompt_sentence()
+
+    def test_cycle_is_reported(self, tmp_path):
+        from peac.core.peac import ExtendsCycleError
+
+        write_yaml(tmp_path, 'a.yaml', ['b.yaml'])
+        write_yaml(tmp_path, 'b.yaml', ['c.yaml'])
+        write_yaml(tmp_path, 'c.yaml', ['a.yaml'])
+        top = write_yaml(tmp_path, 'top.yaml', ['a.yaml'])
+
+        with pytest.raises(ExtendsCycleError) as error:
+            PromptYaml(str(top))
+        assert [os.path.basename(path) for path in error.value.chain] == ['a.yaml', 'b.yaml', 'c.yaml', 'a.yaml']
+        assert str(error.value).startswith("Circular extends: ")
+
+    def test_self_extension_is_reported(self, tmp_path):
+        from typer.testing import CliRunner
+        from peac.main import app
+
+        top = write_yaml(tmp_path, 'self.yaml', ['./self.yaml'])
+
+        result = CliRunner().invoke(app, ['prompt', str(top)])
+        assert result.exit_code == 1
+        assert "Circular extends:" in result.output
+
+    def test_shared_ancestor_evaluated_once(self, tmp_path, monkeypatch):
+        from peac.core import peac as peac_core
+
+        (tmp_path / 'notes.txt').write_text('shared note\n', encoding='utf-8')
+        (tmp_path / 'base.yaml').write_text(
+            "prompt:\n"
+            "  context:\n"
+            "    local:\n"
+            "      notes:\n"
+            "        preamble: Notes\n"
+            "        source: notes.txt\n",
+            encoding='utf-8',
+        )
+        write_yaml(tmp_path, 'a.yaml', ['base.yaml'])
+        write_yaml(tmp_path, 'b.yaml', ['base.yaml'])
+        top = write_yaml(tmp_path, 'top.yaml', ['a.yaml', 'b.yaml'])
+
+        calls = []
+        parse = peac_core.local_parser.parse
+        monkeypatch.setattr(peac_core.local_parser, 'parse', lambda *args: calls.append(args[0]) or parse(*args))
+        py = PromptYaml(str(top))
+
+        assert [os.path.basename(p.yaml_path) for p in py._get_all_ancestors()] == ['a.yaml', 'base.yaml', 'b.yaml']
+        prompt_sentence = py.get_prompt_sentence()
+        assert len(calls) == 1
+        assert prompt_sentence.count('shared note') == 1
+        assert prompt_sentence.index('From a.yaml') < prompt_sentence.index('From b.yaml')
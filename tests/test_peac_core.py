@@ -60,6 +60,50 @@ YAML_EXAMPLES = [
 ]
 
 
+def write_rule_prompts(folder):
+    """Prompt files with local and web rules in a diamond extends graph; returns top.yaml"""
+    for i in range(6):
+        (folder / f"notes{i}.txt").write_text(f"note {i}\n", encoding='utf-8')
+
+    def local_rules(indices):
+        return "".join(f"      n{i}:\n        preamble: Notes {i % 2}\n        source: notes{i}.txt\n" for i in indices)
+
+    def web_rules(names):
+        return "".join(f"      {name}:\n        preamble: Page\n        source: https://example.com/{name}\n" for name in names)
+
+    (folder / 'base.yaml').write_text(
+        "prompt:\n"
+        "  context:\n"
+        "    base:\n"
+        "      - zeta\n"
+        "      - alpha\n"
+        "    local:\n" + local_rules([0, 1, 2]) +
+        "    web:\n" + web_rules(['b1', 'b2', 'b3']),
+        encoding='utf-8',
+    )
+    for name, indices in (('left', [3, 4]), ('right', [5, 0])):
+        (folder / f"{name}.yaml").write_text(
+            "prompt:\n"
+            "  extends:\n"
+            "    - base.yaml\n"
+            "  output:\n"
+            "    local:\n" + local_rules(indices) +
+            "    web:\n" + web_rules([f"{name}1", f"{name}2"]),
+            encoding='utf-8',
+        )
+    top = folder / 'top.yaml'
+    top.write_text(
+        "prompt:\n"
+        "  extends:\n"
+        "    - left.yaml\n"
+        "    - right.yaml\n"
+        "  instruction:\n"
+        "    web:\n" + web_rules(['t1', 't2']),
+        encoding='utf-8',
+    )
+    return top
+
+
 class TestYAMLParsing:
     """Test YAML file parsing and basic structure"""
 
@@ -401,6 +445,47 @@ class TestPromptSections:
         assert len(all_lines) == 3  # Three lines total from two sections
 
 
+    def test_prompt_sections_get_lines_is_repeatable(self):
+        """get_lines does not modify the stored sections"""
+        pss = PromptSections()
+        pss.add_section({'preamble': 'Notes', 'lines': ['a\n\n\nb', 'c']})
+
+        assert pss.get_lines() == ['Notes - a\nb', 'c']
+        assert pss.get_lines() == ['Notes - a\nb', 'c']
+        assert pss.get_by_preamble('Notes')['lines'] == ['a\n\n\nb', 'c']
+
+    def test_prompt_sections_do_not_modify_added_sections(self):
+        pss = PromptSections()
+        first = {'preamble': 'same', 'lines': ['line1']}
+        pss.add_sections([first, {'preamble': 'same', 'lines': ['line2']}])
+
+        assert first['lines'] == ['line1']
+        assert pss.get_by_preamble('same')['lines'] == ['line1', 'line2']
+
+    def test_prompt_sections_merge_keeps_first_occurrences(self):
+        """Same result as de-duplicating all merged lines in order"""
+        import random
+
+        rng = random.Random(7)
+        sections = []
+        for _ in range(300):
+            preamble = rng.choice([None, '', 'a', 'b', 'c'])
+            section = {'lines': [f"l{rng.randrange(30)}" for _ in range(rng.randrange(5))]}
+            if preamble is not None or rng.random() < 0.5:
+                section['preamble'] = preamble
+            sections.append(section)
+        pss = PromptSections()
+        pss.add_sections(sections)
+
+        expected = {}
+        for section in sections:
+            expected.setdefault(section.get('preamble'), []).append(section['lines'])
+        for preamble, groups in expected.items():
+            lines = groups[0] if len(groups) == 1 else list(dict.fromkeys(line for group in groups for line in group))
+            assert pss.get_by_preamble(preamble)['lines'] == lines
+        assert [section.get('preamble') for section in pss.prompt_sections] == list(expected)
+
+
 class TestEBNFCompliance:
     """Test YAML files comply with EBNF grammar specification"""
 
@@ -548,5 +633,183 @@ class TestBackwardCompatibility:
         assert len(rag_rules) >= 0  # May be 0 if using new field names
 
 
+class TestConcurrentRules:
+    """Rules evaluated on a pool give exactly the sequential output"""
+
+    @pytest.fixture
+    def slow_web(self, monkeypatch):
+        import random
+        import time
+        from peac.core import peac as peac_core
+
+        def fetch(url):
+            # Finish in a different order than submitted
+            time.sleep(random.uniform(0.02, 0.1))
+            return f"<p>page {url.rsplit('/', 1)[-1]}</p>"
+
+        monkeypatch.setattr(peac_core, 'get_text_from_url', fetch)
+
+    @pytest.mark.parametrize("pool", ['thread', 'process'])
+    def test_output_matches_sequential(self, tmp_path, slow_web, pool):
+        top = write_rule_prompts(tmp_path)
+
+        sequential = PromptYaml(str(top), rule_workers=1).get_prompt_sentence()
+        concurrent = PromptYaml(str(top), rule_workers=8, rule_pool=pool).get_prompt_sentence()
+        assert concurrent == sequential
+        assert sequential.index('page left1') < sequential.index('page right1')
+        # base.yaml (context) and right.yaml (output); the shared base is merged once
+        assert sequential.count('note 0') == 2
+        assert sequential.count('note 1') == 1
+
+    def test_rules_overlap(self, tmp_path, monkeypatch):
+        import time
+        from peac.core import peac as peac_core
+
+        monkeypatch.setattr(peac_core, 'get_text_from_url', lambda url: time.sleep(0.2) or url)
+        top = write_rule_prompts(tmp_path)
+
+        start = time.perf_counter()
+        PromptYaml(str(top), rule_workers=8).get_prompt_sentence()
+        # 9 web rules of 0.2 s each: 1.8 s in sequence
+        assert time.perf_counter() - start < 1.2
+
+    def test_base_lines_keep_their_order(self, tmp_path, slow_web):
+        top = write_rule_prompts(tmp_path)
+
+        prompt = PromptYaml(str(top)).get_prompt_sentence()
+        assert prompt.index('zeta') < prompt.index('alpha')
+
+    def test_rule_pool_settings(self, monkeypatch):
+        from peac.core.peac import resolve_rule_pool
+
+        monkeypatch.delenv('PEAC_RULE_WORKERS', raising=False)
+        monkeypatch.delenv('PEAC_RULE_POOL', raising=False)
+        assert resolve_rule_pool() == (1, 'thread')
+        assert resolve_rule_pool(1, 'thread') == (1, 'thread')
+        assert resolve_rule_pool(0, 'PROCESS') == (1, 'process')
+        monkeypatch.setenv('PEAC_RULE_WORKERS', '3')
+        monkeypatch.setenv('PEAC_RULE_POOL', 'process')
+        assert resolve_rule_pool() == (3, 'process')
+        with pytest.raises(ValueError):
+            resolve_rule_pool(4, 'fiber')
+
+
+class TestPromptCache:
+    """peac prompt --cache returns the last output until one of its inputs changes"""
+
+    @pytest.fixture
+    def pages(self, tmp_path, monkeypatch):
+        from peac.core import peac as peac_core
+
+        monkeypatch.setenv('PEAC_CACHE_DIR', str(tmp_path / 'peac-cache'))
+        pages = {'fetches': 0}
+
+        def fetch(url):
+            pages['fetches'] += 1
+            return f"<p>{pages.get(url, 'page')} {url.rsplit('/', 1)[-1]}</p>"
+
+        monkeypatch.setattr(peac_core, 'get_text_from_url', fetch)
+        return pages
+
+    @staticmethod
+    def render(top, section_headers=True):
+        from peac.prompt_cache import render_cached
+
+        return render_cached(PromptYaml(str(top), add_section_headers=section_headers))
+
+    def test_unchanged_rebuild_is_a_hit(self, tmp_path, pages, monkeypatch):
+        from peac.core import peac as peac_core
+
+        top = write_rule_prompts(tmp_path)
+        output, hit = self.render(top)
+        assert not hit
+        assert output == PromptYaml(str(top)).get_prompt_sentence()
+
+        monkeypatch.setattr(peac_core, 'evaluate_local_rule', None)
+        monkeypatch.setenv('PEAC_PROMPT_CACHE_WEB_TTL', '3600')
+        fetches = pages['fetches']
+        assert self.render(top) == (output, True)
+        assert pages['fetches'] == fetches
+
+    def test_changed_inputs_invalidate(self, tmp_path, pages):
+        top = write_rule_prompts(tmp_path)
+        self.render(top)
+
+        (tmp_path / 'notes4.txt').write_text("edited note 4\n", encoding='utf-8')
+        output, hit = self.render(top)
+        assert not hit and 'edited note 4' in output
+        assert self.render(top)[1]
+
+        base = tmp_path / 'base.yaml'
+        base.write_text(base.read_text(encoding='utf-8').replace('zeta', 'omega'), encoding='utf-8')
+        output, hit = self.render(top)
+        assert not hit and 'omega' in output
+
+        output, hit = self.render(top, section_headers=False)
+        assert not hit and output != self.render(top)[0]
+
+    def test_web_responses_are_revalidated(self, tmp_path, pages, monkeypatch):
+        top = write_rule_prompts(tmp_path)
+        self.render(top)
+        assert self.render(top)[1]
+
+        pages['https://example.com/t1'] = 'new page'
+        monkeypatch.setenv('PEAC_PROMPT_CACHE_WEB_TTL', '3600')
+        assert self.render(top)[1]
+        monkeypatch.setenv('PEAC_PROMPT_CACHE_WEB_TTL', '0')
+        output, hit = self.render(top)
+        assert not hit and 'new page t1' in output
+
+    def test_explicit_cache(self, tmp_path, pages):
+        from peac.prompt_cache import PromptCache, get_prompt_cache, render_cached
+
+        top = write_rule_prompts(tmp_path)
+        cache = PromptCache(str(tmp_path / 'prompts.sqlite3'))
+        render_cached(PromptYaml(str(top)), cache=cache)
+        assert len(cache) == 1
+        assert len(get_prompt_cache()) == 0
+
+    def test_hit_after_index_build_prints_only_the_prompt(self, tmp_path, pages, monkeypatch):
+        import json
+        from typer.testing import CliRunner
+        from peac.main import app
+        from peac.providers.rag import model_registry
+        from tests.utils.fake_embedding import FakeTextEmbedding
+
+        model_registry.clear_models()
+        monkeypatch.setattr(model_registry, '_create_model',
+                            lambda model_name, options: FakeTextEmbedding(model_name))
+        (tmp_path / 'docs').mkdir()
+        (tmp_path / 'docs' / 'fuel.md').write_text("Rockets burn liquid fuel. " * 20, encoding='utf-8')
+        top = tmp_path / 'rag.yaml'
+        top.write_text(json.dumps({'prompt': {'context': {'rag': {'fuel': {
+            'index_path': 'fuel_index', 'source_folder': 'docs', 'query': 'fuel', 'top_k': 1}}}}}),
+            encoding='utf-8')
+
+        runner = CliRunner()
+        try:
+            built = runner.invoke(app, ['prompt', str(top), '--cache'])
+            cached = runner.invoke(app, ['prompt', str(top), '--cache'])
+        finally:
+            model_registry.clear_models()
+        assert built.exit_code == 0 and cached.exit_code == 0
+        assert 'Creating' in built.output
+        assert 'Creating' not in cached.output
+        assert 'Rockets burn liquid fuel' in cached.output
+        assert built.output.endswith(cached.output)
+
+    def test_cli_cache_flag(self, tmp_path, pages):
+        from typer.testing import CliRunner
+        from peac.main import app
+
+        top = write_rule_prompts(tmp_path)
+        runner = CliRunner()
+        plain = runner.invoke(app, ['prompt', str(top)])
+        for _ in range(2):
+            cached = runner.invoke(app, ['prompt', str(top), '--cache'])
+            assert cached.exit_code == 0
+            assert cached.output == plain.output
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
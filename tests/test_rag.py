@@ -9,12 +9,52 @@ import os
 import pytest
 import json
 import tempfile
+import numpy as np
+import shutil
+import threading
+import time
+import zlib
 from pathlib import Path
 from typing import Optional
 
 from peac.providers.rag.factory import RAGProviderFactory, get_rag_provider
 from peac.providers.rag.fastembed_provider import FastembedProvider
+from peac.providers.rag import vector_store
+from peac.providers.rag.faiss_provider import FaissProvider
+from peac.providers.rag.manifest import IndexManifest, manifest_path_for, row_ranges
+from peac.providers.rag.pipeline import ChunkPipeline, PreviousRows
+from peac.providers.rag.vector_store import DuplicateMap
+from peac.providers.rag.dedup import ChunkDeduplicator
+from peac.providers.rag import lexical
+from peac.providers.rag import sharding
+from peac.providers.rag import maintenance
+from peac.providers.rag.index_cache import IndexCache, get_index_cache
+from peac.providers.rag import model_registry
+from peac.providers.rag import extraction
+from peac.providers.rag.text_normalizer import normalize_text, NORMALIZER_VERSION
+from peac.providers.rag.query_cache import QueryEmbeddingCache, get_query_cache
 from peac.core.peac import PromptYaml
+from peac import local_parser
+from peac import extraction_cache
+from peac.extraction_cache import ExtractionCache
+from tests.utils.fake_embedding import FakeTextEmbedding
+
+
+def _flaky_reader(file_path):
+    """Module-level (picklable) reader that fails or kills its worker on request"""
+    name = os.path.basename(file_path)
+    if name.startswith("raise"):
+        raise RuntimeError("broken document")
+    if name.startswith("crash"):
+        os._exit(1)
+    with open(file_path, encoding="utf-8") as f:
+        return f.read()
+
+
+@pytest.fixture(autouse=True)
+def isolated_cache_dir(tmp_path, monkeypatch):
+    """Keep on-disk caches (e.g. query embeddings) out of the user's ~/.peac"""
+    monkeypatch.setenv("PEAC_CACHE_DIR", str(tmp_path / "peac-cache"))
 
 
 class TestRAGProviderFactory:
@@ -198,6 +238,1503 @@ class TestFastembed:
         assert len(small_chunks["chunks"]) > len(large_chunks["chunks"])
 
 
+class TestBinaryIndexFormat:
+    """Test the memory-mapped binary index format and JSON conversion"""
+
+    @pytest.fixture
+    def sample_docs_folder(self):
+        """Return path to sample-docs folder"""
+        return os.path.join("examples", "sample-docs")
+
+    @pytest.fixture
+    def offline_provider(self, monkeypatch):
+        """FastEmbed provider wired to a deterministic offline embedding model"""
+        provider = FastembedProvider()
+        model = FakeTextEmbedding()
+        monkeypatch.setattr(provider, "_initialize_model", lambda *args, **kwargs: model)
+        return provider
+
+    def test_binary_index_creation(self, offline_provider, sample_docs_folder, tmp_path):
+        """Test that a directory index path produces the binary layout"""
+        index_path = str(tmp_path / "docs_index")
+        result = offline_provider.parse(
+            index_path=index_path,
+            options={'source_folder': sample_docs_folder, 'query': 'database design', 'top_k': 3}
+        )
+
+        assert vector_store.is_binary_index(index_path)
+        for name in (vector_store.EMBEDDINGS_FILE, vector_store.CHUNKS_FILE, vector_store.OFFSETS_FILE):
+            assert (tmp_path / "docs_index" / name).exists()
+
+        index = vector_store.load_index(index_path)
+        assert index.format == vector_store.FORMAT_BINARY
+        assert index.embeddings.shape == (len(index.chunks), 64)
+        assert index.chunks[0]['chunk_id'] == 0
+        assert result.count("Rank ") == 3
+
+    def test_index_format_option_overrides_suffix(self, offline_provider, sample_docs_folder, tmp_path):
+        """Test that provider_config.index_format forces the binary format"""
+        index_path = str(tmp_path / "forced.json")
+        offline_provider.parse(
+            index_path=index_path,
+            options={
+                'source_folder': sample_docs_folder,
+                'query': 'api',
+                'provider_config': {'index_format': 'binary'}
+            }
+        )
+        assert os.path.isdir(index_path)
+        assert vector_store.is_binary_index(index_path)
+
+    def test_convert_json_index(self, offline_provider, sample_docs_folder, tmp_path):
+        """Test that a converted JSON index returns the same search results"""
+        json_path = str(tmp_path / "legacy.json")
+        options = {'source_folder': sample_docs_folder, 'query': 'python best practices', 'top_k': 4}
+        json_result = offline_provider.parse(index_path=json_path, options=options)
+
+        binary_path = vector_store.convert_json_index(json_path)
+        assert binary_path == str(tmp_path / "legacy")
+
+        legacy = vector_store.load_index(json_path)
+        converted = vector_store.load_index(binary_path)
+        assert list(converted.chunks) == legacy.chunks
+        assert converted.normalized
+        assert np.allclose(converted.embeddings, vector_store.normalize_rows(legacy.embeddings))
+
+        binary_result = offline_provider.parse(
+            index_path=binary_path,
+            options={'query': 'python best practices', 'top_k': 4}
+        )
+        assert binary_result == json_result
+
+    def test_chunk_store_random_access(self, tmp_path):
+        """Test that chunk records can be read by id without loading the rest"""
+        chunks = [{'source': f'doc{i}.md', 'chunk_id': i, 'text': f'chunk {i} \u00e8'} for i in range(10)]
+        vector_store.write_binary_index(str(tmp_path / "idx"), 'fake', chunks, [[float(i), 1.0] for i in range(10)])
+
+        index = vector_store.load_index(str(tmp_path / "idx"))
+        assert index.chunks.get_many([7, 2]) == [chunks[7], chunks[2]]
+        assert index.embeddings[3].tolist() == [3.0, 1.0]
+        with pytest.raises(IndexError):
+            index.chunks[10]
+
+    def test_legacy_json_example_loads(self):
+        """Test that committed legacy JSON indexes still load"""
+        index_path = os.path.join("examples", "indexes", "fastembed_docs.json")
+        if not os.path.exists(index_path):
+            pytest.skip(f"Example index not found at {index_path}")
+
+        index = vector_store.load_index(index_path)
+        assert len(index) > 0
+        assert index.embeddings.shape[0] == len(index.chunks)
+
+
+class TestReducedPrecision:
+    """Test float16 / int8 vector storage of binary indexes and exact re-ranking"""
+
+    QUERIES = ["database schema", "api design", "system architecture", "python code style"]
+
+    @staticmethod
+    def build(index_path, monkeypatch, **config):
+        provider = FastembedProvider()
+        model = RecordingEmbedding()
+        monkeypatch.setattr(provider, "_initialize_model", lambda *args, **kwargs: model)
+        options = {'source_folder': os.path.join("examples", "sample-docs"), 'force_override': True,
+                   'chunk_size': 200, 'overlap': 20,
+                   'provider_config': dict(config, query_cache=False)}
+        assert provider._prepare_index(str(index_path), options) is None
+        return provider, model
+
+    def search(self, provider, index_path, top_k=5):
+        return provider._search_index_batch(str(index_path), self.QUERIES, [top_k] * len(self.QUERIES),
+                                            FastembedProvider.DEFAULT_MODEL)
+
+    @pytest.mark.parametrize("dtype,itemsize", [("float16", 2), ("int8", 1)])
+    def test_writer_round_trip(self, dtype, itemsize, tmp_path):
+        """Test stored file sizes and that dequantized rows stay close to the originals"""
+        rng = np.random.default_rng(3)
+        matrix = vector_store.normalize_rows(rng.normal(size=(500, 32)))
+        chunks = [{'source': 'a', 'chunk_id': i, 'text': str(i)} for i in range(500)]
+        writer = vector_store.VectorStoreWriter(str(tmp_path / "idx"), "m", dtype=dtype)
+        for start in range(0, 500, 128):
+            writer.add(matrix[start:start + 128], chunks[start:start + 128])
+        writer.close()
+
+        index = vector_store.load_index(str(tmp_path / "idx"))
+        assert index.dtype == dtype and index.exact is None
+        assert os.path.getsize(tmp_path / "idx" / vector_store.embeddings_file(dtype)) == 500 * 32 * itemsize
+        assert not (tmp_path / "idx" / vector_store.EMBEDDINGS_FILE).exists()
+        assert (index.scales is not None) == (dtype == "int8")
+        np.testing.assert_allclose(index.vectors(range(500)), matrix, atol=0.01 if dtype == "int8" else 1e-3)
+
+    @pytest.mark.parametrize("dtype", ["float16", "int8"])
+    def test_quantized_search_close_to_float32(self, dtype, tmp_path, monkeypatch):
+        """Test that scoring the stored matrix directly keeps the float32 ranking"""
+        full, _ = self.build(tmp_path / "full", monkeypatch)
+        reduced, _ = self.build(tmp_path / "reduced", monkeypatch, dtype=dtype)
+
+        for expected, results in zip(self.search(full, tmp_path / "full"),
+                                     self.search(reduced, tmp_path / "reduced")):
+            assert results[0]['chunk_id'] == expected[0]['chunk_id']
+            assert results[0]['source'] == expected[0]['source']
+            assert abs(results[0]['score'] - expected[0]['score']) < 0.02
+
+    def test_rerank_restores_exact_scores(self, tmp_path, monkeypatch):
+        """Test that re-ranking enough candidates gives the float32 results and scores"""
+        full, _ = self.build(tmp_path / "full", monkeypatch)
+        reranked, _ = self.build(tmp_path / "reranked", monkeypatch, dtype="int8", rerank=1000)
+        index = vector_store.load_index(str(tmp_path / "reranked"))
+        assert index.exact is not None and index.header['exact'] is True
+
+        for expected, results in zip(self.search(full, tmp_path / "full"),
+                                     self.search(reranked, tmp_path / "reranked")):
+            assert [(r['source'], r['chunk_id']) for r in results] == \
+                [(r['source'], r['chunk_id']) for r in expected]
+            assert np.allclose([r['score'] for r in results], [r['score'] for r in expected], atol=1e-5)
+
+    def test_dtype_change_on_rebuild(self, tmp_path, monkeypatch):
+        """Test that lowering precision reuses stored vectors and raising it re-embeds"""
+        index_path = tmp_path / "idx"
+        _, model = self.build(index_path, monkeypatch)
+        rows = len(vector_store.load_index(str(index_path)))
+        assert model.embedded_texts == rows
+
+        _, model = self.build(index_path, monkeypatch, dtype="int8")
+        assert model.embedded_texts == 0
+        assert vector_store.load_index(str(index_path)).dtype == "int8"
+
+        _, model = self.build(index_path, monkeypatch, dtype="int8")
+        assert model.embedded_texts == 0
+
+        _, model = self.build(index_path, monkeypatch, dtype="float16")
+        assert model.embedded_texts == rows
+        assert vector_store.load_index(str(index_path)).dtype == "float16"
+
+    def test_verify_and_stats(self, tmp_path, monkeypatch):
+        """Test that stats report the dtype and verify checks the scales"""
+        index_path = tmp_path / "idx"
+        self.build(index_path, monkeypatch, dtype="int8", rerank=20)
+        assert maintenance.verify_index(str(index_path)).ok
+        stats = maintenance.index_stats(str(index_path))
+        assert (stats['dtype'], stats['exact']) == ("int8", True)
+        assert "Vectors:      int8 (float32 copy for re-ranking)" in maintenance.format_stats(stats)
+
+        np.zeros(3, dtype="<f4").tofile(index_path / vector_store.SCALES_FILE)
+        assert not maintenance.verify_index(str(index_path)).ok
+
+    def test_json_index_stays_float32(self, tmp_path, monkeypatch, capsys):
+        """Test that the JSON format ignores dtype with a warning"""
+        self.build(tmp_path / "idx.json", monkeypatch, dtype="int8")
+        assert "needs the binary index format" in capsys.readouterr().out
+        assert vector_store.load_index(str(tmp_path / "idx.json")).dtype == "float32"
+        with pytest.raises(ValueError):
+            vector_store.resolve_vector_dtype("int4")
+
+
+class TestVectorizedSearch:
+    """Test the NumPy top-k search path against the reference per-row cosine"""
+
+    @staticmethod
+    def reference_top_k(embeddings, query, top_k):
+        scored = [
+            (FastembedProvider._cosine_similarity(query, row), idx)
+            for idx, row in enumerate(embeddings.tolist())
+        ]
+        scored.sort(key=lambda x: x[0], reverse=True)
+        return scored[:top_k]
+
+    @pytest.mark.parametrize("top_k", [0, 1, 5, 50, 500])
+    def test_matches_reference_cosine(self, top_k):
+        """Test that scores and order match the per-row implementation"""
+        rng = np.random.default_rng(42)
+        embeddings = rng.normal(size=(200, 32)).astype(np.float32)
+        query = rng.normal(size=32).astype(np.float32)
+
+        expected = self.reference_top_k(embeddings, query.tolist(), top_k)
+        raw = FastembedProvider._top_k_cosine(embeddings, query, top_k)
+        normalized = FastembedProvider._top_k_cosine(
+            vector_store.normalize_rows(embeddings), query, top_k, normalized=True
+        )
+
+        for result in (raw, normalized):
+            assert [idx for _, idx in result] == [idx for _, idx in expected]
+            assert np.allclose([s for s, _ in result], [s for s, _ in expected], atol=1e-5)
+
+    def test_zero_rows_and_ties(self):
+        """Test zero vectors score 0 and ties keep row order"""
+        embeddings = np.array([[0.0, 0.0], [1.0, 0.0], [2.0, 0.0], [0.0, 1.0]], dtype=np.float32)
+        result = FastembedProvider._top_k_cosine(embeddings, [1.0, 0.0], 3)
+        assert [idx for _, idx in result] == [1, 2, 0]
+        assert result[2][0] == 0.0
+
+    def test_new_indexes_are_normalized(self, monkeypatch, tmp_path):
+        """Test that freshly built indexes store unit-norm rows"""
+        provider = FastembedProvider()
+        monkeypatch.setattr(provider, "_initialize_model", lambda *args, **kwargs: FakeTextEmbedding())
+        for name in ("idx.json", "idx"):
+            index_path = str(tmp_path / name)
+            provider.parse(index_path, {'source_folder': os.path.join("examples", "sample-docs"), 'query': 'api'})
+            index = vector_store.load_index(index_path)
+            assert index.normalized
+            assert np.allclose(np.linalg.norm(index.embeddings, axis=1), 1.0, atol=1e-5)
+
+
+class TestIncrementalIndexing:
+    """Test manifest-driven incremental rebuilds for both providers"""
+
+    @pytest.fixture
+    def source_folder(self, tmp_path):
+        """Writable copy of the sample-docs folder"""
+        folder = tmp_path / "docs"
+        shutil.copytree(os.path.join("examples", "sample-docs"), folder)
+        return folder
+
+    @staticmethod
+    def offline(provider, monkeypatch):
+        model = FakeTextEmbedding()
+        monkeypatch.setattr(provider, "_initialize_model", lambda *args, **kwargs: model)
+        return model
+
+    @staticmethod
+    def load_rows(provider_name, index_path):
+        if provider_name == "faiss":
+            import faiss
+            index = faiss.read_index(os.path.join(index_path, "index.faiss"))
+            chunks = list(FaissProvider._read_metadata(index_path)["chunks"])
+            return chunks, index.reconstruct_n(0, index.ntotal)
+        index = vector_store.load_index(index_path)
+        return list(index.chunks), np.asarray(index.embeddings)
+
+    @pytest.mark.parametrize("provider_name,index_name", [
+        ("fastembed", "idx"),
+        ("fastembed", "idx.json"),
+        ("faiss", "faiss_idx"),
+    ])
+    def test_only_changed_files_are_embedded(self, provider_name, index_name, source_folder, tmp_path, monkeypatch):
+        """Test that a rebuild embeds only added/changed files and drops removed ones"""
+        if provider_name == "faiss":
+            pytest.importorskip("faiss")
+        provider_class = FaissProvider if provider_name == "faiss" else FastembedProvider
+        index_path = str(tmp_path / index_name)
+        options = {'source_folder': str(source_folder), 'query': 'api design', 'force_override': True}
+
+        first = provider_class()
+        self.offline(first, monkeypatch)
+        first.parse(index_path, options)
+        manifest_file = manifest_path_for(index_path, sidecar=index_name.endswith(".json"))
+        assert len(IndexManifest.load(manifest_file).files) == 5
+
+        # Unchanged rebuild: nothing is embedded
+        unchanged = provider_class()
+        model = self.offline(unchanged, monkeypatch)
+        unchanged.parse(index_path, options)
+        assert model.embedded_texts == 0  # the query comes from the query cache
+
+        # Change one file, delete one, add one
+        (source_folder / "api_design.md").write_text("# API\n\n" + "Versioned endpoints return JSON errors. " * 20)
+        (source_folder / "database_design.txt").unlink()
+        (source_folder / "new_notes.md").write_text("Caching notes. " * 30)
+
+        incremental = provider_class()
+        model = self.offline(incremental, monkeypatch)
+        incremental.parse(index_path, options)
+        incremental_chunks, incremental_vectors = self.load_rows(provider_name, index_path)
+        changed_chunks = [c for c in incremental_chunks
+                          if Path(c['source']).name in ("api_design.md", "new_notes.md")]
+        assert model.embedded_texts == len(changed_chunks)
+        assert not any(Path(c['source']).name == "database_design.txt" for c in incremental_chunks)
+
+        # Same content as a from-scratch build
+        full_path = str(tmp_path / ("full_" + index_name))
+        full = provider_class()
+        self.offline(full, monkeypatch)
+        full.parse(full_path, dict(options, provider_config={'incremental': False}))
+        full_chunks, full_vectors = self.load_rows(provider_name, full_path)
+        assert incremental_chunks == full_chunks
+        assert np.allclose(incremental_vectors, full_vectors, atol=1e-6)
+
+    def test_settings_change_forces_full_rebuild(self, source_folder, tmp_path, monkeypatch):
+        """Test that a different chunk size invalidates the manifest"""
+        index_path = str(tmp_path / "idx")
+        provider = FastembedProvider()
+        model = self.offline(provider, monkeypatch)
+        provider.parse(index_path, {'source_folder': str(source_folder), 'query': 'q', 'chunk_size': 512})
+        built = model.embedded_texts
+
+        provider.parse(index_path, {'source_folder': str(source_folder), 'query': 'q',
+                                    'chunk_size': 256, 'force_override': True})
+        assert model.embedded_texts - built == len(vector_store.load_index(index_path).chunks)
+        assert IndexManifest.load(manifest_path_for(index_path)).settings['chunk_size'] == 256
+
+
+class TestIndexCache:
+    """Test the process-wide cache of loaded indexes"""
+
+    @staticmethod
+    def counting_loader(calls, value="loaded", size=10):
+        def loader():
+            calls.append(1)
+            return value, size
+        return loader
+
+    def test_hit_and_invalidation_on_change(self, tmp_path):
+        """Test that entries are reused until the files on disk change"""
+        index_file = tmp_path / "index.json"
+        index_file.write_text("v1")
+        cache = IndexCache(max_bytes=1000)
+        calls = []
+
+        for _ in range(3):
+            cache.get("fastembed", str(index_file), [str(index_file)], self.counting_loader(calls))
+        assert len(calls) == 1
+        assert cache.stats()['hits'] == 2
+
+        index_file.write_text("version 2")
+        cache.get("fastembed", str(index_file), [str(index_file)], self.counting_loader(calls))
+        assert len(calls) == 2
+
+    def test_lru_eviction_respects_memory_cap(self, tmp_path):
+        """Test that the least recently used index is evicted first"""
+        cache = IndexCache(max_bytes=25)
+        calls = []
+        paths = [str(tmp_path / name) for name in ("a", "b", "c")]
+
+        cache.get("faiss", paths[0], [], self.counting_loader(calls))
+        cache.get("faiss", paths[1], [], self.counting_loader(calls))
+        cache.get("faiss", paths[0], [], self.counting_loader(calls))  # refresh a
+        cache.get("faiss", paths[2], [], self.counting_loader(calls))  # evicts b
+        assert cache.stats()['entries'] == 2
+        assert cache.stats()['evictions'] == 1
+
+        cache.get("faiss", paths[0], [], self.counting_loader(calls))
+        assert len(calls) == 3
+        cache.get("faiss", paths[1], [], self.counting_loader(calls))
+        assert len(calls) == 4
+
+    def test_oversized_index_is_not_cached(self, tmp_path):
+        """Test that an index larger than the cap is returned but not kept"""
+        cache = IndexCache(max_bytes=5)
+        calls = []
+        for _ in range(2):
+            assert cache.get("fastembed", str(tmp_path), [], self.counting_loader(calls)) == "loaded"
+        assert len(calls) == 2
+
+    def test_providers_share_loaded_index(self, tmp_path, monkeypatch):
+        """Test that separate provider instances load an index from disk only once"""
+        model = FakeTextEmbedding()
+        index_path = str(tmp_path / "shared")
+        builder = FastembedProvider()
+        monkeypatch.setattr(builder, "_initialize_model", lambda *args, **kwargs: model)
+        builder.parse(index_path, {'source_folder': os.path.join("examples", "sample-docs"), 'query': 'api'})
+
+        loads = []
+        original = vector_store.load_index
+        monkeypatch.setattr(vector_store, "load_index", lambda *a, **k: loads.append(a) or original(*a, **k))
+        get_index_cache().invalidate(index_path)
+        for query in ("database", "python", "architecture"):
+            provider = FastembedProvider()
+            monkeypatch.setattr(provider, "_initialize_model", lambda *args, **kwargs: model)
+            assert "Rank 1" in provider.parse(index_path, {'query': query})
+        assert len(loads) == 1
+
+        # Rebuilding the index invalidates the cached copy
+        builder.parse(index_path, {'source_folder': os.path.join("examples", "sample-docs"),
+                                   'query': 'api', 'force_override': True,
+                                   'provider_config': {'incremental': False}})
+        assert len(loads) == 2
+
+
+class TestModelRegistry:
+    """Test the process-wide embedding model registry"""
+
+    @pytest.fixture
+    def created(self, monkeypatch):
+        """Record model loads and substitute the offline model"""
+        loads = []
+
+        def create(model_name, options):
+            loads.append((model_name, options))
+            return FakeTextEmbedding(model_name)
+
+        model_registry.clear_models()
+        monkeypatch.setattr(model_registry, "_create_model", create)
+        yield loads
+        model_registry.clear_models()
+
+    def test_providers_share_one_model(self, created):
+        """Test that every provider gets the same model instance"""
+        providers = [FastembedProvider(), FastembedProvider(), FaissProvider()]
+        models = [p._initialize_model("BAAI/bge-small-en-v1.5") for p in providers]
+        assert all(m is models[0] for m in models)
+        assert len(created) == 1
+
+    def test_options_are_part_of_the_key(self, created):
+        """Test that different options load a separate model"""
+        a = model_registry.get_embedding_model("m")
+        b = model_registry.get_embedding_model("m", threads=2)
+        assert a is not b
+        assert model_registry.get_embedding_model("m", threads=2) is b
+        assert created == [("m", {}), ("m", {'threads': 2})]
+
+    def test_concurrent_loads_happen_once(self, created):
+        """Test that concurrent first requests trigger a single load"""
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            models = list(pool.map(lambda _: model_registry.get_embedding_model("m"), range(32)))
+        assert len({id(m) for m in models}) == 1
+        assert len(created) == 1
+
+    def test_warm_up(self, created):
+        """Test that warm_up loads models ahead of the first query"""
+        model_registry.warm_up(["a", "b"])
+        model_registry.warm_up("a")
+        assert model_registry.loaded_models() == ["a", "b"]
+        assert len(created) == 2
+
+
+class TestQueryCache:
+    """Test the persistent query-embedding cache"""
+
+    def test_roundtrip_and_eviction(self, tmp_path):
+        """Test that vectors round-trip and least recently used entries are evicted"""
+        cache = QueryEmbeddingCache(str(tmp_path / "q.sqlite3"), max_entries=2)
+        cache.put("m", "first", np.arange(4, dtype=np.float32))
+        cache.put("m", "second", np.ones(4, dtype=np.float32))
+        assert np.array_equal(cache.get("m", "first"), np.arange(4, dtype=np.float32))
+        assert cache.get("other-model", "first") is None
+
+        cache.put("m", "third", np.zeros(4, dtype=np.float32))
+        assert len(cache) == 2
+        assert cache.get("m", "second") is None
+        assert cache.get("m", "first") is not None
+
+    @pytest.mark.parametrize("provider_class,index_name", [
+        (FastembedProvider, "idx"),
+        (FaissProvider, "faiss_idx"),
+    ])
+    def test_cached_run_skips_model_load(self, tmp_path, monkeypatch, provider_class, index_name):
+        """Test that a run whose queries are all cached never loads the model"""
+        loads = []
+
+        def create(model_name, options):
+            loads.append(model_name)
+            return FakeTextEmbedding(model_name)
+
+        model_registry.clear_models()
+        monkeypatch.setattr(model_registry, "_create_model", create)
+        index_path = str(tmp_path / index_name)
+        options = {'source_folder': os.path.join("examples", "sample-docs"), 'query': 'database schema'}
+        try:
+            first = provider_class().parse(index_path, options)
+            assert len(loads) == 1
+
+            model_registry.clear_models()
+            second = provider_class().parse(index_path, options)
+            assert loads == ["BAAI/bge-small-en-v1.5"]
+            assert second == first
+
+            # Disabled cache embeds the query again
+            provider_class().parse(index_path, dict(options, provider_config={'query_cache': False}))
+            assert len(loads) == 2
+        finally:
+            model_registry.clear_models()
+
+    def test_cache_location_follows_env(self, tmp_path, monkeypatch):
+        """Test that PEAC_CACHE_DIR selects the database location"""
+        monkeypatch.setenv("PEAC_CACHE_DIR", str(tmp_path / "elsewhere"))
+        assert get_query_cache().db_path.startswith(str(tmp_path / "elsewhere"))
+
+
+class TestBatchedRetrieval:
+    """Test answering several queries against one index in a single pass"""
+
+    QUERIES = ["database schema", "api design", "system architecture", "python code style"]
+
+    @pytest.fixture
+    def embed_calls(self, monkeypatch):
+        """Offline model that records every embed() call"""
+        calls = []
+
+        class CountingEmbedding(FakeTextEmbedding):
+            def embed(self, documents, batch_size=256, **kwargs):
+                calls.append(list(documents))
+                return super().embed(documents, batch_size, **kwargs)
+
+        model_registry.clear_models()
+        monkeypatch.setattr(model_registry, "_create_model",
+                            lambda model_name, options: CountingEmbedding(model_name))
+        yield calls
+        model_registry.clear_models()
+
+    def test_batch_top_k_matches_single(self):
+        """Test that the matrix-matrix scoring equals per-query scoring"""
+        rng = np.random.default_rng(7)
+        embeddings = rng.normal(size=(300, 16)).astype(np.float32)
+        queries = rng.normal(size=(4, 16)).astype(np.float32)
+        top_ks = [1, 5, 0, 400]
+
+        batch = FastembedProvider._top_k_cosine_batch(embeddings, queries, top_ks)
+        for query, top_k, result in zip(queries, top_ks, batch):
+            single = FastembedProvider._top_k_cosine(embeddings, query, top_k)
+            assert [idx for _, idx in result] == [idx for _, idx in single]
+            assert np.allclose([s for s, _ in result], [s for s, _ in single], atol=1e-6)
+
+    @pytest.mark.parametrize("provider_class,index_name", [
+        (FastembedProvider, "idx"),
+        (FaissProvider, "faiss_idx"),
+    ])
+    def test_parse_batch_matches_parse(self, provider_class, index_name, tmp_path, embed_calls):
+        """Test that a batch returns the per-query results with one query embed call"""
+        index_path = str(tmp_path / index_name)
+        base = {'source_folder': os.path.join("examples", "sample-docs"),
+                'provider_config': {'query_cache': False}}
+        options_list = [dict(base, query=q, top_k=k) for q, k in zip(self.QUERIES, [1, 3, 5, 2])]
+
+        expected = [provider_class().parse(index_path, options) for options in options_list]
+        del embed_calls[:]
+
+        assert provider_class().parse_batch(index_path, options_list) == expected
+        assert embed_calls == [sorted(self.QUERIES)]
+
+    def test_get_rag_rules_groups_by_index(self, tmp_path, monkeypatch, embed_calls):
+        """Test that rules sharing an index run as one batch and keep their order"""
+        docs = os.path.abspath(os.path.join("examples", "sample-docs"))
+        rules = {}
+        for i, query in enumerate(self.QUERIES):
+            rules[f"rule_{i}"] = {'index_path': str(tmp_path / ("a" if i != 2 else "b")),
+                                  'source_folder': docs, 'query': query, 'top_k': i + 1}
+        rules["no_query"] = {'index_path': str(tmp_path / "a")}
+        yaml_file = tmp_path / "prompt.yaml"
+        yaml_file.write_text(json.dumps({'prompt': {'context': {'rag': rules}}}))
+
+        batches = []
+        original = local_parser.parse_rag_batch
+        monkeypatch.setattr(local_parser, "parse_rag_batch",
+                            lambda path, options_list: batches.append(path) or original(path, options_list))
+
+        sections = PromptYaml(str(yaml_file)).get_rag_rules('context')
+
+        assert sorted(batches) == [str(tmp_path / "a"), str(tmp_path / "b")]
+        assert len(sections) == 5
+        for query, section in zip(self.QUERIES, sections):
+            assert f"RAG Search Results for: '{query}'" in section['lines'][0]
+        assert "No query specified" in sections[4]['lines'][0]
+
+
+class TestParallelExtraction:
+    """Test process-pool document extraction"""
+
+    @pytest.fixture
+    def corpus(self, tmp_path):
+        folder = tmp_path / "docs"
+        folder.mkdir()
+        for i in range(extraction.PARALLEL_MIN_FILES + 4):
+            (folder / f"doc_{i:02d}.md").write_text(f"Document {i} about topic {i % 3}. " * 40)
+        return folder
+
+    def test_pool_matches_sequential_order(self, corpus):
+        """Test that parallel extraction returns the same documents in input order"""
+        files = FastembedProvider().list_source_files(str(corpus))
+        reader = FastembedProvider._read_file_content
+        sequential = extraction.read_documents(files, reader, workers=1)
+        parallel = extraction.read_documents(list(files), reader, workers=4)
+        assert parallel == sequential
+        assert [path for path, _ in parallel] == files
+
+    def test_failing_files_are_skipped(self, corpus):
+        """Test that a raising or crashing file does not abort the batch"""
+        (corpus / "raise_me.md").write_text("x")
+        (corpus / "crash_me.md").write_text("x")
+        files = sorted(str(path) for path in corpus.iterdir())
+        documents = extraction.read_documents(files, _flaky_reader, workers=3)
+        names = [os.path.basename(path) for path, _ in documents]
+        assert "raise_me.md" not in names and "crash_me.md" not in names
+        assert len(names) == extraction.PARALLEL_MIN_FILES + 4
+
+    def test_provider_workers_setting(self, corpus, tmp_path, monkeypatch):
+        """Test that an index built with several workers equals a single-process build"""
+        rows = []
+        for workers in (1, 3):
+            provider = FastembedProvider()
+            monkeypatch.setattr(provider, "_initialize_model", lambda *args, **kwargs: FakeTextEmbedding())
+            index_path = str(tmp_path / f"idx_{workers}")
+            provider.parse(index_path, {'source_folder': str(corpus), 'query': 'topic',
+                                        'provider_config': {'workers': workers}})
+            rows.append(list(vector_store.load_index(index_path).chunks))
+        assert rows[0] == rows[1]
+
+
+class TestExtractionCache:
+    """Test the content-addressed cache of extracted document text"""
+
+    @pytest.fixture
+    def docx_file(self, tmp_path):
+        docx = pytest.importorskip("docx")
+        document = docx.Document()
+        for text in ("First paragraph about Vector search.", "", "Second paragraph."):
+            document.add_paragraph(text)
+        path = tmp_path / "report.docx"
+        document.save(str(path))
+        return path
+
+    @pytest.fixture
+    def parse_calls(self, monkeypatch):
+        from peac.providers.docx import DocxProvider
+
+        calls = []
+        original = DocxProvider.parse
+
+        def parse(provider, file_path, options=None):
+            calls.append(str(file_path))
+            return original(provider, file_path, options)
+
+        monkeypatch.setattr(DocxProvider, "parse", parse)
+        return calls
+
+    def test_repeated_reads_skip_parsing(self, docx_file, parse_calls, tmp_path):
+        """Test that unchanged documents are parsed once, whatever their path"""
+        first = local_parser.read_file(str(docx_file))
+        assert local_parser.read_file(str(docx_file)) == first
+        assert "Second paragraph." in first
+        assert len(parse_calls) == 1
+
+        copy = tmp_path / "copy.docx"
+        shutil.copy(docx_file, copy)
+        assert local_parser.read_file(str(copy)) == first
+        assert len(parse_calls) == 1
+
+        # Options are part of the key
+        assert "Second" not in local_parser.read_file(str(docx_file), options={'pages': '1'})
+        assert len(parse_calls) == 2
+
+    def test_rag_reader_shares_local_entries(self, docx_file, parse_calls):
+        """Test that a RAG build reuses text extracted for a local rule, normalized as before"""
+        local_parser.read_file(str(docx_file))
+        for provider_class in (FastembedProvider, FaissProvider):
+            text = provider_class._read_file_content(str(docx_file))
+            assert text == normalize_text("First paragraph about Vector search.\n\nSecond paragraph.\n")
+        assert len(parse_calls) == 1
+
+    def test_index_build_hashes_documents_once(self, docx_file, parse_calls, tmp_path, monkeypatch):
+        """Test that a RAG build keys the extraction cache with the manifest's hash"""
+        from peac.providers.rag import manifest
+
+        hashed = []
+        file_digest = extraction_cache.file_digest
+
+        def counting_digest(file_path):
+            hashed.append(str(file_path))
+            return file_digest(file_path)
+
+        monkeypatch.setattr(extraction_cache, "file_digest", counting_digest)
+        monkeypatch.setattr(manifest, "hash_file", counting_digest)
+        provider = FastembedProvider()
+        model = FakeTextEmbedding()
+        monkeypatch.setattr(provider, "_initialize_model", lambda *args, **kwargs: model)
+        error = provider._prepare_index(str(tmp_path / "idx"), {'source_folder': str(docx_file.parent),
+                                                               'force_override': True, 'provider_config': {}})
+        assert error is None
+        assert hashed == [str(docx_file)]
+        assert len(parse_calls) == 1
+        assert local_parser.read_file(str(docx_file))
+        assert len(parse_calls) == 1
+
+    def test_edited_file_is_parsed_again(self, docx_file, parse_calls):
+        """Test that the key follows the file content"""
+        import docx
+
+        local_parser.read_file(str(docx_file))
+        document = docx.Document(str(docx_file))
+        document.add_paragraph("Third paragraph.")
+        document.save(str(docx_file))
+        assert "Third paragraph." in local_parser.read_file(str(docx_file))
+        assert len(parse_calls) == 2
+
+    def test_disabled_by_env(self, docx_file, parse_calls, monkeypatch):
+        """Test that PEAC_EXTRACTION_CACHE_MB=0 turns the cache off"""
+        monkeypatch.setattr(extraction_cache, "_caches", {})
+        monkeypatch.setenv("PEAC_EXTRACTION_CACHE_MB", "0")
+        local_parser.read_file(str(docx_file))
+        local_parser.read_file(str(docx_file))
+        assert len(parse_calls) == 2
+
+    def test_failures_are_not_cached(self, tmp_path):
+        """Test that provider errors propagate and leave no entry"""
+        class FailingProvider:
+            def parse(self, file_path, options=None):
+                raise ValueError("corrupt")
+
+        path = tmp_path / "broken.pdf"
+        path.write_bytes(b"not a pdf")
+        with pytest.raises(ValueError):
+            extraction_cache.cached_extract(str(path), FailingProvider())
+        assert len(extraction_cache.get_extraction_cache()) == 0
+
+    def test_size_cap_evicts_least_recently_used(self, tmp_path):
+        """Test that the total size stays under the cap, dropping the oldest entries"""
+        import random
+
+        rng = random.Random(0)
+        texts = {key: ''.join(rng.choice('abcdefghij') for _ in range(4000)) for key in "abcd"}
+        sizes = {key: len(zlib.compress(text.encode())) for key, text in texts.items()}
+        cache = ExtractionCache(str(tmp_path / "x.sqlite3"), max_bytes=sizes['a'] + sizes['b'] + sizes['c'])
+        for key in "abc":
+            cache.put(key, texts[key])
+            time.sleep(0.01)
+        assert cache.get("a") == texts["a"]
+        time.sleep(0.01)
+        cache.put("d", texts["d"])
+
+        assert cache.get("b") is None
+        assert cache.get("a") == texts["a"] and cache.get("d") == texts["d"]
+        assert cache.size_bytes() <= cache.max_bytes
+
+
+class RecordingEmbedding(FakeTextEmbedding):
+    """FakeTextEmbedding that records the size of every embed call"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.calls = []
+
+    def embed(self, documents, batch_size: int = 256, **kwargs):
+        documents = list(documents)
+        self.calls.append(len(documents))
+        return super().embed(documents, batch_size=batch_size, **kwargs)
+
+
+class TestStreamingBuild:
+    """Test the streaming chunk-and-embed index build"""
+
+    @staticmethod
+    def build(provider_class, index_path, batch_size, monkeypatch):
+        provider = provider_class()
+        model = RecordingEmbedding()
+        monkeypatch.setattr(provider, "_initialize_model", lambda *args, **kwargs: model)
+        provider.parse(index_path, {
+            'source_folder': os.path.join("examples", "sample-docs"), 'query': 'api design',
+            'chunk_size': 128, 'overlap': 20, 'provider_config': {'batch_size': batch_size},
+        })
+        return model
+
+    @pytest.mark.parametrize("provider_name", ["fastembed", "faiss"])
+    def test_embed_calls_are_bounded_by_batch_size(self, provider_name, tmp_path, monkeypatch):
+        """Test that chunks are embedded in batches of at most batch_size"""
+        if provider_name == "faiss":
+            pytest.importorskip("faiss")
+        provider_class = FaissProvider if provider_name == "faiss" else FastembedProvider
+        model = self.build(provider_class, str(tmp_path / "idx"), 4, monkeypatch)
+        build_calls = model.calls[:-1]  # the last call embeds the query
+        assert len(build_calls) > 1
+        assert max(build_calls) <= 4
+
+    @pytest.mark.parametrize("index_name", ["idx", "idx.json"])
+    def test_batch_size_does_not_change_the_index(self, index_name, tmp_path, monkeypatch):
+        """Test that a build in small batches equals a build in one batch"""
+        indexes = []
+        for batch_size in (3, 10000):
+            index_path = str(tmp_path / str(batch_size) / index_name)
+            self.build(FastembedProvider, index_path, batch_size, monkeypatch)
+            indexes.append(vector_store.load_index(index_path))
+        small, large = indexes
+        assert list(small.chunks) == list(large.chunks)
+        np.testing.assert_allclose(small.embeddings, large.embeddings, rtol=1e-6)
+
+    @staticmethod
+    def zeros(texts):
+        return np.zeros((len(texts), 2), dtype=np.float32)
+
+    def test_read_ahead_is_bounded_by_queue_size(self):
+        """Test that the producer reads only a queue's worth of documents ahead of the embedder"""
+        read = []
+
+        def documents():
+            for i in range(10):
+                read.append(i)
+                yield f"doc{i}", f"text of document {i}"
+
+        pipeline = ChunkPipeline([f"doc{i}" for i in range(10)], [], documents(), lambda text: [text],
+                                 self.zeros, batch_size=2, queue_size=1)
+        batches = iter(pipeline)
+        vectors, records, _ = next(batches)
+        time.sleep(0.2)
+        assert [record['source'] for record in records] == ["doc0", "doc1"]
+        # two consumed, one queued, one waiting for queue space
+        assert len(read) <= 4
+        batches.close()
+
+    def test_extraction_overlaps_embedding(self):
+        """Test that documents are extracted while the previous batch is being embedded"""
+        def documents():
+            for i in range(8):
+                time.sleep(0.05)
+                yield f"doc{i}", f"text {i}"
+
+        def slow_embed(texts):
+            time.sleep(0.05)
+            return self.zeros(texts)
+
+        pipeline = ChunkPipeline([f"doc{i}" for i in range(8)], [], documents(), lambda text: [text],
+                                 slow_embed, batch_size=1)
+        start = time.perf_counter()
+        rows = sum(len(records) for _, records, _ in pipeline)
+        elapsed = time.perf_counter() - start
+        assert rows == 8
+        assert elapsed < 0.7  # 0.8s when the stages take turns
+        assert pipeline.timings['extract'] >= 0.35 and pipeline.timings['embed'] >= 0.35
+        assert "embedder idle" in pipeline.stage_report()
+
+    def test_producer_errors_reach_the_consumer(self):
+        """Test that an extraction error fails the build instead of hanging it"""
+        def documents():
+            yield "doc0", "text"
+            raise RuntimeError("extraction failed")
+
+        pipeline = ChunkPipeline(["doc0", "doc1"], [], documents(), lambda text: [text], self.zeros)
+        with pytest.raises(RuntimeError, match="extraction failed"):
+            list(pipeline)
+
+    def test_closing_early_stops_the_producer(self):
+        """Test that the producer thread ends when the consumer stops early"""
+        def documents():
+            i = 0
+            while True:
+                yield f"doc{i}", "text"
+                i += 1
+
+        pipeline = ChunkPipeline([f"doc{i}" for i in range(1000)], [], documents(), lambda text: [text],
+                                 self.zeros, batch_size=1, queue_size=2)
+        batches = iter(pipeline)
+        next(batches)
+        batches.close()
+        assert not any(thread.name == 'peac-index-producer' for thread in threading.enumerate())
+
+    def test_unchanged_rows_keep_source_order(self):
+        """Test that copied and new rows are interleaved in source file order"""
+        old_sources = ['a', 'a', 'c']
+
+        def fetch(rows):
+            return (np.ones((len(rows), 2), dtype=np.float32),
+                    [{'source': old_sources[i], 'chunk_id': i % 2, 'text': f'old {i}'} for i in rows])
+
+        previous = PreviousRows(old_sources, DuplicateMap(), fetch)
+        pipeline = ChunkPipeline(['a', 'b', 'c'], ['a', 'c'], iter([('b', 'new')]), lambda text: [text, text + '!'],
+                                 self.zeros, batch_size=1, previous=previous)
+        sources = [record['source'] for _, records, _ in pipeline for record in records]
+        assert sources == ['a', 'a', 'b', 'b', 'c']
+        assert pipeline.chunk_counts == {'a': 2, 'b': 2, 'c': 1}
+        assert pipeline.embedded == 2 and pipeline.batches == 2
+        assert row_ranges(['a', 'a', 'c']) == {'a': [(0, 2)], 'c': [(2, 3)]}
+        assert row_ranges(['a', 'b', 'a']) == {'a': [(0, 1), (2, 3)], 'b': [(1, 2)]}
+
+
+class TestChunkDedup:
+    """Test de-duplication of repeated chunks"""
+
+    BOILERPLATE = ("Licensed under the Apache License, Version 2.0. You may not use this file except in "
+                   "compliance with the License. Distributed on an AS IS BASIS, without warranties. ") * 4
+
+    @pytest.fixture
+    def source_folder(self, tmp_path):
+        folder = tmp_path / "docs"
+        folder.mkdir()
+        for name in ("a.md", "b.md", "c.md"):
+            (folder / name).write_text(self.BOILERPLATE)
+        (folder / "d.md").write_text("Vector databases store embeddings for semantic search. " * 8)
+        return folder
+
+    @staticmethod
+    def build(provider_class, index_path, source_folder, monkeypatch, **config):
+        provider = provider_class()
+        model = FakeTextEmbedding()
+        monkeypatch.setattr(provider, "_initialize_model", lambda *args, **kwargs: model)
+        output = provider.parse(index_path, {
+            'source_folder': str(source_folder), 'query': 'apache license warranties', 'top_k': 1,
+            'chunk_size': 200, 'overlap': 20, 'force_override': True, 'provider_config': config,
+        })
+        return model, output
+
+    def test_exact_duplicates_share_a_row(self):
+        """Test that the same text maps to its first row and other text gets its own"""
+        dedup = ChunkDeduplicator('exact')
+        assert dedup.canonical_row("license header", 0) == 0
+        assert dedup.canonical_row("other text", 1) == 1
+        assert dedup.canonical_row("license header", 2) == 0
+        assert ChunkDeduplicator('off').canonical_row("x", 5) == 5
+
+    def test_near_duplicates(self):
+        """Test that near mode matches a lightly edited chunk but not unrelated text"""
+        words = [f"word{i}" for i in range(200)]
+        dedup = ChunkDeduplicator('near', threshold=0.8)
+        assert dedup.canonical_row(" ".join(words), 0) == 0
+        edited = list(words)
+        edited[100] = "changed"
+        assert dedup.canonical_row(" ".join(edited), 1) == 0
+        assert dedup.canonical_row(" ".join(reversed(words)), 1) == 1
+        assert ChunkDeduplicator('exact').canonical_row(" ".join(edited), 1) == 1
+        with pytest.raises(ValueError):
+            ChunkDeduplicator('fuzzy')
+
+    def test_exact_repeat_of_near_duplicate(self):
+        """Test that a repeated near-duplicate maps to its match, not to the row created after it"""
+        words = [f"word{i}" for i in range(200)]
+        near = " ".join(words + ["extra"])
+        dedup = ChunkDeduplicator('near', threshold=0.8)
+        assert dedup.canonical_row(" ".join(words), 0) == 0
+        assert dedup.canonical_row(near, 1) == 0
+        assert dedup.canonical_row(" ".join(f"other{i}" for i in range(200)), 1) == 1
+        assert dedup.canonical_row(near, 2) == 0
+
+    @pytest.mark.parametrize("provider_name,index_name", [
+        ("fastembed", "idx"),
+        ("fastembed", "idx.json"),
+        ("faiss", "faiss_idx"),
+    ])
+    def test_duplicates_are_embedded_once(self, provider_name, index_name, source_folder, tmp_path, monkeypatch):
+        """Test that repeated chunks are embedded once and results list every source"""
+        if provider_name == "faiss":
+            pytest.importorskip("faiss")
+        provider_class = FaissProvider if provider_name == "faiss" else FastembedProvider
+        deduped_path = str(tmp_path / "dedup" / index_name)
+        full_path = str(tmp_path / "full" / index_name)
+        deduped_model, output = self.build(provider_class, deduped_path, source_folder, monkeypatch)
+        full_model, _ = self.build(provider_class, full_path, source_folder, monkeypatch, dedup='off')
+
+        assert deduped_model.embedded_texts < full_model.embedded_texts
+        assert "Also in: " in output
+        assert "b.md (chunk " in output
+
+        sidecar = index_name.endswith(".json")
+        deduped = IndexManifest.load(manifest_path_for(deduped_path, sidecar=sidecar)).files
+        full = IndexManifest.load(manifest_path_for(full_path, sidecar=sidecar)).files
+        assert {path: state['chunks'] for path, state in deduped.items()} == \
+               {path: state['chunks'] for path, state in full.items()}
+
+    def test_incremental_rebuild_matches_full_rebuild(self, source_folder, tmp_path, monkeypatch):
+        """Test that removing the file holding the shared rows moves them to the next copy"""
+        index_path = str(tmp_path / "idx")
+        self.build(FastembedProvider, index_path, source_folder, monkeypatch)
+        (source_folder / "a.md").unlink()
+        (source_folder / "e.md").write_text(self.BOILERPLATE)
+        model, _ = self.build(FastembedProvider, index_path, source_folder, monkeypatch)
+        assert model.embedded_texts == 0  # e.md repeats b.md, the query is cached
+
+        full_path = str(tmp_path / "full")
+        self.build(FastembedProvider, full_path, source_folder, monkeypatch, incremental=False)
+        incremental, full = vector_store.load_index(index_path), vector_store.load_index(full_path)
+        assert list(incremental.chunks) == list(full.chunks)
+        assert incremental.duplicates.entries() == full.duplicates.entries()
+        assert {chunk['source'] for chunk in incremental.chunks} == {
+            str(source_folder / "b.md"), str(source_folder / "d.md")}
+        np.testing.assert_allclose(incremental.embeddings, full.embeddings, rtol=1e-6)
+
+
+class TestLexicalRetrieval:
+    """Test the BM25 index and the lexical/hybrid retrieval modes"""
+
+    @pytest.fixture
+    def code_folder(self, tmp_path):
+        folder = tmp_path / "src"
+        folder.mkdir()
+        (folder / "prompt.py").write_text(
+            "def get_prompt_sentence(self):\n    return self.render_sections(self.sections)\n" * 3)
+        (folder / "parser.py").write_text(
+            "def parse_rules(source):\n    rules = load_yaml(source)\n    return validate(rules)\n" * 3)
+        (folder / "notes.md").write_text("The prompt sentence is assembled from sections and rules. " * 4)
+        return folder
+
+    @staticmethod
+    def build(provider_class, index_path, source_folder, monkeypatch, **config):
+        """Build an index with the fake model, then forbid loading any model"""
+        provider = provider_class()
+        monkeypatch.setattr(provider, "_initialize_model", lambda *args, **kwargs: FakeTextEmbedding())
+        provider._prepare_index(index_path, {'source_folder': str(source_folder), 'force_override': True,
+                                             'provider_config': config})
+
+        def no_model(*args, **kwargs):
+            raise AssertionError("lexical retrieval loaded the embedding model")
+
+        searcher = provider_class()
+        monkeypatch.setattr(searcher, "_initialize_model", no_model)
+        return searcher
+
+    def test_bm25_scores(self, tmp_path):
+        """Test BM25 ranking, scores and camelCase-aware query tokenization"""
+        builder = lexical.LexicalIndexBuilder()
+        builder.add({'text': normalize_text(text)} for text in (
+            "alpha beta beta", "alpha gamma", "delta getPromptSentence", "beta"))
+        builder.write(str(tmp_path / "lex"))
+        index = lexical.LexicalIndex.load(str(tmp_path / "lex"))
+
+        hits = index.search("beta", 4)
+        assert [row for _, row in hits] == [3, 0]
+        idf = np.log(1 + (4 - 2 + 0.5) / (2 + 0.5))
+        avgdl = 10 / 4  # "get Prompt Sentence" after normalization
+        assert hits[1][0] == pytest.approx(idf * 2 * 2.2 / (2 + 1.2 * (1 - 0.75 + 0.75 * 3 / avgdl)))
+        assert hits[0][0] == pytest.approx(idf * 1 * 2.2 / (1 + 1.2 * (1 - 0.75 + 0.75 * 1 / avgdl)))
+        assert index.search("getPromptSentence", 2)[0][1] == 2
+        assert index.search("missing", 3) == []
+        assert len(index.search("alpha beta", 1)) == 1
+
+    def test_fuse_rankings(self):
+        """Test that rows ranked well by both retrievers come first"""
+        dense = [(0.9, 1), (0.8, 2), (0.7, 3)]
+        lexical_ranking = [(12.0, 3), (8.0, 4), (5.0, 1)]
+        fused = lexical.fuse_rankings([dense, lexical_ranking], 3)
+        assert [row for _, row in fused] == [1, 3, 2]
+        assert fused[0][0] == pytest.approx(1 / 61 + 1 / 63)
+
+    @pytest.mark.parametrize("provider_name,index_name", [
+        ("fastembed", "idx"),
+        ("fastembed", "idx.json"),
+        ("faiss", "faiss_idx"),
+    ])
+    def test_lexical_search_skips_model(self, provider_name, index_name, code_folder, tmp_path, monkeypatch):
+        """Test that lexical retrieval finds exact identifiers without loading a model"""
+        if provider_name == "faiss":
+            pytest.importorskip("faiss")
+        provider_class = FaissProvider if provider_name == "faiss" else FastembedProvider
+        index_path = str(tmp_path / index_name)
+        searcher = self.build(provider_class, index_path, code_folder, monkeypatch)
+
+        output = searcher.parse(index_path, {'query': 'get_prompt_sentence', 'top_k': 1,
+                                             'provider_config': {'retrieval': 'lexical', 'query_cache': False}})
+        assert "Rank 1" in output
+        assert "prompt.py" in output
+
+    def test_missing_lexical_index_is_rebuilt(self, code_folder, tmp_path, monkeypatch):
+        """Test that indexes without a lexical index get one from their stored chunks"""
+        index_path = str(tmp_path / "idx")
+        searcher = self.build(FastembedProvider, index_path, code_folder, monkeypatch)
+        expected = searcher.parse(index_path, {'query': 'load_yaml', 'provider_config': {'retrieval': 'lexical'}})
+        for path in lexical.lexical_files(index_path):
+            os.remove(path)
+        get_index_cache().invalidate()
+
+        output = searcher.parse(index_path, {'query': 'load_yaml', 'provider_config': {'retrieval': 'lexical'}})
+        assert output == expected
+        assert lexical.lexical_exists(index_path)
+
+    def test_hybrid_combines_both_rankings(self, code_folder, tmp_path, monkeypatch):
+        """Test that hybrid retrieval fuses the dense and lexical rankings"""
+        index_path = str(tmp_path / "idx")
+        provider = self.build(FastembedProvider, index_path, code_folder, monkeypatch)
+        monkeypatch.setattr(provider, "_initialize_model", lambda *args, **kwargs: FakeTextEmbedding())
+        provider.retrieval = 'hybrid'
+        results = provider._search_index_batch(index_path, ['load_yaml validate'], [3])[0]
+        assert results[0]['source'].endswith("parser.py")
+        assert 0 < results[0]['score'] <= 2 / (lexical.RRF_K + 1)
+        assert len(results) == 3
+
+    def test_unknown_mode(self):
+        """Test that an invalid retrieval mode is rejected"""
+        with pytest.raises(ValueError):
+            lexical.resolve_retrieval_mode("sparse")
+
+
+class TestShardedIndex:
+    """Test sharded indexes: per-shard builds, concurrent search and top-k merge"""
+
+    TOPICS = ["databases store rows in tables", "neural networks learn weights",
+              "compilers translate source code", "gardens need water and sunlight",
+              "orchestras play symphonies", "rockets burn liquid fuel"]
+
+    @pytest.fixture
+    def source_folder(self, tmp_path):
+        folder = tmp_path / "docs"
+        for i, topic in enumerate(self.TOPICS):
+            subfolder = folder / ("" if i == 0 else "ab"[i % 2])
+            subfolder.mkdir(parents=True, exist_ok=True)
+            (subfolder / f"doc{i}.md").write_text(f"Document {i}. " + f"This text is about {topic}. " * 12)
+        return folder
+
+    @staticmethod
+    def make_provider(provider_class, monkeypatch):
+        provider = provider_class()
+        model = FakeTextEmbedding()
+        monkeypatch.setattr(provider, "_initialize_model", lambda *args, **kwargs: model)
+        return provider, model
+
+    def build(self, provider_class, index_path, source_folder, monkeypatch, **config):
+        provider, model = self.make_provider(provider_class, monkeypatch)
+        error = provider._prepare_index(index_path, {'source_folder': str(source_folder), 'force_override': True,
+                                                     'chunk_size': 200, 'overlap': 20, 'provider_config': config})
+        assert error is None
+        return provider, model
+
+    def test_plan_shards(self, tmp_path):
+        """Test subfolder shards and stable hash assignment"""
+        root = tmp_path / "src"
+        files = [str(root / name) for name in ("a/x.md", "a/y/z.md", "b/w.md", "top.md")]
+        assert sharding.plan_shards(str(root), files, "subfolder") == {
+            "_root": [files[3]], "a": files[:2], "b": [files[2]]}
+
+        before = sharding.plan_shards(str(root), files, 4)
+        after = sharding.plan_shards(str(root), files + [str(root / "new.md")], 4)
+        for name, shard_files in before.items():
+            assert set(shard_files) <= set(after[name])
+        assert sharding.resolve_shards("3") == 3
+        with pytest.raises(ValueError):
+            sharding.resolve_shards("by-size")
+
+    def test_merge_top_k(self):
+        """Test the k-way merge of per-shard rankings"""
+        shard_a = [{'score': 0.9, 'id': 'a0'}, {'score': 0.5, 'id': 'a1'}]
+        shard_b = [{'score': 0.7, 'id': 'b0'}, {'score': 0.5, 'id': 'b1'}]
+        merged = sharding.merge_top_k([shard_a, shard_b], 3)
+        assert [(r['id'], r['rank']) for r in merged] == [('a0', 1), ('b0', 2), ('a1', 3)]
+
+    @pytest.mark.parametrize("provider_name,shards", [
+        ("fastembed", "subfolder"),
+        ("fastembed", 3),
+        ("faiss", "subfolder"),
+    ])
+    def test_sharded_search_matches_single_index(self, provider_name, shards, source_folder, tmp_path, monkeypatch):
+        """Test that merged per-shard top-k equals the top-k of one index"""
+        if provider_name == "faiss":
+            pytest.importorskip("faiss")
+        provider_class = FaissProvider if provider_name == "faiss" else FastembedProvider
+        single, _ = self.build(provider_class, str(tmp_path / "single"), source_folder, monkeypatch)
+        sharded_path = str(tmp_path / "sharded")
+        sharded, _ = self.build(provider_class, sharded_path, source_folder, monkeypatch, shards=shards)
+
+        info = sharding.load_shards(sharded_path)
+        assert len(info['shards']) > 1
+        assert sum(shard['files'] for shard in info['shards']) == len(self.TOPICS)
+
+        queries = ["neural networks", "liquid fuel rockets", "tables and rows"]
+        expected = single._search_index_batch(str(tmp_path / "single"), queries, [4, 4, 4])
+        results = sharded._search_index_batch(sharded_path, queries, [4, 4, 4])
+        for want, got in zip(expected, results):
+            assert [r['score'] for r in got] == pytest.approx([r['score'] for r in want])
+            assert [r['rank'] for r in got] == [1, 2, 3, 4]
+            # Rows tied at the cut-off score may be picked from another shard
+            cutoff = want[-1]['score'] + 1e-6
+            above = lambda hits: sorted((r['source'], r['chunk_id']) for r in hits if r['score'] > cutoff)
+            assert above(got) == above(want)
+
+    @pytest.mark.parametrize("retrieval", ["lexical", "hybrid"])
+    def test_sharded_lexical_and_hybrid_match_single_index(self, retrieval, source_folder, tmp_path, monkeypatch):
+        """Test that BM25 and fused scores of shards are those of one index"""
+        (source_folder / "a" / "extra.md").write_text("Rockets and neural networks. " * 3 + "Tables of fuel rows. " * 9)
+        single, _ = self.build(FastembedProvider, str(tmp_path / "single"), source_folder, monkeypatch,
+                               retrieval=retrieval)
+        sharded_path = str(tmp_path / "sharded")
+        sharded, _ = self.build(FastembedProvider, sharded_path, source_folder, monkeypatch,
+                                shards="subfolder", retrieval=retrieval)
+
+        queries = ["neural networks", "liquid fuel rockets", "tables and rows"]
+        expected = single._search_index_batch(str(tmp_path / "single"), queries, [4, 4, 4])
+        results = sharded._search_index_batch(sharded_path, queries, [4, 4, 4])
+        for want, got in zip(expected, results):
+            assert [r['score'] for r in got] == pytest.approx([r['score'] for r in want])
+            assert [r['rank'] for r in got] == list(range(1, len(want) + 1))
+            cutoff = want[-1]['score'] + 1e-9
+            above = lambda hits: sorted((r['source'], r['chunk_id']) for r in hits if r['score'] > cutoff)
+            assert above(got) == above(want)
+
+    def test_shards_searched_concurrently(self, source_folder, tmp_path, monkeypatch):
+        """Test that shards are searched in worker threads with queries embedded once"""
+        index_path = str(tmp_path / "idx")
+        provider, _ = self.build(FastembedProvider, index_path, source_folder, monkeypatch, shards="subfolder")
+        threads, embeds = [], []
+        search = FastembedProvider._search_index_batch
+        embed = FastembedProvider._embed_queries
+
+        def recording_search(self, *args, **kwargs):
+            threads.append(threading.current_thread().name)
+            return search(self, *args, **kwargs)
+
+        def recording_embed(self, queries, model):
+            embeds.append(list(queries))
+            return embed(self, queries, model)
+
+        monkeypatch.setattr(FastembedProvider, "_search_index_batch", recording_search)
+        monkeypatch.setattr(FastembedProvider, "_embed_queries", recording_embed)
+        output = provider.parse(index_path, {'query': 'symphonies', 'top_k': 2})
+        assert "Rank 2" in output and "Rank 3" not in output
+        assert sum(name.startswith("peac-shard") for name in threads) == 3
+        assert embeds == [["symphonies"]]
+
+    def test_extraction_workers_split_between_shards(self, source_folder, tmp_path, monkeypatch):
+        """Test that shards built at the same time share the extraction worker budget"""
+        workers = []
+        iter_documents = FastembedProvider._iter_documents
+
+        def recording_iter(self, *args, **kwargs):
+            workers.append(self.workers)
+            return iter_documents(self, *args, **kwargs)
+
+        monkeypatch.setattr(FastembedProvider, "_iter_documents", recording_iter)
+        self.build(FastembedProvider, str(tmp_path / "idx"), source_folder, monkeypatch,
+                   shards="subfolder", shard_workers=3, workers=7)
+        assert workers == [2, 2, 2]
+
+    def test_rebuild_touches_only_changed_shard(self, source_folder, tmp_path, monkeypatch):
+        """Test that unchanged shards are not re-embedded or rewritten"""
+        index_path = str(tmp_path / "idx")
+        self.build(FastembedProvider, index_path, source_folder, monkeypatch, shards="subfolder")
+        untouched = os.path.join(sharding.shard_path(index_path, "a"), vector_store.EMBEDDINGS_FILE)
+        mtime = os.stat(untouched).st_mtime_ns
+
+        (source_folder / "b" / "doc1.md").write_text("Document 1 rewritten about volcanoes and lava flows. " * 6)
+        _, model = self.build(FastembedProvider, index_path, source_folder, monkeypatch, shards="subfolder")
+        assert os.stat(untouched).st_mtime_ns == mtime
+        changed = [chunk['source'] for chunk in vector_store.load_index(sharding.shard_path(index_path, "b")).chunks]
+        assert model.embedded_texts == changed.count(str(source_folder / "b" / "doc1.md"))
+
+    def test_removed_subfolder_and_unsharding(self, source_folder, tmp_path, monkeypatch):
+        """Test that empty shards are deleted and an unsharded rebuild drops all shards"""
+        index_path = str(tmp_path / "idx")
+        self.build(FastembedProvider, index_path, source_folder, monkeypatch, shards="subfolder")
+        shutil.rmtree(source_folder / "b")
+        self.build(FastembedProvider, index_path, source_folder, monkeypatch, shards="subfolder")
+        assert [shard['name'] for shard in sharding.load_shards(index_path)['shards']] == ["_root", "a"]
+        assert not os.path.exists(sharding.shard_path(index_path, "b"))
+
+        self.build(FastembedProvider, index_path, source_folder, monkeypatch)
+        assert not sharding.is_sharded(index_path)
+        assert not os.path.exists(os.path.join(index_path, sharding.SHARDS_DIR))
+        assert vector_store.index_exists(index_path)
+
+    def test_lexical_search_of_shards_skips_model(self, source_folder, tmp_path, monkeypatch):
+        """Test that lexical retrieval over shards never embeds the query"""
+        index_path = str(tmp_path / "idx")
+        self.build(FastembedProvider, index_path, source_folder, monkeypatch, shards=2)
+        provider = FastembedProvider()
+
+        def no_model(*args, **kwargs):
+            raise AssertionError("lexical retrieval loaded the embedding model")
+
+        monkeypatch.setattr(provider, "_initialize_model", no_model)
+        output = provider.parse(index_path, {'query': 'orchestras', 'top_k': 1,
+                                             'provider_config': {'retrieval': 'lexical', 'query_cache': False}})
+        assert "doc4.md" in output
+
+
+class TestIndexCommands:
+    """Test the 'peac index' commands: build/update ahead of time, stats and verify"""
+
+    @pytest.fixture
+    def fake_model(self, monkeypatch):
+        model_registry.clear_models()
+        monkeypatch.setattr(model_registry, "_create_model",
+                            lambda model_name, options: FakeTextEmbedding(model_name))
+        yield
+        model_registry.clear_models()
+
+    @staticmethod
+    def invoke(*args):
+        from typer.testing import CliRunner
+        from peac.main import app
+
+        return CliRunner().invoke(app, ["index", *args])
+
+    @pytest.fixture
+    def source_folder(self, tmp_path):
+        folder = tmp_path / "docs"
+        (folder / "sub").mkdir(parents=True)
+        (folder / "a.md").write_text("Databases store rows in tables. " * 30)
+        (folder / "b.md").write_text("Compilers translate source code. " * 30)
+        (folder / "sub" / "c.md").write_text("Rockets burn liquid fuel. " * 30)
+        return folder
+
+    def test_build_update_stats_verify(self, source_folder, tmp_path, fake_model):
+        """Test a full build, a no-op update, the stats report and a clean verify"""
+        index_path = str(tmp_path / "idx")
+        result = self.invoke("build", str(source_folder), index_path, "--chunk-size", "200", "--overlap", "20")
+        assert result.exit_code == 0, result.output
+        assert "3 files" in result.output and "chunks/s" in result.output
+
+        result = self.invoke("update", str(source_folder), index_path, "--chunk-size", "200", "--overlap", "20")
+        assert result.exit_code == 0, result.output
+        assert "up to date" in result.output
+
+        stats = maintenance.index_stats(index_path)
+        index = vector_store.load_index(index_path)
+        assert (stats['provider'], stats['format'], stats['dimension']) == ("fastembed", "binary", 64)
+        assert stats['chunks'] == len(index) + len(index.duplicates)
+        assert stats['source_files'] == 3 and stats['lexical'] == len(index)
+        assert stats['settings']['chunk_size'] == 200
+
+        result = self.invoke("stats", index_path)
+        assert result.exit_code == 0
+        assert f"Chunks:       {stats['chunks']}" in result.output
+        assert "BAAI/bge-small-en-v1.5" in result.output
+
+        result = self.invoke("verify", index_path)
+        assert result.exit_code == 0 and f"OK: {index_path}" in result.output
+
+    @pytest.mark.parametrize("damage,message", [
+        ("truncate_embeddings", "embeddings.f32 has"),
+        ("bad_offsets", "chunks.offsets"),
+        ("bad_record", "unreadable chunk records"),
+        ("nan_vector", "NaN or infinite"),
+        ("stale_lexical", "lexical index has"),
+        ("manifest_counts", "manifest lists"),
+    ])
+    def test_verify_detects_damage(self, damage, message, source_folder, tmp_path, fake_model):
+        """Test that verify reports damaged index files and exits with an error"""
+        index_path = tmp_path / "idx"
+        assert self.invoke("build", str(source_folder), str(index_path)).exit_code == 0
+        count = json.loads((index_path / "index.json").read_text())['count']
+
+        if damage == "truncate_embeddings":
+            with open(index_path / "embeddings.f32", "r+b") as f:
+                f.truncate(8)
+        elif damage == "bad_offsets":
+            offsets = np.fromfile(index_path / "chunks.offsets", dtype="<i8")
+            offsets[1:].tofile(index_path / "chunks.offsets")
+        elif damage == "bad_record":
+            data = (index_path / "chunks.jsonl").read_bytes()
+            (index_path / "chunks.jsonl").write_bytes(b"x" + data[1:])
+        elif damage == "nan_vector":
+            vectors = np.memmap(index_path / "embeddings.f32", dtype=np.float32, mode="r+")
+            vectors[3] = np.nan
+            vectors.flush()
+            del vectors
+        elif damage == "stale_lexical":
+            header = json.loads((index_path / lexical.HEADER_FILE).read_text())
+            header['count'] = count + 1
+            (index_path / lexical.HEADER_FILE).write_text(json.dumps(header))
+        elif damage == "manifest_counts":
+            manifest = json.loads((index_path / "manifest.json").read_text())
+            next(iter(manifest['files'].values()))['chunks'] += 1
+            (index_path / "manifest.json").write_text(json.dumps(manifest))
+
+        verified = maintenance.verify_index(str(index_path))
+        assert not verified.ok
+        assert any(message in error for error in verified.errors), verified.errors
+        result = self.invoke("verify", str(index_path))
+        assert result.exit_code == 1 and "FAILED" in result.output
+
+    def test_verify_warns_about_changed_sources(self, source_folder, tmp_path, fake_model):
+        """Test that edited source files are a warning, not an error"""
+        index_path = str(tmp_path / "idx.json")
+        assert self.invoke("build", str(source_folder), index_path).exit_code == 0
+        (source_folder / "a.md").write_text("Something else entirely.")
+
+        verified = maintenance.verify_index(index_path)
+        assert verified.ok
+        assert any("changed since the build" in warning for warning in verified.warnings)
+        assert maintenance.verify_index(index_path, check_sources=False).warnings == []
+
+    def test_faiss_sharded_stats_and_verify(self, source_folder, tmp_path, fake_model):
+        """Test stats summed over FAISS shards and a missing shard reported by verify"""
+        pytest.importorskip("faiss")
+        index_path = tmp_path / "faiss_idx"
+        result = self.invoke("build", str(source_folder), str(index_path),
+                             "--provider", "faiss", "--shards", "subfolder", "--chunk-size", "200")
+        assert result.exit_code == 0, result.output
+
+        stats = maintenance.index_stats(str(index_path))
+        assert stats['format'] == "sharded" and stats['provider'] == "faiss"
+        assert [shard['name'] for shard in stats['shards']] == ["_root", "sub"]
+        assert stats['chunks'] == sum(shard['chunks'] for shard in stats['shards'])
+        assert stats['source_files'] == 3
+        assert maintenance.verify_index(str(index_path)).ok
+
+        metadata_file = index_path / "shards" / "_root" / "metadata.json"
+        metadata = json.loads(metadata_file.read_text())
+        metadata['num_chunks'] += 1
+        metadata_file.write_text(json.dumps(metadata))
+        shutil.rmtree(index_path / "shards" / "sub")
+
+        errors = maintenance.verify_index(str(index_path)).errors
+        assert any(error.startswith("shard _root: ") for error in errors)
+        assert any("shard sub: no faiss index" in error for error in errors)
+
+    def test_build_from_prompt_file(self, source_folder, tmp_path, fake_model):
+        """Test that a prompt file builds every index of its RAG rules and ancestors once"""
+        parent = tmp_path / "parent.yaml"
+        parent.write_text(json.dumps({'prompt': {'output': {'rag': {
+            'shared': {'index_path': 'idx_a', 'source_folder': 'docs', 'query': 'fuel'},
+            'other': {'index_path': 'idx_b.json', 'source_folder': 'docs/sub', 'query': 'fuel'}}}}}))
+        child = tmp_path / "child.yaml"
+        child.write_text(json.dumps({'prompt': {'extends': ['parent.yaml'], 'context': {'rag': {
+            'first': {'index_path': 'idx_a', 'source_folder': 'docs', 'chunk_size': 100},
+            'no_source': {'index_path': 'idx_c'}}}}}))
+
+        indexes = PromptYaml(str(child)).get_rag_indexes()
+        assert [path for path, _ in indexes] == [str(tmp_path / name) for name in ("idx_a", "idx_c", "idx_b.json")]
+        assert indexes[0][1]['chunk_size'] == 100
+        assert indexes[0][1]['source_folder'] == str(source_folder)
+
+        result = self.invoke("build", str(child), "--workers", "1")
+        assert result.exit_code == 0, result.output
+        assert "Skipping" in result.output
+        assert maintenance.index_stats(str(tmp_path / "idx_a"))['settings']['chunk_size'] == 100
+        assert maintenance.index_stats(str(tmp_path / "idx_b.json"))['source_files'] == 1
+
+        result = self.invoke("verify", str(child))
+        assert result.exit_code == 1
+        assert f"no index found at {tmp_path / 'idx_c'}" in result.output
+
+    def test_build_progress(self, source_folder, tmp_path, monkeypatch):
+        """Test that the progress callback sees every file and embedded chunk"""
+        lines = []
+        progress = maintenance.BuildProgress(3, write=lines.append, interval=0)
+        provider = FastembedProvider()
+        monkeypatch.setattr(provider, "_initialize_model", lambda *args, **kwargs: FakeTextEmbedding())
+        provider.progress = progress
+        error = provider.build_index(str(tmp_path / "idx"), {'source_folder': str(source_folder),
+                                                             'provider_config': {'batch_size': 4}})
+        assert error is None
+        assert (progress.files, progress.chunks) == (3, progress.embedded)
+        assert len(lines) > 1 and lines[-1].startswith("3/3 files")
+        assert "chunks/s" in progress.summary()
+        assert provider.build_index(str(tmp_path / "other"), {}).startswith("Error")
+
+
+class TestTextNormalizer:
+    """Test the shared single-pass text normalizer"""
+
+    @staticmethod
+    def legacy_clean_text(text):
+        import re
+        text = re.sub(r'\s+', ' ', text)
+        text = re.sub(r'\n\s*\n', '\n\n', text)
+        text = re.sub(r'([a-z])([A-Z])', r'\1 \2', text)
+        text = re.sub(r'([.!?])([A-Z])', r'\1 \2', text)
+        text = re.sub(r'(\w)-\n(\w)', r'\1\2', text)
+        text = re.sub(r'(\w)\n(\w)', r'\1 \2', text)
+        text = re.sub(r'([a-z])([A-Z][a-z])', r'\1 \2', text)
+        text = re.sub(r'(\w)([A-Z]+)(\w)', r'\1 \2 \3', text)
+        return ' '.join(text.split())
+
+    @pytest.mark.parametrize("text", [
+        "", "   ", "plain text", "camelCaseWords", "end.Start and done!Next?Yes",
+        "HTTPServer NASA XML", "line\n\n  break\tand\x0bspaces ", "über_ÉTAT 3DModel a1B2C",
+    ])
+    def test_matches_legacy_chain(self, text):
+        """Test that output equals the former eight-regex chain"""
+        assert normalize_text(text) == self.legacy_clean_text(text)
+
+    def test_matches_legacy_chain_random(self):
+        """Test equivalence on random strings of the characters the rules care about"""
+        import random
+        rng = random.Random(11)
+        alphabet = "aAbBzZ.!?-_1é \n\t"
+        for _ in range(20000):
+            text = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 16)))
+            assert normalize_text(text) == self.legacy_clean_text(text), repr(text)
+
+    def test_chunks_are_not_normalized_twice(self):
+        """Test that chunking keeps the normalized text as is"""
+        text = normalize_text("The HTTPServer handles JSONRequests. " * 3)
+        assert FastembedProvider._create_chunks(text, 512, 50) == [text]
+        assert FaissProvider._create_chunks(text, 512, 50) == [text]
+
+    def test_normalizer_version_in_manifest(self, tmp_path, monkeypatch):
+        """Test that the normalizer version is part of the index settings"""
+        provider = FastembedProvider()
+        monkeypatch.setattr(provider, "_initialize_model", lambda *args, **kwargs: FakeTextEmbedding())
+        index_path = str(tmp_path / "idx")
+        provider.parse(index_path, {'source_folder': os.path.join("examples", "sample-docs"), 'query': 'q'})
+        settings = IndexManifest.load(manifest_path_for(index_path)).settings
+        assert settings['text_normalizer'] == NORMALIZER_VERSION
+
+
 class TestRAGYAMLIntegration:
     """Test RAG integration with YAML configuration"""
 
@@ -317,6 +1854,163 @@ class TestFaissProviderOptional:
             assert os.path.exists(index_path) or os.path.exists(f"{index_path}.faiss")
 
 
+class TestFaissStorage:
+    """Test the FAISS on-disk layout: memory-mapped index and chunk store"""
+
+    @pytest.fixture
+    def built_index(self, tmp_path, monkeypatch):
+        pytest.importorskip("faiss")
+        monkeypatch.setattr(model_registry, "_create_model",
+                            lambda model_name, options: FakeTextEmbedding(model_name))
+        model_registry.clear_models()
+        index_path = str(tmp_path / "faiss_idx")
+        options = {'source_folder': os.path.join("examples", "sample-docs"), 'query': 'database', 'top_k': 3}
+        output = FaissProvider().parse(index_path, options)
+        yield index_path, options, output
+        model_registry.clear_models()
+
+    def test_layout_has_no_pickle(self, built_index):
+        """Test that metadata is stored as JSON header plus chunk store"""
+        index_path, _, output = built_index
+        assert "Rank 1" in output
+        assert sorted(os.listdir(index_path)) == ["chunks.jsonl", "chunks.offsets", "duplicates.jsonl",
+                                                  "index.faiss", "lexical.json", "lexical.lengths",
+                                                  "lexical.postings", "manifest.json", "metadata.json"]
+        with open(os.path.join(index_path, "metadata.json")) as f:
+            header = json.load(f)
+        assert header["num_chunks"] == len(FaissProvider._read_metadata(index_path)["chunks"])
+        assert "chunks" not in header
+
+    def test_query_reads_only_returned_chunks(self, built_index, monkeypatch):
+        """Test that a search reads top_k chunk records, not the whole store"""
+        index_path, options, output = built_index
+        requested = []
+        original = vector_store.ChunkStore.get_many
+        monkeypatch.setattr(vector_store.ChunkStore, "get_many",
+                            lambda store, ids: requested.append(list(ids)) or original(store, ids))
+        monkeypatch.setattr(vector_store.ChunkStore, "__iter__",
+                            lambda store: pytest.fail("whole chunk store was read"))
+        get_index_cache().invalidate(index_path)
+
+        assert FaissProvider().parse(index_path, options) == output
+        assert [len(ids) for ids in requested] == [3]
+
+    def test_mmap_and_in_memory_loads_agree(self, built_index):
+        """Test that the memory-mapped index returns the same results"""
+        index_path, options, output = built_index
+        in_memory = FaissProvider().parse(index_path, dict(options, provider_config={'mmap': False}))
+        assert in_memory == output
+
+    def test_legacy_pickle_metadata(self, built_index):
+        """Test that metadata.pkl indexes still load and are migrated on rebuild"""
+        import pickle
+        index_path, options, output = built_index
+        metadata = FaissProvider._read_metadata(index_path)
+        metadata["chunks"] = list(metadata["chunks"])
+        for name in ("metadata.json", "chunks.jsonl", "chunks.offsets"):
+            os.remove(os.path.join(index_path, name))
+        with open(os.path.join(index_path, "metadata.pkl"), "wb") as f:
+            pickle.dump(metadata, f)
+        get_index_cache().invalidate(index_path)
+
+        assert FaissProvider().parse(index_path, options) == output
+
+        FaissProvider().parse(index_path, dict(options, force_override=True,
+                                               provider_config={'incremental': False}))
+        assert not os.path.exists(os.path.join(index_path, "metadata.pkl"))
+        assert os.path.exists(os.path.join(index_path, "metadata.json"))
+
+
+class TestFaissIndexTypes:
+    """Test quantized FAISS index types and search-time parameters"""
+
+    @pytest.fixture(autouse=True)
+    def offline_model(self, monkeypatch):
+        pytest.importorskip("faiss")
+        monkeypatch.setattr(model_registry, "_create_model",
+                            lambda model_name, options: FakeTextEmbedding(model_name))
+        model_registry.clear_models()
+        yield
+        model_registry.clear_models()
+
+    @staticmethod
+    def build(index_path, query="database schema", **provider_config):
+        options = {'source_folder': os.path.join("examples", "sample-docs"), 'query': query,
+                   'top_k': 3, 'chunk_size': 128, 'overlap': 16, 'provider_config': provider_config}
+        return FaissProvider().parse(index_path, options)
+
+    @pytest.mark.parametrize("metric_type", ["L2", "IP"])
+    @pytest.mark.parametrize("index_type", ["flat", "ivf", "hnsw", "ivfpq", "sq8", "ivfsq8"])
+    def test_index_types_and_metrics(self, tmp_path, index_type, metric_type):
+        """Test that every index type builds, searches and uses the requested metric"""
+        import faiss
+        index_path = str(tmp_path / "idx")
+        output = self.build(index_path, index_type=index_type, metric_type=metric_type)
+        assert "Rank 3" in output
+
+        index, metadata = FaissProvider._load_index(index_path)
+        expected = faiss.METRIC_INNER_PRODUCT if metric_type == "IP" else faiss.METRIC_L2
+        assert index.metric_type == expected
+        assert metadata["index_type"] == index_type
+        assert os.path.exists(os.path.join(index_path, "vectors.f32")) == (
+            index_type in FaissProvider.LOSSY_INDEX_TYPES)
+        if index_type.startswith("ivf"):
+            assert metadata["search_params"]["nprobe"] >= 1
+        if index_type == "hnsw":
+            assert metadata["search_params"]["ef_search"] == 64
+
+    def test_inner_product_scores_are_similarities(self, tmp_path):
+        """Test that IP scores are cosine similarities, not inverted distances"""
+        output = self.build(str(tmp_path / "idx"), query="database", metric_type="IP")
+        scores = [float(line.split("Score: ")[1].rstrip(")")) for line in output.splitlines()
+                  if line.startswith("Rank ")]
+        assert scores == sorted(scores, reverse=True)
+        assert 0 < scores[0] <= 1.0 + 1e-5
+
+    def test_search_parameters_override_stored_values(self, tmp_path):
+        """Test that provider_config nprobe/ef_search win over the stored defaults"""
+        import faiss
+        index_path = str(tmp_path / "idx")
+        self.build(index_path, index_type="ivf", n_clusters=4)
+        index, metadata = FaissProvider._load_index(index_path)
+
+        provider = FaissProvider()
+        assert provider._search_parameters(index, metadata).nprobe == metadata["search_params"]["nprobe"]
+        provider.nprobe = 3
+        assert provider._search_parameters(index, metadata).nprobe == 3
+
+        hnsw_path = str(tmp_path / "hnsw")
+        self.build(hnsw_path, index_type="hnsw", ef_search=128)
+        index, metadata = FaissProvider._load_index(hnsw_path)
+        provider.ef_search = 128
+        params = provider._search_parameters(index, metadata)
+        assert isinstance(params, faiss.SearchParametersHNSW) and params.efSearch == 128
+
+    def test_quantized_incremental_rebuild_is_exact(self, tmp_path):
+        """Test that quantized indexes rebuild from stored raw vectors"""
+        source = tmp_path / "docs"
+        shutil.copytree(os.path.join("examples", "sample-docs"), source)
+        options = {'source_folder': str(source), 'query': 'api', 'force_override': True,
+                   'provider_config': {'index_type': 'ivfpq'}}
+        index_path = str(tmp_path / "idx")
+        FaissProvider().parse(index_path, options)
+        (source / "new_notes.md").write_text("Caching notes. " * 30)
+        FaissProvider().parse(index_path, options)
+
+        full_path = str(tmp_path / "full")
+        FaissProvider().parse(full_path, dict(options, provider_config={'index_type': 'ivfpq',
+                                                                         'incremental': False}))
+        incremental = np.fromfile(os.path.join(index_path, "vectors.f32"), dtype=np.float32)
+        full = np.fromfile(os.path.join(full_path, "vectors.f32"), dtype=np.float32)
+        assert np.allclose(incremental, full, atol=1e-6)
+
+    def test_default_pq_m_divides_dimension(self):
+        """Test the default number of PQ sub-quantizers"""
+        assert FaissProvider._default_pq_m(384) == 48
+        assert FaissProvider._default_pq_m(64) == 8
+        assert 100 % FaissProvider._default_pq_m(100) == 0
+
+
 class TestRAGEdgeCases:
     """Test edge cases and error handling"""
 
@@ -0,0 +1,247 @@
+"""
+Tests for the prompt server (peac serve) and peac prompt --server
+"""
+
+import http.client
+import json
+import os
+import socket
+import stat
+import threading
+import time
+
+import pytest
+from typer.testing import CliRunner
+
+from peac.main import app
+from peac.server import (PromptServer, ServerError, get_server_token, parse_address, render_remote,
+                         server_health, stop_server)
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    # The server token is stored in the cache directory
+    monkeypatch.setenv('PEAC_CACHE_DIR', str(tmp_path / 'peac-cache'))
+
+
+def write_prompt(folder, instruction='Summarize the notes'):
+    (folder / 'notes.txt').write_text('first note\nsecond note\n', encoding='utf-8')
+    (folder / 'base.yaml').write_text(
+        "prompt:\n"
+        "  output:\n"
+        "    base:\n"
+        "      - Answer in Markdown\n",
+        encoding='utf-8',
+    )
+    prompt_file = folder / 'prompt.yaml'
+    prompt_file.write_text(
+        "prompt:\n"
+        "  extends:\n"
+        "    - base.yaml\n"
+        "  instruction:\n"
+        "    base:\n"
+        f"      - {instruction}\n"
+        "  context:\n"
+        "    local:\n"
+        "      notes:\n"
+        "        preamble: Notes\n"
+        "        source: notes.txt\n",
+        encoding='utf-8',
+    )
+    return prompt_file
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def running_server():
+    servers = []
+
+    def start(address='127.0.0.1:0'):
+        prompt_server = PromptServer(address)
+        thread = threading.Thread(target=prompt_server.serve_forever, daemon=True)
+        thread.start()
+        servers.append((prompt_server, thread))
+        return prompt_server
+
+    yield start
+    for prompt_server, thread in servers:
+        prompt_server.shutdown()
+        thread.join(timeout=5)
+
+
+def render_locally(runner, prompt_file, *args):
+    result = runner.invoke(app, ['prompt', str(prompt_file), *args])
+    assert result.exit_code == 0, result.output
+    return result.output
+
+
+class TestPromptServer:
+    """peac serve renders exactly what a local peac prompt prints"""
+
+    @pytest.mark.parametrize("address,expected", [
+        ('127.0.0.1:8765', ('tcp', ('127.0.0.1', 8765))),
+        (':9000', ('tcp', ('127.0.0.1', 9000))),
+        ('9000', ('tcp', ('127.0.0.1', 9000))),
+        ('[::1]:9000', ('tcp', ('::1', 9000))),
+        ('unix:/tmp/peac.sock', ('unix', '/tmp/peac.sock')),
+    ])
+    def test_parse_address(self, address, expected):
+        assert parse_address(address) == expected
+
+    def test_parse_address_rejects_garbage(self):
+        with pytest.raises(ValueError):
+            parse_address('localhost:http')
+
+    def test_render_matches_local(self, tmp_path, running_server):
+        prompt_file = write_prompt(tmp_path)
+        prompt_server = running_server()
+        runner = CliRunner()
+
+        for flags in ([], ['--no-section-headers']):
+            local = render_locally(runner, prompt_file, *flags)
+            remote = render_remote(prompt_server.address, str(prompt_file), section_headers=not flags)
+            assert remote == local
+            assert 'second note' in remote
+        assert server_health(prompt_server.address)['renders'] == 2
+
+    def test_cli_forwards_to_server(self, tmp_path, running_server):
+        prompt_file = write_prompt(tmp_path)
+        prompt_server = running_server()
+        runner = CliRunner()
+
+        forwarded = render_locally(runner, prompt_file, '--server', '--server-address', prompt_server.address)
+        assert forwarded == render_locally(runner, prompt_file)
+        assert prompt_server.renders == 1
+
+    def test_cli_forwards_rule_options(self, tmp_path, running_server, monkeypatch):
+        from peac.core import peac as peac_core
+
+        prompt_file = write_prompt(tmp_path)
+        prompt_server = running_server()
+        runner = CliRunner()
+        pools = []
+        resolve_rule_pool = peac_core.resolve_rule_pool
+        monkeypatch.setattr(peac_core, 'resolve_rule_pool',
+                            lambda workers=None, pool=None: pools.append((workers, pool)) or resolve_rule_pool(workers, pool))
+
+        forwarded = render_locally(runner, prompt_file, '--server', '--server-address', prompt_server.address,
+                                   '--rule-workers', '1', '--rule-pool', 'process')
+        assert forwarded == render_locally(runner, prompt_file)
+        assert pools[0] == (1, 'process')
+
+        result = runner.invoke(app, ['prompt', str(prompt_file), '--server', '--server-address',
+                                     prompt_server.address, '--rule-pool', 'fiber'])
+        assert result.exit_code == 1
+        assert 'Unknown rule pool' in result.output
+
+    def test_edits_are_picked_up_without_restart(self, tmp_path, running_server):
+        prompt_file = write_prompt(tmp_path)
+        prompt_server = running_server()
+
+        assert 'Summarize the notes' in render_remote(prompt_server.address, str(prompt_file))
+        write_prompt(tmp_path, instruction='Translate the notes')
+        output = render_remote(prompt_server.address, str(prompt_file))
+        assert 'Translate the notes' in output
+        assert 'Summarize the notes' not in output
+
+    def test_cached_render(self, tmp_path, running_server, monkeypatch):
+        monkeypatch.setenv('PEAC_CACHE_DIR', str(tmp_path / 'peac-cache'))
+        prompt_file = write_prompt(tmp_path)
+        prompt_server = running_server()
+        local = render_locally(CliRunner(), prompt_file)
+
+        assert render_remote(prompt_server.address, str(prompt_file), cache=True) == local
+        (tmp_path / 'notes.txt').write_text('third note\n', encoding='utf-8')
+        assert 'third note' in render_remote(prompt_server.address, str(prompt_file), cache=True)
+
+    def test_falls_back_when_no_server(self, tmp_path):
+        prompt_file = write_prompt(tmp_path)
+        address = f"127.0.0.1:{free_port()}"
+        runner = CliRunner()
+
+        assert render_remote(address, str(prompt_file)) is None
+        assert server_health(address) is None
+        assert render_locally(runner, prompt_file, '--server', '--server-address', address) == \
+            render_locally(runner, prompt_file)
+
+    def test_render_error_is_reported(self, tmp_path, running_server):
+        prompt_server = running_server()
+
+        with pytest.raises(ServerError):
+            render_remote(prompt_server.address, str(tmp_path / 'missing.yaml'))
+        result = CliRunner().invoke(app, ['prompt', str(tmp_path / 'missing.yaml'),
+                                          '--server', '--server-address', prompt_server.address])
+        assert result.exit_code == 1
+
+    @pytest.mark.skipif(not hasattr(socket, 'AF_UNIX'), reason="Unix sockets not available")
+    def test_unix_socket(self, tmp_path, running_server):
+        prompt_file = write_prompt(tmp_path)
+        socket_path = tmp_path / 'peac.sock'
+        prompt_server = running_server(f"unix:{socket_path}")
+
+        assert prompt_server.address == f"unix:{socket_path}"
+        assert render_remote(prompt_server.address, str(prompt_file)) == \
+            render_locally(CliRunner(), prompt_file)
+        assert 'index_cache' in prompt_server.stats()
+
+    def test_requests_need_the_token(self, tmp_path, running_server):
+        prompt_file = write_prompt(tmp_path)
+        prompt_server = running_server()
+        host, port = prompt_server.address.rsplit(':', 1)
+
+        def post(path, body, headers):
+            connection = http.client.HTTPConnection(host, int(port), timeout=5)
+            try:
+                connection.request('POST', path, body=body, headers=headers)
+                return connection.getresponse().status
+            finally:
+                connection.close()
+
+        body = json.dumps({'yaml_path': str(prompt_file)})
+        assert post('/shutdown', '{}', {'Content-Type': 'application/json'}) == 401
+        assert post('/render', body, {'Content-Type': 'application/json', 'Authorization': 'Bearer wrong'}) == 401
+        # A cross-site form post cannot set the header, and a text/plain body is refused
+        assert post('/shutdown', '{}', {'Content-Type': 'text/plain',
+                                        'Authorization': f"Bearer {prompt_server.token}"}) == 415
+        with pytest.raises(ServerError):
+            server_health(prompt_server.address, token='wrong')
+        assert server_health(prompt_server.address)['renders'] == 0
+
+    def test_token_file_is_private(self, tmp_path):
+        token = get_server_token()
+        token_file = tmp_path / 'peac-cache' / 'server.token'
+        assert stat.S_IMODE(os.stat(token_file).st_mode) == 0o600
+        os.chmod(token_file, 0o644)
+        assert get_server_token() == token
+        assert stat.S_IMODE(os.stat(token_file).st_mode) == 0o600
+
+    def test_stop_server(self, running_server):
+        prompt_server = running_server()
+
+        assert stop_server(prompt_server.address)
+        deadline = time.monotonic() + 5
+        while server_health(prompt_server.address) is not None and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert server_health(prompt_server.address) is None
+        assert stop_server(prompt_server.address) is False
+
+    def test_warm_skips_files_that_fail(self, tmp_path, monkeypatch):
+        prompt_file = write_prompt(tmp_path)
+        (tmp_path / 'broken.yaml').write_text("prompt: [unclosed\n", encoding='utf-8')
+        served = []
+        monkeypatch.setattr(PromptServer, 'serve_forever', lambda self: (served.append(self), self.close()))
+
+        result = CliRunner().invoke(app, ['serve', '--address', '127.0.0.1:0',
+                                          '--warm', str(tmp_path / 'missing.yaml'),
+                                          '--warm', str(tmp_path / 'broken.yaml'),
+                                          '--warm', str(prompt_file)])
+
+        assert result.exit_code == 0, result.output
+        assert f"Could not warm up {tmp_path / 'missing.yaml'}" in result.output
+        assert f"Could not warm up {tmp_path / 'broken.yaml'}" in result.output
+        assert served[0].renders == 1
@@ -0,0 +1,30 @@
+"""
+Deterministic stand-in for fastembed.TextEmbedding.
+
+Hashes word tokens into a fixed-size bag-of-words vector so RAG providers can be
+exercised end to end without downloading an ONNX model.
+"""
+import re
+import zlib
+
+import numpy as np
+
+
+class FakeTextEmbedding:
+    """Offline embedding model with the same embed() signature as TextEmbedding"""
+
+    def __init__(self, model_name: str = "fake/bag-of-words", dim: int = 64):
+        self.model_name = model_name
+        self.dim = dim
+        self.embedded_texts = 0
+
+    def embed(self, documents, batch_size: int = 256, **kwargs):
+        if isinstance(documents, str):
+            documents = [documents]
+        for text in documents:
+            self.embedded_texts += 1
+            vector = np.zeros(self.dim, dtype=np.float32)
+            for token in re.findall(r"\w+", text.lower()):
+                vector[zlib.crc32(token.encode("utf-8")) % self.dim] += 1.0
+            norm = np.linalg.norm(vector)
+            yield vector / norm if norm else vector